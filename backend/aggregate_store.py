@@ -0,0 +1,210 @@
+"""
+Agregados mantidos de forma incremental a partir de eventos de alteração.
+
+O `AggregateStore` é semeado uma única vez com todos os documentos da coleção e,
+a partir daí, acompanha cada alteração: a versão anterior do documento é
+subtraída dos acumuladores e a nova versão é somada. Assim as rotas de métricas
+respondem sem ler o Firestore a cada requisição.
+
+Para a subtração, o agregado guarda de cada documento apenas as partes do resumo
+(`summaries.py`) usadas pelos acumuladores (algumas centenas de bytes), e não o documento
+bruto com o 'heg_data' e o 'game_data'.
+
+A origem dos eventos é plugável (`FirestoreChangeFeed` para o `on_snapshot` do
+Firestore e `InMemoryChangeFeed` para uma coleção falsa em memória).
+"""
+
+import logging
+import threading
+from collections import defaultdict, namedtuple
+
+from instrumentation import log_event, record_documents_read
+from summaries import SUMMARY_FIELD, SUMMARY_VERSION, summary_part
+
+
+logger = logging.getLogger(__name__)
+
+
+# Evento de alteração de um documento: kind é "ADDED", "MODIFIED" ou "REMOVED"
+DocumentChange = namedtuple("DocumentChange", ["kind", "doc_id", "data"])
+
+
+class FirestoreChangeFeed:
+    """
+    Fonte de eventos baseada no `on_snapshot` de uma coleção do Firestore.
+
+    O primeiro snapshot entregue pelo Firestore contém todos os documentos como
+    "ADDED", o que serve para semear o agregado.
+    """
+
+    def __init__(self, collection_ref):
+        self.collection_ref = collection_ref
+        self._watch = None
+
+    def subscribe(self, callback):
+        def on_snapshot(doc_snapshot, changes, read_time):
+            events = [
+                DocumentChange(change.type.name, change.document.id, change.document.to_dict())
+                for change in changes
+            ]
+            record_documents_read(self.collection_ref.id, [event.data for event in events])
+            callback(events)
+
+        self._watch = self.collection_ref.on_snapshot(on_snapshot)
+
+    def unsubscribe(self):
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+
+
+class InMemoryChangeFeed:
+    """
+    Coleção falsa em memória que emite os mesmos eventos que o `FirestoreChangeFeed`.
+    """
+
+    def __init__(self, documents=None):
+        self.documents = dict(documents or {})
+        self._callbacks = []
+
+    def subscribe(self, callback):
+        self._callbacks.append(callback)
+        callback([DocumentChange("ADDED", doc_id, data) for doc_id, data in self.documents.items()])
+
+    def unsubscribe(self):
+        self._callbacks = []
+
+    def set(self, doc_id, data):
+        kind = "MODIFIED" if doc_id in self.documents else "ADDED"
+        self.documents[doc_id] = data
+        self._emit([DocumentChange(kind, doc_id, data)])
+
+    def delete(self, doc_id):
+        if doc_id in self.documents:
+            data = self.documents.pop(doc_id)
+            self._emit([DocumentChange("REMOVED", doc_id, data)])
+
+    def _emit(self, changes):
+        for callback in self._callbacks:
+            callback(changes)
+
+
+class AggregateStore:
+    """
+    Mantém os acumuladores de `aggregation.py` atualizados a partir de uma fonte de eventos.
+
+    Parâmetros:
+    accumulator_factories (dict): Nome -> fábrica de cada acumulador.
+    on_change (callable, opcional): Chamado depois de cada lote de eventos posterior ao snapshot
+        inicial (ex.: para invalidar os resultados guardados pelo agendador de métricas).
+    """
+
+    def __init__(self, accumulator_factories, on_change=None):
+        self._accumulators = {name: factory() for name, factory in accumulator_factories.items()}
+        # Acumuladores sem `summary_key` recebem os próprios campos brutos
+        self._summary_keys = sorted({
+            accumulator.summary_key for accumulator in self._accumulators.values()
+            if getattr(accumulator, "summary_key", None)
+        })
+        self._raw_fields = sorted({
+            field for accumulator in self._accumulators.values()
+            if not getattr(accumulator, "summary_key", None) for field in accumulator.fields
+        })
+        self._documents = {}
+        self._failed = defaultdict(set)
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._feed = None
+        self._on_change = on_change
+
+    def start(self, feed, timeout=None):
+        """
+        Assina a fonte de eventos e aguarda o snapshot inicial.
+
+        Retorna:
+        bool: True se o agregado foi semeado dentro do tempo limite.
+        """
+        self._feed = feed
+        feed.subscribe(self.apply)
+        return self._ready.wait(timeout)
+
+    def stop(self):
+        if self._feed is not None:
+            self._feed.unsubscribe()
+            self._feed = None
+        self._ready.clear()
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def apply(self, changes):
+        """
+        Aplica um lote de eventos: subtrai a versão antiga e soma a nova de cada documento.
+        """
+        seeded = self._ready.is_set()
+        with self._lock:
+            for change in changes:
+                previous = self._documents.pop(change.doc_id, None)
+                if previous is not None:
+                    self._remove(change.doc_id, previous)
+
+                if change.kind != "REMOVED":
+                    self._documents[change.doc_id] = self._add(change.doc_id, change.data or {})
+
+        self._ready.set()
+        if seeded and changes and self._on_change is not None:
+            self._on_change()
+
+    def _compact(self, doc_id, session_data):
+        """
+        Reduz o documento às partes do resumo usadas pelos acumuladores (e aos campos brutos dos
+        acumuladores sem resumo). Partes que não puderem ser calculadas ficam de fora.
+        """
+        summary = {"version": SUMMARY_VERSION}
+        for key in self._summary_keys:
+            try:
+                summary[key] = summary_part(session_data, key)
+            except Exception as e:
+                log_event(logger, logging.WARNING, "aggregate_part_failed", part=key, session_id=doc_id, error=e)
+        compact = {field: session_data[field] for field in self._raw_fields if field in session_data}
+        compact[SUMMARY_FIELD] = summary
+        return compact
+
+    def _add(self, doc_id, session_data):
+        compact = self._compact(doc_id, session_data)
+        summary = compact[SUMMARY_FIELD]
+        for name, accumulator in self._accumulators.items():
+            key = getattr(accumulator, "summary_key", None)
+            try:
+                if key and key not in summary:
+                    raise ValueError(f"parte {key} do resumo inválida")
+                accumulator.add(doc_id, compact)
+            except Exception as e:
+                log_event(logger, logging.WARNING, "aggregate_document_failed", accumulator=name, session_id=doc_id, error=e)
+                self._failed[name].add(doc_id)
+        return compact
+
+    def _remove(self, doc_id, compact):
+        for name, accumulator in self._accumulators.items():
+            # Documentos que falharam nunca foram somados
+            if doc_id in self._failed[name]:
+                self._failed[name].discard(doc_id)
+                continue
+            accumulator.remove(doc_id, compact)
+
+    def results(self, *names):
+        """
+        Retorna o resultado atual dos acumuladores pedidos (todos, se nenhum for informado).
+
+        Retorna:
+        dict: Resultado de cada acumulador indexado pelo seu nome (None enquanto houver documentos inválidos).
+        """
+        with self._lock:
+            results = {}
+            for name in (names or self._accumulators):
+                if self._failed[name]:
+                    results[name] = None
+                    continue
+                results[name] = self._accumulators[name].result()
+            return results
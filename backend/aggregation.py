@@ -0,0 +1,258 @@
+"""
+Motor de agregação em passada única para a coleção 'sessionQuestionary'.
+
+Cada documento é lido uma única vez e entregue a um conjunto de acumuladores
+plugáveis. Cada acumulador mantém apenas o estado necessário para a sua métrica
+(média do HEG, contadores Go/NoGo, pontuações do form_answer) e devolve o mesmo
+dicionário que as funções `calculate_*` retornavam quando faziam a sua própria
+varredura da coleção.
+
+Cada acumulador declara em `fields` os campos do documento que utiliza, para que a
+leitura possa ser feita com projeção (`select`) em vez de trazer o documento inteiro.
+
+Os acumuladores das métricas principais trabalham sobre o resumo de cada sessão
+(`summaries.py`): o resumo gravado no documento quando existir, ou calculado na hora a
+partir dos campos brutos. Eles declaram em `summary_key` a parte do resumo que usam.
+
+Todo acumulador também sabe remover a contribuição de um documento (`remove`),
+o que permite mantê-lo atualizado de forma incremental a partir de eventos de
+alteração da coleção (ver `aggregate_store.py`).
+"""
+
+import logging
+
+from instrumentation import log_event
+from sketches import LogHistogram
+from summaries import summary_part
+
+
+logger = logging.getLogger(__name__)
+
+
+class HegMeanAccumulator:
+    """
+    Acumula a média do 'heg_data' de cada sessão (brainActivity).
+    """
+
+    name = "brain_activity"
+    fields = ["heg_data"]
+    summary_key = "heg"
+    error_message = "Erro ao calcular a média dos dados de sinais cerebrais"
+
+    def __init__(self):
+        self.session_means = {}
+
+    def add(self, doc_id, session_data):
+        # Média e quantidade de amostras da sessão (None se o heg_data estiver vazio ou inválido)
+        heg = summary_part(session_data, self.summary_key)
+
+        if heg and heg["count"]:
+            session_mean = heg["mean"]
+            self.session_means[doc_id] = session_mean
+
+            log_event(logger, logging.DEBUG, "heg_session_mean", session_id=doc_id, samples=heg["count"], mean=session_mean)
+        else:
+            log_event(logger, logging.DEBUG, "heg_data_missing", session_id=doc_id)
+
+    def remove(self, doc_id, session_data):
+        self.session_means.pop(doc_id, None)
+
+    def result(self):
+        # Em ordem de id do documento, como a varredura do Firestore
+        session_means = [self.session_means[doc_id] for doc_id in sorted(self.session_means)]
+
+        # Calcula a média final das médias por sessão
+        final_mean = sum(session_means) / len(session_means) if session_means else 0
+
+        return {
+            "mean_per_session": session_means,
+            "final_mean": final_mean
+        }
+
+
+class GoNoGoAccumulator:
+    """
+    Acumula os contadores do jogo Go/NoGo a partir do 'game_data' de cada sessão.
+    """
+
+    name = "game_metrics"
+    fields = ["game_data"]
+    summary_key = "game"
+    error_message = "Erro ao calcular métricas do jogo"
+
+    def __init__(self):
+        self.total_go_errors = 0
+        self.total_nogo_errors = 0
+        self.total_go_count = 0
+        self.total_nogo_count = 0
+        self.total_time_score = 0
+        self.total_iterations = 0
+
+    def _contribution(self, session_data):
+        """
+        Retorna os contadores Go/NoGo de uma única sessão.
+
+        Retorna:
+        tuple: (go_errors, nogo_errors, go_count, nogo_count, time_score, iterations)
+        """
+        game = summary_part(session_data, self.summary_key)
+        return (
+            game["go_errors"], game["nogo_errors"], game["go_count"],
+            game["nogo_count"], game["time_score"], game["iterations"]
+        )
+
+    def _apply(self, contribution, sign):
+        go_errors, nogo_errors, go_count, nogo_count, time_score, iterations = contribution
+        self.total_go_errors += sign * go_errors
+        self.total_nogo_errors += sign * nogo_errors
+        self.total_go_count += sign * go_count
+        self.total_nogo_count += sign * nogo_count
+        self.total_time_score += sign * time_score
+        self.total_iterations += sign * iterations
+
+    def add(self, doc_id, session_data):
+        self._apply(self._contribution(session_data), 1)
+
+    def remove(self, doc_id, session_data):
+        self._apply(self._contribution(session_data), -1)
+
+    def result(self):
+        # Calculando porcentagens de erro
+        go_error_percentage = (self.total_go_errors / self.total_go_count * 100) if self.total_go_count > 0 else 0
+        nogo_error_percentage = (self.total_nogo_errors / self.total_nogo_count * 100) if self.total_nogo_count > 0 else 0
+
+        # Calculando a média do tempo de reação
+        total_time = self.total_iterations * 2  # Tempo total = 2 segundos por iteração
+        reaction_time_average = (self.total_time_score / total_time * 1000) if total_time > 0 else 0
+
+        # Retornando resultados com duas casas decimais
+        return {
+            "go_error_percentage": round(go_error_percentage, 2),
+            "nogo_error_percentage": round(nogo_error_percentage, 2),
+            "reaction_time_average_ms": round(reaction_time_average, 2)
+        }
+
+
+class FormAnswerAccumulator:
+    """
+    Acumula a pontuação de um índice do 'form_answer' de cada sessão.
+
+    Fórmulas:
+    score = (max_score - float(formAnswers[index])) / max_score
+    value = int(score * 100)
+    """
+
+    fields = ["form_answer"]
+    summary_key = "form_answer"
+
+    def __init__(self, name, index, max_score):
+        self.name = name
+        self.index = index
+        self.max_score = max_score
+        self.label = f"{name.capitalize()}Value"
+        self.error_message = f"Erro ao calcular o valor de {name}Value"
+        self.values = {}
+
+    def add(self, doc_id, session_data):
+        # Respostas já convertidas para número (None nas inválidas)
+        form_answers = summary_part(session_data, self.summary_key)
+
+        # Validando se o índice existe em formAnswers
+        if len(form_answers) > self.index and form_answers[self.index] is not None:
+            score = (self.max_score - form_answers[self.index]) / self.max_score
+            value = int(score * 100)
+            self.values[doc_id] = value
+
+            log_event(logger, logging.DEBUG, "form_answer_value", session_id=doc_id, metric=self.label, value=value)
+        else:
+            log_event(logger, logging.DEBUG, "form_answer_missing", session_id=doc_id, index=self.index)
+
+    def remove(self, doc_id, session_data):
+        self.values.pop(doc_id, None)
+
+    def result(self):
+        # Em ordem de id do documento, como a varredura do Firestore
+        return {
+            f"{self.name}_values": [self.values[doc_id] for doc_id in sorted(self.values)]
+        }
+
+
+class DistributionAccumulator:
+    """
+    Combina os histogramas de cada sessão (`sketches.py`) nas distribuições do tempo de reação
+    por tentativa, das amostras do HEG e da taxa de erro por sessão.
+
+    A memória depende apenas da quantidade de baldes dos histogramas, não da quantidade de sessões.
+    """
+
+    name = "distributions"
+    fields = ["heg_data", "game_data"]
+    summary_key = "sketches"
+    error_message = "Erro ao calcular as distribuições"
+
+    def __init__(self):
+        self.histograms = {
+            "reaction_time_ms": LogHistogram(),
+            "heg": LogHistogram(),
+            "error_rate": LogHistogram(),
+        }
+
+    def _apply(self, session_data, sign):
+        sketches = summary_part(session_data, self.summary_key)
+
+        for metric in ("reaction_time_ms", "heg"):
+            if sketches.get(metric):
+                histogram = LogHistogram.from_dict(sketches[metric])
+                if sign > 0:
+                    self.histograms[metric].merge(histogram)
+                else:
+                    self.histograms[metric].subtract(histogram)
+
+        if sketches.get("error_rate") is not None:
+            self.histograms["error_rate"].add(sketches["error_rate"], weight=sign)
+
+    def add(self, doc_id, session_data):
+        self._apply(session_data, 1)
+
+    def remove(self, doc_id, session_data):
+        self._apply(session_data, -1)
+
+    def result(self):
+        return {metric: histogram.summary() for metric, histogram in self.histograms.items()}
+
+
+def scan_documents(docs, accumulators):
+    """
+    Percorre os documentos uma única vez, entregando cada um a todos os acumuladores.
+
+    Um erro em um acumulador invalida apenas a métrica correspondente, como acontecia
+    quando cada função `calculate_*` fazia a sua própria varredura.
+
+    Retorna:
+    dict: Resultado de cada acumulador indexado pelo seu nome (None em caso de erro).
+    """
+    failed = {}
+
+    for doc in docs:
+        session_data = doc.to_dict()
+        for accumulator in accumulators:
+            if accumulator.name in failed:
+                continue
+            try:
+                accumulator.add(doc.id, session_data)
+            except Exception as e:
+                logger.error("%s: %s", accumulator.error_message, e)
+                failed[accumulator.name] = e
+
+    results = {}
+    for accumulator in accumulators:
+        if accumulator.name in failed:
+            results[accumulator.name] = None
+            continue
+        try:
+            results[accumulator.name] = accumulator.result()
+        except Exception as e:
+            logger.error("%s: %s", accumulator.error_message, e)
+            results[accumulator.name] = None
+
+    return results
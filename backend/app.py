@@ -1,267 +1,1283 @@
-from flask import Flask, request, jsonify
+import click
+from flask import Flask, Response, g, has_request_context, request, jsonify, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 from dotenv import load_dotenv
-import firebase_admin
-from firebase_admin import credentials, firestore
 import os
+import base64
+import json
+import threading
+import itertools
+import logging
+import time
 from statistics import mean
-from collections import defaultdict
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from aggregation import (
+    DistributionAccumulator,
+    FormAnswerAccumulator,
+    GoNoGoAccumulator,
+    HegMeanAccumulator,
+    scan_documents,
+)
+from aggregate_store import AggregateStore, FirestoreChangeFeed
+from coalescing import coalesced, freeze
+from concurrency import ReadAhead, run_concurrently
+from data_backend import field_filter, get_db, warm_up as warm_up_db
+from gonogo import (
+    GROUPINGS,
+    GoNoGoTrials,
+    corrected_from_zscores,
+    final_mean_from_corrected,
+    game_metrics,
+    gonogo_report,
+    zscores_from_metrics,
+)
+from heg import (
+    DEFAULT_PERCENTILES,
+    DOWNSAMPLING_METHODS,
+    HegSignalAccumulator,
+    is_packed_heg,
+    pack_heg,
+    to_float_array,
+    unpack_heg,
+)
+from ingestion import INGEST_COLLECTIONS, apply_updates, ingest_records, iter_json_array, iter_ndjson, prepare_record
+from instrumentation import (
+    REGISTRY,
+    ROUTE_LATENCY,
+    configure_logging,
+    instrument_stream,
+    log_event,
+    record_documents_read,
+    timed_stage,
+)
+from negotiation import MSGPACK_MIMETYPE, compress_response, pack_heg_fields, packb, stream_msgpack, wants_msgpack
+from rollups import (
+    GRANULARITIES,
+    QuestionaryRollupAccumulator,
+    parse_timestamp,
+    rollup_questionary,
+    summarize_engagement,
+)
+from scheduler import MetricScheduler, is_valid_result
+from snapshot_store import SnapshotReader, export_snapshot, snapshot_aggregates
+from summaries import SUMMARY_FIELD, SUMMARY_PARTS, is_summary_current, needs_raw_fields, source_fields, summarize_session
+from trends import TREND_PARTS, TrendEngine
 
 
 # Carregar variáveis de ambiente do arquivo .env
 load_dotenv()
 
+# Logs estruturados (nível definido por LOG_LEVEL)
+configure_logging()
+logger = logging.getLogger(__name__)
+
+class SessionJSONProvider(DefaultJSONProvider):
+    """
+    Serializa o 'heg_data' no formato compacto (bytes) como a lista de amostras, para que as
+    respostas não dependam do formato em que a sessão foi gravada.
+
+    Quando o cliente pede `Accept: application/msgpack`, as respostas de `jsonify` (e os
+    dicionários retornados pelas rotas) são codificadas em MessagePack.
+    """
+
+    def response(self, *args, **kwargs):
+        if has_request_context() and wants_msgpack(request.accept_mimetypes):
+            value = args[0] if len(args) == 1 else (args or kwargs or None)
+            return self._app.response_class(packb(value), mimetype=MSGPACK_MIMETYPE)
+        return super().response(*args, **kwargs)
+
+    @staticmethod
+    def default(o):
+        if is_packed_heg(o):
+            try:
+                return unpack_heg(o).tolist()
+            except ValueError:
+                pass
+        return DefaultJSONProvider.default(o)
+
 app = Flask(__name__)
+app.json = SessionJSONProvider(app)
 CORS(app, resources={r"/*": {"origins": ["https://neurobots-dashboard.onrender.com"]}})
 
-# Verificar se todas as variáveis necessárias foram carregadas
-required_vars = [
-    "TYPE", "PROJECT_ID", "PRIVATE_KEY_ID", "PRIVATE_KEY",
-    "CLIENT_EMAIL", "CLIENT_ID", "AUTH_URI", "TOKEN_URI",
-    "AUTH_PROVIDER_X509_CERT_URL", "CLIENT_X509_CERT_URL"
-]
-
-# Exibir um erro se alguma variável estiver faltando
-for var in required_vars:
-    if os.getenv(var) is None:
-        raise EnvironmentError(f"A variável de ambiente {var} não foi definida no arquivo .env")
-
-# Crie um dicionário com as credenciais do Firebase a partir das variáveis de ambiente
-firebase_credentials = {
-    "type": os.getenv("TYPE"),
-    "project_id": os.getenv("PROJECT_ID"),
-    "private_key_id": os.getenv("PRIVATE_KEY_ID"),
-    "private_key": os.getenv("PRIVATE_KEY").replace("\\n", "\n"),
-    "client_email": os.getenv("CLIENT_EMAIL"),
-    "client_id": os.getenv("CLIENT_ID"),
-    "auth_uri": os.getenv("AUTH_URI"),
-    "token_uri": os.getenv("TOKEN_URI"),
-    "auth_provider_x509_cert_url": os.getenv("AUTH_PROVIDER_X509_CERT_URL"),
-    "client_x509_cert_url": os.getenv("CLIENT_X509_CERT_URL")
-}
 
-# Inicialize o Firebase Admin SDK usando as credenciais carregadas das variáveis de ambiente
-cred = credentials.Certificate(firebase_credentials)
-firebase_admin.initialize_app(cred)
+# //////////////////////////////// (instrumentação)
+
+def stream_query(query, collection_name):
+    """
+    Executa a consulta registrando a consulta, os documentos e os bytes lidos da coleção.
+    """
+    return instrument_stream(query.stream(), collection_name)
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_latency(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        ROUTE_LATENCY.observe(time.perf_counter() - start, route=route, method=request.method, status=response.status_code)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Rota para retornar as métricas de instrumentação no formato de texto do Prometheus.
+    """
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+# //////////////////////////////// (streaming)
+
+def prefetch(iterable):
+    """
+    Lê o primeiro item do iterável imediatamente e devolve um iterador equivalente.
+
+    Como a resposta em streaming só começa depois do primeiro byte, isso garante que
+    erros de conexão com o Firestore ainda resultem em uma resposta 500.
+    """
+    iterator = iter(iterable)
+    try:
+        first = next(iterator)
+    except StopIteration:
+        return iter(())
+    return itertools.chain([first], iterator)
+
+def stream_json_object(items):
+    """
+    Escreve progressivamente um objeto JSON a partir de pares (chave, valor).
+    """
+    yield "{"
+    for index, (key, value) in enumerate(items):
+        yield ("," if index else "") + app.json.dumps(key) + ":" + app.json.dumps(value)
+    yield "}"
+
+def stream_json_array(items):
+    """
+    Escreve progressivamente um array JSON a partir dos itens.
+    """
+    yield "["
+    for index, item in enumerate(items):
+        yield ("," if index else "") + app.json.dumps(item)
+    yield "]"
+
+def stream_ndjson(items):
+    """
+    Escreve um documento JSON por linha (NDJSON). Um erro no meio do streaming vira uma última linha com `error`.
+    """
+    try:
+        for item in items:
+            yield app.json.dumps(item) + "\n"
+    except Exception as e:
+        yield app.json.dumps({"error": str(e)}) + "\n"
+
+def streaming_response(chunks, mimetype):
+    """
+    Cria uma resposta em streaming: a memória usada não depende do tamanho da coleção.
+    """
+    return Response(stream_with_context(chunks), mimetype=mimetype)
+
+def wants_ndjson():
+    """
+    Verifica se o cliente pediu o formato NDJSON (`format=ndjson`).
+    """
+    return request.args.get('format', 'json').lower() == 'ndjson'
+
+# //////////////////////////////// (negociação de formato e compressão)
+
+def wants_msgpack_response():
+    """
+    Verifica se o cliente pediu MessagePack (`Accept: application/msgpack`).
+    """
+    return wants_msgpack(request.accept_mimetypes)
+
+@app.after_request
+def negotiate_response(response):
+    # As respostas de dados variam com o Accept (JSON ou MessagePack) e com o Accept-Encoding
+    if response.mimetype in ('application/json', MSGPACK_MIMETYPE):
+        response.vary.add('Accept')
+    return compress_response(response, request.accept_encodings)
+
+# //////////////////////////////// (coalescência)
+
+# Requisições simultâneas com os mesmos parâmetros compartilham uma única leitura/cálculo
+REQUEST_COALESCING_ENABLED = os.getenv("REQUEST_COALESCING_ENABLED", "true").lower() == "true"
+
+def call_key(*args, **kwargs):
+    """
+    Chave de coalescência com todos os parâmetros da chamada (None quando a coalescência está desativada).
+    """
+    return freeze((args, kwargs)) if REQUEST_COALESCING_ENABLED else None
+
+def metric_call_key(aggregates=None, filters=None):
+    """
+    Chave de coalescência das funções `calculate_*`. Chamadas com `aggregates` já calculados (ex.:
+    no /api/batch) não leem o banco e não são coalescidas.
+    """
+    return call_key(filters) if aggregates is None else None
+
+# //////////////////////////////// (paginação)
+
+# Campo especial do Firestore que representa o id do documento (chave de ordenação estável)
+DOCUMENT_ID_FIELD = '__name__'
+
+# Tamanho de página padrão e máximo para as rotas de coleções
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
 
-# Conexão com o Firestore
-db = firestore.client()
+def encode_cursor(doc_id):
+    """
+    Gera o cursor opaco que aponta para depois do documento informado.
+    """
+    payload = json.dumps({"after": doc_id}).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii")
+
+def decode_cursor(cursor):
+    """
+    Recupera o id do documento a partir do cursor opaco.
+
+    Lança:
+    ValueError: Se o cursor for inválido.
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return str(payload["after"])
+    except Exception:
+        raise ValueError("Cursor inválido.")
+
+def parse_page_size(value):
+    """
+    Valida o parâmetro `limit` da paginação.
+
+    Lança:
+    ValueError: Se o valor não for um inteiro entre 1 e MAX_PAGE_SIZE.
+    """
+    if value is None:
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError("O parâmetro limit deve ser um número inteiro.")
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        raise ValueError(f"O parâmetro limit deve estar entre 1 e {MAX_PAGE_SIZE}.")
+    return limit
+
+def parse_fields(value):
+    """
+    Valida o parâmetro `fields` (lista de campos separados por vírgula).
+
+    Retorna:
+    list: Campos pedidos, ou None para retornar o documento inteiro.
+
+    Lança:
+    ValueError: Se a lista estiver vazia.
+    """
+    if value is None:
+        return None
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    if not fields:
+        raise ValueError("O parâmetro fields deve conter ao menos um campo.")
+    return fields
+
+def collection_query(collection_name, fields=None):
+    """
+    Monta a consulta da coleção, com projeção (`select`) quando `fields` for informado.
+    """
+    query = get_db().collection(collection_name)
+    if fields:
+        query = query.select(fields)
+    return query
+
+@coalesced("fetch_collection_page", key=call_key)
+def fetch_collection_page(collection_name, limit, cursor=None, fields=None):
+    """
+    Busca uma página da coleção ordenada pelo id do documento.
+
+    Parâmetros:
+    collection_name (str): Nome da coleção.
+    limit (int): Quantidade máxima de documentos da página.
+    cursor (str, opcional): Cursor retornado pela página anterior.
+    fields (list, opcional): Campos a retornar de cada documento.
+
+    Retorna:
+    dict: Contendo os documentos da página (`data`) e o cursor da próxima página (`next_cursor`, None na última).
+    """
+    query = collection_query(collection_name, fields).order_by(DOCUMENT_ID_FIELD)
+    if cursor:
+        query = query.start_after({DOCUMENT_ID_FIELD: decode_cursor(cursor)})
+
+    # Busca um documento a mais para saber se existe uma próxima página
+    docs = list(stream_query(query.limit(limit + 1), collection_name))
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+
+    return {
+        "data": {doc.id: doc.to_dict() for doc in docs},
+        "next_cursor": encode_cursor(docs[-1].id) if has_more else None
+    }
+
+def get_collection_data(collection_name):
+    """
+    Retorna os documentos de uma coleção, paginados por `limit` e `cursor`.
+
+    Com `all=true` a coleção inteira é retornada como antes, no formato {id: documento}, escrita
+    progressivamente. Com `format=ndjson` a coleção inteira é retornada com um documento por linha
+    ({"id": ..., "data": {...}}). Em todos os modos, `fields` limita os campos lidos do Firestore.
+    """
+    try:
+        try:
+            fields = parse_fields(request.args.get('fields'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        stream_all = wants_ndjson() or request.args.get('all', 'false').lower() == 'true'
+
+        # Em MessagePack a coleção inteira é uma sequência de {"id": ..., "data": {...}}, com o heg_data em binário
+        if stream_all and wants_msgpack_response():
+            docs = prefetch(stream_query(collection_query(collection_name, fields), collection_name))
+            rows = ({"id": doc.id, "data": pack_heg_fields(doc.to_dict())} for doc in docs)
+            return streaming_response(stream_msgpack(rows), MSGPACK_MIMETYPE)
+
+        if wants_ndjson():
+            docs = prefetch(stream_query(collection_query(collection_name, fields), collection_name))
+            rows = ({"id": doc.id, "data": doc.to_dict()} for doc in docs)
+            return streaming_response(stream_ndjson(rows), 'application/x-ndjson')
+
+        if request.args.get('all', 'false').lower() == 'true':
+            docs = prefetch(stream_query(collection_query(collection_name, fields), collection_name))
+            items = ((doc.id, doc.to_dict()) for doc in docs)
+            return streaming_response(stream_json_object(items), 'application/json')
+
+        try:
+            limit = parse_page_size(request.args.get('limit'))
+            page = fetch_collection_page(collection_name, limit, request.args.get('cursor'), fields)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        if wants_msgpack_response():
+            # A página pode ser compartilhada com outras requisições (coalescência): não é alterada
+            page = {**page, "data": {doc_id: pack_heg_fields(data) for doc_id, data in page["data"].items()}}
+        return jsonify(page), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
 # Rotas para obter os dados do Firestore
 @app.route('/api/users', methods=['GET'])
 def get_users_data():
+    return get_collection_data('users')
+
+@app.route('/api/sessionAvatar', methods=['GET'])
+def get_avatar_data():
+    return get_collection_data('sessionAvatar')
+
+@app.route('/api/sessionMeditation', methods=['GET'])
+def get_meditation_data():
+    return get_collection_data('sessionMeditation')
+
+@app.route('/api/sessionQuestionary', methods=['GET'])
+def get_questionary_data():
+    return get_collection_data('sessionQuestionary')
+
+@app.route('/api/subscriptions', methods=['GET'])
+def get_subscriptions_data():
+    return get_collection_data('subscriptions')
+
+# Subcoleções de cada documento da coleção 'activities'
+ACTIVITY_SUBCOLLECTIONS = ['avatar', 'meditation', 'questionary']
+
+def iter_activity_subcollection(name):
+    """
+    Percorre de uma só vez todos os documentos de uma subcoleção de 'activities' usando collection group.
+
+    Parâmetros:
+    name (str): Nome da subcoleção (avatar, meditation ou questionary).
+
+    Retorna:
+    iterator: Pares (id da atividade pai, documento), ordenados pelo caminho do documento.
+    """
+    for doc in stream_query(get_db().collection_group(name).order_by(DOCUMENT_ID_FIELD), name):
+        # Ignora subcoleções de mesmo nome que não pertencem a 'activities'
+        activity_ref = doc.reference.parent.parent
+        if activity_ref is None or activity_ref.parent.id != 'activities' or activity_ref.parent.parent is not None:
+            continue
+        yield activity_ref.id, doc.to_dict()
+
+def iter_activities(subcols):
+    """
+    Junta as atividades às suas subcoleções sem manter a coleção em memória.
+
+    As atividades e cada collection group são lidos ordenados pelo caminho do documento, então as
+    subcoleções de uma atividade chegam em sequência e podem ser unidas por merge-join. São
+    1 + len(subcols) consultas abertas ao mesmo tempo, independente do número de atividades, e
+    cada uma é lida em paralelo (`ReadAhead`) em vez de esperar pelas outras.
+
+    Retorna:
+    iterator: Cada atividade com `id` e `subcollections`.
+    """
+    readers = [ReadAhead(stream_query(get_db().collection('activities').order_by(DOCUMENT_ID_FIELD), 'activities'))]
+    readers += [ReadAhead(iter_activity_subcollection(name)) for name in subcols]
     try:
-        data_ref = db.collection('users')
-        docs = data_ref.stream()
-        data = {doc.id: doc.to_dict() for doc in docs}
-        return jsonify(data), 200
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        yield from merge_activities(readers[0], dict(zip(subcols, readers[1:])))
+    finally:
+        for reader in readers:
+            reader.close()
+
+def merge_activities(activities, streams):
+    """
+    Une cada atividade aos documentos das suas subcoleções (merge-join pelo id da atividade).
+    """
+    activities = prefetch(activities)
+    streams = {name: prefetch(stream) for name, stream in streams.items()}
+    subcols = list(streams)
+    pending = {name: next(stream, None) for name, stream in streams.items()}
+
+    for activity in activities:
+        data = activity.to_dict()
+        data['id'] = activity.id
+
+        subcollections = {}
+        for name in subcols:
+            docs = []
+            # Descarta documentos de atividades que não existem mais
+            while pending[name] is not None and pending[name][0] < activity.id:
+                pending[name] = next(streams[name], None)
+            while pending[name] is not None and pending[name][0] == activity.id:
+                docs.append(pending[name][1])
+                pending[name] = next(streams[name], None)
+            subcollections[name] = docs
+
+        data['subcollections'] = subcollections
+        yield data
 
 @app.route('/activities', methods=['GET'])
 def get_activities():
     try:
-        activities_ref = db.collection('activities')
-        activities = []
-        for activity in activities_ref.stream():
-            data = activity.to_dict()
-            data['id'] = activity.id
-            
-            # Busca subcoleções (avatar, meditation, questionary)
-            subcollections = {}
-            for subcol in ['avatar', 'meditation', 'questionary']:
-                subcol_ref = activities_ref.document(activity.id).collection(subcol)
-                subcollections[subcol] = [doc.to_dict() for doc in subcol_ref.stream()]
-            
-            data['subcollections'] = subcollections
-            activities.append(data)
-        
-        return jsonify(activities), 200
+        # Parâmetro opcional `include` para escolher quais subcoleções buscar (padrão: todas)
+        include = request.args.get('include')
+        if include is None:
+            subcols = ACTIVITY_SUBCOLLECTIONS
+        else:
+            subcols = [name.strip() for name in include.split(',') if name.strip()]
+            invalid = [name for name in subcols if name not in ACTIVITY_SUBCOLLECTIONS]
+            if invalid:
+                return jsonify({'error': f"Subcoleção inválida em include: {', '.join(invalid)}"}), 400
+
+        activities = prefetch(iter_activities(subcols))
+
+        # Em MessagePack as atividades são enviadas como uma sequência de objetos
+        if wants_msgpack_response():
+            return streaming_response(stream_msgpack(activities), MSGPACK_MIMETYPE)
+
+        # Com `format=ndjson` cada atividade é enviada em uma linha
+        if wants_ndjson():
+            return streaming_response(stream_ndjson(activities), 'application/x-ndjson')
+
+        return streaming_response(stream_json_array(activities), 'application/json')
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/sessionAvatar', methods=['GET'])
-def get_avatar_data():
+# Rota para adicionar novos dados ao Firestore
+@app.route('/users', methods=['POST'])
+def add_data():
     try:
-        data_ref = db.collection('sessionAvatar')
-        docs = data_ref.stream()
-        data = {doc.id: doc.to_dict() for doc in docs}
-        return jsonify(data), 200
+        new_data = request.json
+        get_db().collection('users').add(new_data)
+        return jsonify({"success": True}), 201
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/sessionMeditation', methods=['GET'])
-def get_meditation_data():
+# Rota para adicionar uma sessão ao Firestore, já com o resumo usado pelas métricas
+@app.route('/api/sessionQuestionary', methods=['POST'])
+def add_questionary_session():
     try:
-        data_ref = db.collection('sessionMeditation')
-        docs = data_ref.stream()
-        data = {doc.id: doc.to_dict() for doc in docs}
-        return jsonify(data), 200
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        doc_id, session_data = prepare_record('sessionQuestionary', request.get_json(silent=True), SESSION_DATE_FIELD)
+    except ValueError as e:
+        return jsonify({"error": f"Sessão inválida: {e}"}), 400
 
-@app.route('/api/sessionQuestionary', methods=['GET'])
-def get_questionary_data():
     try:
-        data_ref = db.collection('sessionQuestionary')
-        docs = data_ref.stream()
-        data = {doc.id: doc.to_dict() for doc in docs}
-        return jsonify(data), 200
+        reference = get_db().collection('sessionQuestionary').document(doc_id)
+        reference.set(session_data)
+        invalidate_metrics()
+        return jsonify({"success": True, "id": reference.id}), 201
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/subscriptions', methods=['GET'])
-def get_subscriptions_data():
+# //////////////////////////////// (ingestão em lote)
+
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+
+def stream_ingest_report(results, response_format):
+    """
+    Escreve o resultado de cada registro seguido do resumo (`received`, `written`, `failed`).
+
+    Parâmetros:
+    response_format (str): `json`, `ndjson` ou `msgpack` (sequência de objetos, como no NDJSON).
+    """
+    counts = {"ok": 0, "error": 0}
+
+    def counted():
+        for result in results:
+            counts[result["status"]] += 1
+            yield result
+
+    def summary():
+        return {"received": counts["ok"] + counts["error"], "written": counts["ok"], "failed": counts["error"]}
+
+    if response_format == 'msgpack':
+        yield from stream_msgpack(counted())
+        yield packb({"summary": summary()})
+        return
+
+    if response_format == 'ndjson':
+        yield from stream_ndjson(counted())
+        yield app.json.dumps({"summary": summary()}) + "\n"
+        return
+
+    yield '{"results":'
+    yield from stream_json_array(counted())
+    yield ',"summary":' + app.json.dumps(summary()) + '}'
+
+@app.route('/api/<collection_name>/bulk', methods=['POST'])
+def bulk_ingest(collection_name):
+    """
+    Rota para importar muitas sessões de uma vez.
+
+    O corpo pode ser NDJSON (Content-Type application/x-ndjson, um registro por linha) ou um
+    array JSON. Registros com `id` são gravados com esse id (reimportações sobrescrevem em vez
+    de duplicar). A resposta traz o resultado de cada registro na ordem do corpo
+    (`format=ndjson` para recebê-lo em NDJSON).
+
+    Todos os registros são gravados antes de a resposta começar: um cliente que desconecta
+    durante a resposta não interrompe a ingestão no meio.
+    """
+    if collection_name not in INGEST_COLLECTIONS:
+        return jsonify({"error": f"A ingestão em lote aceita apenas: {', '.join(INGEST_COLLECTIONS)}."}), 404
+
+    if request.mimetype in NDJSON_MIMETYPES:
+        records = iter_ndjson(request.stream)
+    else:
+        records = iter_json_array(request.stream)
+
     try:
-        data_ref = db.collection('subscriptions')
-        docs = data_ref.stream()
-        data = {doc.id: doc.to_dict() for doc in docs}
-        return jsonify(data), 200
+        # Consome o corpo e confirma todos os lotes aqui; só o relatório é enviado em streaming
+        results = list(invalidate_metrics_after(
+            ingest_records(get_db(), collection_name, records, SESSION_DATE_FIELD)
+        ))
+        if wants_msgpack_response():
+            response_format, mimetype = 'msgpack', MSGPACK_MIMETYPE
+        elif wants_ndjson():
+            response_format, mimetype = 'ndjson', 'application/x-ndjson'
+        else:
+            response_format, mimetype = 'json', 'application/json'
+        return streaming_response(stream_ingest_report(results, response_format), mimetype)
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        logger.error(f"Erro na ingestão em lote de {collection_name}: {e}")
+        return jsonify({"error": f"Erro na ingestão em lote de {collection_name}."}), 500
+
+# //////////////////////////////// (varredura única)
+
+# Acumuladores disponíveis para a varredura da coleção 'sessionQuestionary'
+SESSION_ACCUMULATORS = {
+    "brain_activity": HegMeanAccumulator,
+    "game_metrics": GoNoGoAccumulator,
+    "stress": lambda: FormAnswerAccumulator("stress", index=0, max_score=21),
+    "focus": lambda: FormAnswerAccumulator("focus", index=1, max_score=36),
+    "control": lambda: FormAnswerAccumulator("control", index=2, max_score=36),
+    "distributions": DistributionAccumulator,
+}
+
+# Acumuladores usados pelo PerformanceGlobal (sem as distribuições, que não entram no cálculo)
+PERFORMANCE_ACCUMULATORS = ("brain_activity", "game_metrics", "stress", "focus", "control")
+
+# //////////////////////////////// (filtros)
+
+# Campo de data das sessões usado nos filtros `from`/`to` e no agrupamento por período
+SESSION_DATE_FIELD = os.getenv("SESSION_DATE_FIELD", "updated_at")
+
+def parse_date_bound(name, value):
+    """
+    Converte o valor de `from`/`to` (data ou data e hora ISO 8601) para datetime.
+
+    Uma data sem hora em `to` inclui o dia inteiro. Como os filtros usam `to` como limite
+    exclusivo, o valor retornado para `to` é o instante seguinte ao informado.
+
+    Lança:
+    ValueError: Se o valor não for uma data válida.
+    """
+    date = parse_timestamp(value)
+    if not isinstance(value, str) or date is None:
+        raise ValueError(f"O parâmetro {name} deve ser uma data ISO 8601 (ex.: 2024-01-31).")
+    if name == 'to':
+        date += timedelta(days=1) if len(value.strip()) == 10 else timedelta(microseconds=1)
+    return date
+
+def parse_session_filters(args=None):
+    """
+    Valida os filtros opcionais das métricas: `user_id`, `from` e `to`.
+
+    Parâmetros:
+    args (dict, opcional): Parâmetros a validar (padrão: a query string da requisição).
+
+    Retorna:
+    dict: Filtros informados (`user_id`, `from`, `to`), ou None se nenhum foi informado.
+
+    Lança:
+    ValueError: Se alguma data for inválida ou `from` não for anterior a `to`.
+    """
+    args = request.args if args is None else args
+    filters = {}
+
+    if args.get('user_id'):
+        filters['user_id'] = str(args['user_id'])
+    for name in ('from', 'to'):
+        if args.get(name):
+            filters[name] = parse_date_bound(name, args[name])
+
+    if 'from' in filters and 'to' in filters and filters['from'] >= filters['to']:
+        raise ValueError("O parâmetro from deve ser anterior a to.")
+    return filters or None
+
+def session_query(collection_name, fields, filters=None):
+    """
+    Monta a consulta de uma coleção de sessões lendo apenas `fields` e aplicando os filtros no Firestore.
+
+    O filtro de usuário com intervalo de datas usa o índice composto (user_id, SESSION_DATE_FIELD)
+    definido em `firestore.indexes.json`.
+    """
+    query = get_db().collection(collection_name).select(fields)
+    if not filters:
+        return query
+
+    if 'user_id' in filters:
+        query = query.where(filter=field_filter('user_id', '==', filters['user_id']))
+    if 'from' in filters:
+        query = query.where(filter=field_filter(SESSION_DATE_FIELD, '>=', filters['from']))
+    if 'to' in filters:
+        query = query.where(filter=field_filter(SESSION_DATE_FIELD, '<', filters['to']))
+    return query
+
+# //////////////////////////////// (resumos)
+
+# Lê o resumo gravado em cada sessão em vez dos arrays brutos (ativar após o backfill-summaries)
+SESSION_SUMMARIES_ENABLED = os.getenv("SESSION_SUMMARIES_ENABLED", "false").lower() == "true"
+
+# Sessões sem resumo completadas com os campos brutos a cada get_all
+SUMMARY_FALLBACK_BATCH = 100
+
+class SessionSnapshot:
+    """
+    Documento com os campos brutos mesclados ao resumo lido, na mesma interface do snapshot do Firestore.
+    """
+
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+def with_raw_fields(sessions, keys, raw_fields):
+    """
+    Completa com os campos brutos as sessões cujo resumo gravado não cobre as partes `keys`
+    (sessões antigas ou resumos de versão anterior), lendo-as em lotes com `get_all`.
+
+    Parâmetros:
+    sessions: Documentos lidos com a projeção do resumo.
+    keys (list): Partes do resumo usadas pelos acumuladores.
+    raw_fields (list): Campos brutos de onde essas partes são calculadas.
+    """
+    sessions = iter(sessions)
+    while True:
+        chunk = list(itertools.islice(sessions, SUMMARY_FALLBACK_BATCH))
+        if not chunk:
+            return
+
+        missing = [doc for doc in chunk if needs_raw_fields(doc.to_dict(), keys)]
+        raw = {}
+        if missing:
+            snapshots = get_db().get_all([doc.reference for doc in missing], field_paths=raw_fields)
+            raw = {snapshot.id: snapshot.to_dict() or {} for snapshot in snapshots}
+            record_documents_read('sessionQuestionary', list(raw.values()))
+            log_event(logger, logging.DEBUG, "summary_fallback", sessions=len(missing))
+
+        for doc in chunk:
+            if doc.id in raw:
+                yield SessionSnapshot(doc.id, {**doc.to_dict(), **raw[doc.id]})
+            else:
+                yield doc
+
+@app.cli.command('backfill-summaries')
+@click.option('--batch-size', default=500, show_default=True, help="Escritas por lote (máximo 500).")
+@click.option('--force', is_flag=True, help="Recalcula também os resumos já atualizados.")
+def backfill_summaries(batch_size, force):
+    """
+    Grava o resumo das sessões da coleção 'sessionQuestionary' que ainda não o têm ou cujo resumo
+    não corresponde mais aos campos brutos (versão antiga ou campos alterados depois do resumo).
+    """
+    db = get_db()
+    sessions = db.collection('sessionQuestionary').select(source_fields() + [SUMMARY_FIELD]).stream()
+
+    def updates():
+        for doc in sessions:
+            session_data = doc.to_dict()
+            if force or not is_summary_current(session_data):
+                yield doc.reference, {SUMMARY_FIELD: summarize_session(session_data)}
+
+    updated = apply_updates(db, 'sessionQuestionary', updates(), batch_size)
+    click.echo(f"{updated} sessões atualizadas.")
+
+@app.cli.command('pack-heg-data')
+@click.option('--batch-size', default=500, show_default=True, help="Escritas por lote (máximo 500).")
+@click.option('--unpack', is_flag=True, help="Converte de volta para a lista de números (reverte a migração).")
+def pack_heg_data(batch_size, unpack):
+    """
+    Converte o 'heg_data' das sessões existentes para o formato compacto (float32 em bytes).
+    """
+    db = get_db()
+    sessions = db.collection('sessionQuestionary').select(['heg_data']).stream()
+    skipped = 0
+
+    def updates():
+        nonlocal skipped
+        for doc in sessions:
+            heg_data = doc.to_dict().get('heg_data')
+            if not heg_data or is_packed_heg(heg_data) == (not unpack):
+                continue
+            try:
+                heg_data = unpack_heg(heg_data).tolist() if unpack else pack_heg(heg_data)
+            except ValueError as e:
+                log_event(logger, logging.WARNING, "heg_data_not_converted", session_id=doc.id, error=e)
+                skipped += 1
+                continue
+            yield doc.reference, {'heg_data': heg_data}
+
+    updated = apply_updates(db, 'sessionQuestionary', updates(), batch_size)
+    click.echo(f"{updated} sessões convertidas, {skipped} ignoradas (heg_data inválido).")
+
+# ////////////////////////////////
+
+def scan_call_key(*names, extra=(), filters=None):
+    # Acumuladores extras são instâncias próprias de cada chamada
+    return None if extra else call_key(names, filters)
+
+@coalesced("scan_session_questionary", key=scan_call_key)
+@timed_stage("scan_session_questionary")
+def scan_session_questionary(*names, extra=(), filters=None):
+    """
+    Lê cada documento da coleção 'sessionQuestionary' uma única vez e alimenta os acumuladores pedidos.
+
+    Parâmetros:
+    names: Nomes dos acumuladores em `SESSION_ACCUMULATORS` (todos, se nenhum for informado).
+    extra (list, opcional): Acumuladores adicionais já instanciados (ex.: agrupamento por período).
+    filters (dict, opcional): Filtros `user_id`, `from` e `to`, aplicados na própria consulta.
+
+    Retorna:
+    dict: Resultado de cada acumulador indexado pelo seu nome.
+    """
+    accumulators = [SESSION_ACCUMULATORS[name]() for name in (names or SESSION_ACCUMULATORS)]
+    accumulators += list(extra)
+
+    if SESSION_SUMMARIES_ENABLED:
+        # Os acumuladores com `summary_key` leem o resumo; os campos brutos só são buscados
+        # para as sessões que ainda não o têm
+        summarized = [accumulator for accumulator in accumulators if getattr(accumulator, "summary_key", None)]
+        keys = sorted({accumulator.summary_key for accumulator in summarized})
+        raw_fields = sorted({field for accumulator in summarized for field in accumulator.fields})
+        fields = sorted({SUMMARY_FIELD} | {
+            field for accumulator in accumulators if accumulator not in summarized for field in accumulator.fields
+        })
+        sessions = stream_query(session_query('sessionQuestionary', fields, filters), 'sessionQuestionary')
+        return scan_documents(with_raw_fields(sessions, keys, raw_fields), accumulators)
+
+    # Lê apenas os campos usados pelos acumuladores (ex.: sem 'heg_data' quando só o form_answer é necessário)
+    fields = sorted({field for accumulator in accumulators for field in accumulator.fields})
+    sessions = stream_query(session_query('sessionQuestionary', fields, filters), 'sessionQuestionary')
+    return scan_documents(sessions, accumulators)
+
+# //////////////////////////////// (agregados incrementais)
+
+# Mantém os agregados em memória via on_snapshot (desligado por padrão, pois depende de um processo de longa duração)
+AGGREGATE_STORE_ENABLED = os.getenv("AGGREGATE_STORE_ENABLED", "false").lower() == "true"
+AGGREGATE_STORE_TIMEOUT = float(os.getenv("AGGREGATE_STORE_TIMEOUT", "30"))
+
+_aggregate_store = None
+_aggregate_store_pid = None
+_aggregate_store_lock = threading.Lock()
+
+def start_aggregate_store(feed):
+    """
+    Cria o agregado incremental do processo atual a partir de uma fonte de eventos.
+
+    Parâmetros:
+    feed: Fonte de eventos (`FirestoreChangeFeed` ou `InMemoryChangeFeed`).
+
+    Retorna:
+    AggregateStore: O agregado recém-criado.
+    """
+    global _aggregate_store, _aggregate_store_pid
+
+    with _aggregate_store_lock:
+        if _aggregate_store is not None:
+            _aggregate_store.stop()
+
+        # As alterações vistas pelo listener (de qualquer worker) também invalidam as métricas agendadas
+        store = AggregateStore(SESSION_ACCUMULATORS, on_change=invalidate_metrics)
+        if not store.start(feed, timeout=AGGREGATE_STORE_TIMEOUT):
+            logger.warning("O snapshot inicial de 'sessionQuestionary' não chegou dentro do tempo limite.")
+
+        _aggregate_store = store
+        _aggregate_store_pid = os.getpid()
+        return store
+
+def get_aggregate_store():
+    """
+    Retorna o agregado incremental do processo atual, iniciando o listener na primeira chamada.
+
+    O listener é criado por processo (e não na importação) para que cada worker do gunicorn tenha o seu.
+
+    Retorna:
+    AggregateStore: O agregado pronto para consulta, ou None se estiver desativado ou ainda não semeado.
+    """
+    if _aggregate_store is None or _aggregate_store_pid != os.getpid():
+        if not AGGREGATE_STORE_ENABLED:
+            return None
+        start_aggregate_store(FirestoreChangeFeed(get_db().collection('sessionQuestionary')))
+
+    return _aggregate_store if _aggregate_store.ready else None
+
+# //////////////////////////////// (snapshot colunar)
+
+# Diretório do snapshot colunar local (vazio: desativado)
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "")
+
+# Idade máxima (em segundos) do snapshot usado pelas métricas; acima disso elas voltam a ler o Firestore
+SNAPSHOT_MAX_AGE = float(os.getenv("SNAPSHOT_MAX_AGE", "900"))
+
+_snapshot_reader = SnapshotReader(SNAPSHOT_DIR) if SNAPSHOT_DIR else None
+
+def get_snapshot():
+    """
+    Retorna a versão atual do snapshot, ou None se ele estiver desativado, ainda não existir ou for
+    mais antigo que SNAPSHOT_MAX_AGE.
+    """
+    if _snapshot_reader is None:
+        return None
+    snapshot = _snapshot_reader.current()
+    if snapshot is None or snapshot.date_field != SESSION_DATE_FIELD or snapshot.age() > SNAPSHOT_MAX_AGE:
+        return None
+    return snapshot
+
+@timed_stage("snapshot_session_aggregates")
+def snapshot_session_aggregates(*names, filters=None):
+    """
+    Calcula os acumuladores pedidos a partir do snapshot colunar, sem ler o Firestore.
+
+    Retorna:
+    dict: Resultado de cada acumulador indexado pelo seu nome, ou None se não houver snapshot
+        atualizado ou algum acumulador não puder ser calculado a partir dele.
+    """
+    snapshot = get_snapshot()
+    collection = snapshot.collection('sessionQuestionary') if snapshot is not None else None
+    if collection is None:
+        return None
+    accumulators = [SESSION_ACCUMULATORS[name]() for name in (names or SESSION_ACCUMULATORS)]
+    return snapshot_aggregates(collection, accumulators, filters, SESSION_DATE_FIELD)
+
+def read_snapshot_collection(collection_name, since=None):
+    """
+    Lê os documentos da coleção para o snapshot (apenas os com data a partir de `since`, se informada).
+    """
+    query = get_db().collection(collection_name)
+    if since is not None:
+        query = query.where(filter=field_filter(SESSION_DATE_FIELD, '>=', since))
+    return stream_query(query, collection_name)
+
+@app.cli.command('export-snapshot')
+@click.option('--full', is_flag=True, help="Relê as coleções inteiras (necessário para refletir exclusões).")
+def export_snapshot_command(full):
+    """
+    Exporta as coleções para o snapshot colunar em SNAPSHOT_DIR (de forma incremental, se já existir).
+    """
+    if not SNAPSHOT_DIR:
+        raise click.ClickException("Defina SNAPSHOT_DIR para exportar o snapshot.")
+    stats = export_snapshot(SNAPSHOT_DIR, read_snapshot_collection, SESSION_DATE_FIELD, full=full)
+    for name, collection_stats in stats.items():
+        click.echo(f"{name}: {collection_stats['mode']}, {collection_stats['read']} documentos lidos, "
+                   f"{collection_stats['rows']} no snapshot.")
+
+@app.route('/api/snapshot', methods=['GET'])
+def get_snapshot_status():
+    """
+    Rota para retornar o estado do snapshot colunar: data da exportação, idade e marca d'água de cada coleção.
+    """
+    snapshot = _snapshot_reader.current() if _snapshot_reader is not None else None
+    if snapshot is None:
+        return jsonify({"enabled": _snapshot_reader is not None, "available": False})
+
+    return jsonify({
+        "enabled": True,
+        "available": True,
+        "in_use": get_snapshot() is not None,
+        "exported_at": snapshot.exported_at.isoformat(),
+        "age_seconds": round(snapshot.age(), 1),
+        "max_age_seconds": SNAPSHOT_MAX_AGE,
+        "collections": {
+            name: {"rows": meta["rows"], "watermark": meta["watermark"]}
+            for name, meta in snapshot.manifest["collections"].items()
+        },
+    })
+
+# ////////////////////////////////
+
+def load_session_aggregates(*names, extra=(), filters=None):
+    """
+    Retorna os resultados dos acumuladores pedidos, usando o agregado incremental ou o snapshot
+    colunar quando disponíveis.
+
+    Parâmetros:
+    names: Nomes dos acumuladores em `SESSION_ACCUMULATORS` (todos, se nenhum for informado).
+    extra (list, opcional): Acumuladores adicionais, calculados na mesma varredura quando ela for necessária.
+    filters (dict, opcional): Filtros `user_id`, `from` e `to`. O agregado incremental cobre a coleção
+        inteira, então consultas filtradas são respondidas pelo snapshot ou pela leitura apenas dos
+        documentos que atendem aos filtros.
+
+    Retorna:
+    dict: Resultado de cada acumulador indexado pelo seu nome.
+    """
+    store = get_aggregate_store() if not filters else None
+    if store is None:
+        results = snapshot_session_aggregates(*names, filters=filters) if not extra else None
+        if results is not None:
+            return results
+        return scan_session_questionary(*names, extra=extra, filters=filters)
+
+    results = store.results(*names)
+    if extra:
+        fields = sorted({field for accumulator in extra for field in accumulator.fields})
+        sessions = stream_query(get_db().collection('sessionQuestionary').select(fields), 'sessionQuestionary')
+        results.update(scan_documents(sessions, extra))
+    return results
+
+# //////////////////////////////// (recálculo em segundo plano)
+
+# Serve as métricas pesadas a partir do último resultado e as recalcula em segundo plano (desligado por padrão)
+METRIC_SCHEDULER_ENABLED = os.getenv("METRIC_SCHEDULER_ENABLED", "false").lower() == "true"
+METRIC_REFRESH_INTERVAL = float(os.getenv("METRIC_REFRESH_INTERVAL", "60"))
+METRIC_MAX_STALENESS = float(os.getenv("METRIC_MAX_STALENESS", "300"))
+METRIC_JOB_CONCURRENCY = int(os.getenv("METRIC_JOB_CONCURRENCY", "2"))
+
+# Métricas servidas pelo agendador: nome -> função que recebe os parâmetros congelados (hasheáveis)
+SCHEDULED_METRICS = {
+    "global-performance": lambda filters: calculate_global_performance(filters=dict(filters) or None),
+    "performance-global": lambda filters: calculate_performance_global(filters=dict(filters) or None),
+    "gonogo-final-mean": lambda filters: calculate_gonogo_final_mean(filters=dict(filters) or None),
+    "batch": lambda names, granularity, filters: run_metric_batch(
+        list(names), {"granularity": granularity, "filters": dict(filters) or None}
+    ),
+}
+
+_metric_scheduler = None
+_metric_scheduler_pid = None
+_metric_scheduler_lock = threading.Lock()
+
+def freeze_filters(filters):
+    """
+    Converte os filtros em uma tupla (chave do resultado guardado pelo agendador).
+    """
+    return tuple(sorted(filters.items())) if filters else ()
+
+def get_metric_scheduler():
+    """
+    Retorna o agendador do processo atual (criado na primeira chamada de cada worker), ou None se estiver desativado.
+    """
+    global _metric_scheduler, _metric_scheduler_pid
+
+    if not METRIC_SCHEDULER_ENABLED:
+        return None
+    with _metric_scheduler_lock:
+        if _metric_scheduler is None or _metric_scheduler_pid != os.getpid():
+            scheduler = MetricScheduler(METRIC_REFRESH_INTERVAL, METRIC_MAX_STALENESS, METRIC_JOB_CONCURRENCY)
+            for name, compute in SCHEDULED_METRICS.items():
+                # Um lote com alguma métrica com erro não é guardado
+                is_valid = (lambda result: bool(result) and not result["errors"]) if name == "batch" else is_valid_result
+                scheduler.register(name, compute, is_valid)
+            scheduler.start()
+            _metric_scheduler, _metric_scheduler_pid = scheduler, os.getpid()
+        scheduler = _metric_scheduler
+
+    # Com o agregado incremental, o listener do on_snapshot avisa também as gravações de outros workers
+    get_aggregate_store()
+    return scheduler
+
+def serve_metric(name, *args):
+    """
+    Calcula a métrica agendada `name`, servindo o último resultado quando o agendador estiver ativo.
+
+    Parâmetros:
+    name (str): Nome em `SCHEDULED_METRICS`.
+    args: Parâmetros congelados da métrica (ex.: `freeze_filters(filters)`).
+
+    Retorna:
+    tuple: (resultado, metadados). Os metadados trazem `computed_at` e `staleness_seconds` quando
+        o resultado vem do agendador, e ficam vazios caso contrário.
+    """
+    scheduler = get_metric_scheduler()
+    if scheduler is None:
+        return SCHEDULED_METRICS[name](*args), {}
+
+    result, computed_at, staleness = scheduler.get(name, *args)
+    if computed_at is None:
+        return result, {}
+    return result, {"computed_at": computed_at.isoformat(), "staleness_seconds": round(staleness, 3)}
+
+def invalidate_metrics():
+    """
+    Agenda o recálculo das métricas guardadas depois de uma gravação.
 
-# Rota para adicionar novos dados ao Firestore
-@app.route('/users', methods=['POST'])
-def add_data():
-    try:
-        new_data = request.json
-        db.collection('users').add(new_data)
-        return jsonify({"success": True}), 201
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    É chamada pelas rotas de gravação deste worker e, com AGGREGATE_STORE_ENABLED, pelo listener
+    do on_snapshot (que vê as gravações de todos os workers). Sem o agregado incremental, as
+    gravações de outros workers só aparecem quando o resultado passa de METRIC_REFRESH_INTERVAL.
+    """
+    if _metric_scheduler is not None and _metric_scheduler_pid == os.getpid():
+        _metric_scheduler.invalidate()
+
+def invalidate_metrics_after(results):
+    """
+    Repassa os resultados de uma ingestão e agenda o recálculo das métricas ao final.
+    """
+    yield from results
+    invalidate_metrics()
+
+@app.route('/api/metric-jobs', methods=['GET'])
+def get_metric_jobs():
+    """
+    Rota para retornar as estatísticas de cada job do agendador (execuções, falhas e duração).
+    """
+    scheduler = get_metric_scheduler()
+    if scheduler is None:
+        return jsonify({"enabled": False})
+    return jsonify({
+        "enabled": True,
+        "interval_seconds": scheduler.interval,
+        "max_staleness_seconds": scheduler.max_staleness,
+        "jobs": scheduler.stats(),
+    })
 
 # //////////////////////////////// (brain activity)
 
-def calculate_brain_activity():
+@coalesced("calculate_brain_activity", key=metric_call_key)
+@timed_stage("calculate_brain_activity")
+def calculate_brain_activity(aggregates=None, filters=None):
     """
     Calcula a média dos sinais cerebrais (brainActivity) a partir dos dados armazenados no Firestore na coleção 'sessionQuestionary'.
+
+    Parâmetros:
+    aggregates (dict, opcional): Resultado de `load_session_aggregates` já calculado, para reaproveitar a mesma varredura.
+    filters (dict, opcional): Filtros `user_id`, `from` e `to` (ver `parse_session_filters`), usados quando `aggregates` não for informado.
     
     Retorna:
     dict: Contendo a média por sessão e a média final.
     """
     
     try:
-        # Referência para a coleção 'sessionQuestionary'
-        sessions_ref = db.collection('sessionQuestionary')
-        sessions = sessions_ref.stream()
-        
-        session_means = []
-
-        for session in sessions:
-            session_data = session.to_dict()
-            heg_data = session_data.get("heg_data", [])
-
-            # Print para verificar os dados de heg_data de cada sessão
-            print(f"Dados da sessão {session.id} - heg_data: {heg_data}")
-
-            # Converte os dados de heg_data para float e calcula a média por sessão
-            if heg_data:
-                try:
-                    # Convertendo para float e calculando a média
-                    float_values = [float(value) for value in heg_data]
-                    session_mean = sum(float_values) / len(float_values)
-                    session_means.append(session_mean)
-                    
-                    # Print para verificar a média de cada sessão
-                    print(f"Média da sessão {session.id}: {session_mean}")
-                except ValueError as e:
-                    print(f"Erro ao converter valores de heg_data para float na sessão {session.id}: {e}")
-            else:
-                print(f"'heg_data' vazio ou ausente na sessão {session.id}")
+        if aggregates is None:
+            aggregates = load_session_aggregates("brain_activity", filters=filters)
 
-        # Calcula a média final das médias por sessão
-        if session_means:
-            final_mean = sum(session_means) / len(session_means)
-        else:
-            final_mean = 0
-        
-        # Print para a média final
-        print(f"Média final de todas as sessões: {final_mean}")
+        result = aggregates["brain_activity"]
 
-        return {
-            "mean_per_session": session_means,
-            "final_mean": final_mean
-        }
+        if result is not None:
+            log_event(logger, logging.DEBUG, "brain_activity_final_mean", final_mean=result['final_mean'])
+
+        return result
 
     except Exception as e:
-        print(f"Erro ao calcular a média dos dados de sinais cerebrais: {e}")
+        logger.error(f"Erro ao calcular a média dos dados de sinais cerebrais: {e}")
         return None
     
+def parse_heg_analysis_params():
+    """
+    Valida os parâmetros da análise completa do HEG (`percentiles` e `epoch`).
+
+    Retorna:
+    tuple: (percentis, tamanho da janela em amostras ou None)
+
+    Lança:
+    ValueError: Se algum parâmetro for inválido.
+    """
+    percentiles = DEFAULT_PERCENTILES
+    if request.args.get('percentiles'):
+        try:
+            percentiles = tuple(float(value) for value in request.args['percentiles'].split(',') if value.strip())
+        except ValueError:
+            raise ValueError("O parâmetro percentiles deve ser uma lista de números separados por vírgula.")
+        if any(value < 0 or value > 100 for value in percentiles):
+            raise ValueError("Os percentis devem estar entre 0 e 100.")
+
+    epoch = None
+    if request.args.get('epoch'):
+        try:
+            epoch = int(request.args['epoch'])
+        except ValueError:
+            raise ValueError("O parâmetro epoch deve ser um número inteiro.")
+        if epoch < 1:
+            raise ValueError("O parâmetro epoch deve ser maior que zero.")
+
+    return percentiles, epoch
+
 @app.route('/api/brain-activity', methods=['GET'])
 def get_brain_activity():
     """
     Rota para retornar a média dos sinais cerebrais calculados pela função `calculate_brain_activity`.
+
+    Com `stats=full` também retorna a análise vetorizada do HEG (`analysis`): estatísticas por sessão
+    (desvio padrão, mínimo/máximo, percentis, inclinação e médias por janela de `epoch` amostras)
+    e o agregado entre sessões.
     """
-    result = calculate_brain_activity()
+    try:
+        filters = parse_session_filters()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if request.args.get('stats', '').lower() != 'full':
+        result = calculate_brain_activity(filters=filters)
+    else:
+        try:
+            percentiles, epoch = parse_heg_analysis_params()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        signal = HegSignalAccumulator(percentiles, epoch)
+        aggregates = load_session_aggregates("brain_activity", extra=[signal], filters=filters)
+        result = calculate_brain_activity(aggregates)
+        if result is not None and aggregates.get(signal.name) is not None:
+            result = {**result, "analysis": aggregates[signal.name]}
+        else:
+            result = None
     
     if result:
         return jsonify(result)  # Retorna o resultado como um JSON
     else:
         return jsonify({"error": "Erro ao calcular a atividade cerebral."}), 500
 
+# Limites do número de pontos da série de uma sessão
+HEG_SERIES_DEFAULT_POINTS = 500
+HEG_SERIES_MAX_POINTS = 5000
+
+def parse_heg_series_params():
+    """
+    Valida os parâmetros da série do HEG: `max_points`, `method` (`lttb` ou `minmax`) e a janela
+    `start`/`end` (índices das amostras, com `end` exclusivo).
+
+    Retorna:
+    tuple: (max_points, método, start ou None, end ou None)
+
+    Lança:
+    ValueError: Se algum parâmetro for inválido.
+    """
+    try:
+        max_points = int(request.args.get('max_points', HEG_SERIES_DEFAULT_POINTS))
+    except ValueError:
+        raise ValueError("O parâmetro max_points deve ser um número inteiro.")
+    if max_points < 3 or max_points > HEG_SERIES_MAX_POINTS:
+        raise ValueError(f"O parâmetro max_points deve estar entre 3 e {HEG_SERIES_MAX_POINTS}.")
+
+    method = request.args.get('method', 'lttb').lower()
+    if method not in DOWNSAMPLING_METHODS:
+        raise ValueError(f"O parâmetro method deve ser um de: {', '.join(DOWNSAMPLING_METHODS)}.")
+
+    bounds = []
+    for name in ('start', 'end'):
+        value = request.args.get(name)
+        try:
+            value = int(value) if value not in (None, '') else None
+        except ValueError:
+            raise ValueError(f"O parâmetro {name} deve ser um número inteiro.")
+        if value is not None and value < 0:
+            raise ValueError(f"O parâmetro {name} não pode ser negativo.")
+        bounds.append(value)
+
+    start, end = bounds
+    if start is not None and end is not None and start >= end:
+        raise ValueError("O parâmetro start deve ser menor que end.")
+    return max_points, method, start, end
+
+@app.route('/api/sessionQuestionary/<session_id>/heg', methods=['GET'])
+def get_session_heg_series(session_id):
+    """
+    Rota para retornar o sinal HEG de uma sessão reduzido a no máximo `max_points` pontos.
+
+    O sinal pode ser recortado por `start`/`end` (índices das amostras) antes da redução, que
+    preserva a forma do sinal (`method=lttb`, padrão) ou os picos de cada trecho (`method=minmax`).
+    Cada ponto é [índice da amostra, valor].
+    """
+    try:
+        max_points, method, start, end = parse_heg_series_params()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        snapshot = get_db().collection('sessionQuestionary').document(session_id).get(field_paths=['heg_data'])
+        if not snapshot.exists:
+            return jsonify({"error": "Sessão não encontrada."}), 404
+        record_documents_read('sessionQuestionary', [snapshot.to_dict()])
+
+        try:
+            samples = to_float_array(snapshot.get('heg_data') or [])
+        except ValueError:
+            return jsonify({"error": "O heg_data da sessão não é numérico."}), 422
+
+        total = len(samples)
+        start = min(start or 0, total)
+        end = total if end is None else min(end, total)
+        window = samples[start:end]
+        indices = DOWNSAMPLING_METHODS[method](window, max_points)
+
+        return jsonify({
+            "id": session_id,
+            "samples": total,
+            "start": start,
+            "end": end,
+            "method": method,
+            "points": [list(point) for point in zip((indices + start).tolist(), window[indices].tolist())]
+        })
+    except Exception as e:
+        logger.error(f"Erro ao calcular a série do HEG da sessão {session_id}: {e}")
+        return jsonify({"error": "Erro ao calcular a série do HEG da sessão."}), 500
+
 # ////////////////////////////////
 
-def calculate_game_metrics():
+@coalesced("calculate_game_metrics", key=metric_call_key)
+@timed_stage("calculate_game_metrics")
+def calculate_game_metrics(aggregates=None, filters=None):
     """
     Calcula os erros Go, erros NoGo e a média do tempo de reação a partir dos dados de 'game_data' na coleção 'sessionQuestionary'.
+
+    Parâmetros:
+    aggregates (dict, opcional): Resultado de `load_session_aggregates` já calculado, para reaproveitar a mesma varredura.
+    filters (dict, opcional): Filtros `user_id`, `from` e `to` (ver `parse_session_filters`), usados quando `aggregates` não for informado.
     
+    Sem `aggregates`, usa o agregado incremental (sem filtros) ou, com SESSION_SUMMARIES_ENABLED e sem
+    snapshot, os resumos gravados. Nos demais casos calcula direto das colunas das tentativas
+    (`GoNoGoTrials`, do snapshot ou do 'game_data'), sem resumir cada sessão.
+
     Retorna:
     dict: Contendo as porcentagens de erros Go e NoGo, além da média do tempo de reação.
     """
     try:
-        # Referência para a coleção 'sessionQuestionary'
-        sessions_ref = db.collection('sessionQuestionary')
-        sessions = sessions_ref.stream()
-        
-        total_go_errors = 0
-        total_nogo_errors = 0
-        total_go_count = 0
-        total_nogo_count = 0
-        total_time_score = 0
-        total_iterations = 0
-
-        for session in sessions:
-            session_data = session.to_dict()
-            game_data = session_data.get("game_data", [])
-
-            # Validando e calculando erros Go/NoGo
-            for entry in game_data:
-                gonogo = entry.get("gonogo", "")
-                is_correct = entry.get("isCorrect", True)  # `isCorrect` é boolean
-                time_score = entry.get("timeScore", 0)  # `timeScore` é número
-                iteration = entry.get("iteration", 0)  # `iteration` é número
-
-                if gonogo == "go":
-                    total_go_count += 1
-                    if not is_correct:
-                        total_go_errors += 1
-                elif gonogo == "nogo":
-                    total_nogo_count += 1
-                    if not is_correct:
-                        total_nogo_errors += 1
-                
-                # Somando o tempo de reação
-                total_time_score += time_score
-                total_iterations += iteration
-
-        # Calculando porcentagens de erro
-        go_error_percentage = (total_go_errors / total_go_count * 100) if total_go_count > 0 else 0
-        nogo_error_percentage = (total_nogo_errors / total_nogo_count * 100) if total_nogo_count > 0 else 0
-
-        # Calculando a média do tempo de reação
-        total_time = total_iterations * 2  # Tempo total = 2 segundos por iteração
-        reaction_time_average = (total_time_score / total_time * 1000) if total_time > 0 else 0
-
-        # Retornando resultados com duas casas decimais
-        return {
-            "go_error_percentage": round(go_error_percentage, 2),
-            "nogo_error_percentage": round(nogo_error_percentage, 2),
-            "reaction_time_average_ms": round(reaction_time_average, 2)
-        }
+        if aggregates is not None:
+            return aggregates["game_metrics"]
+
+        store = get_aggregate_store() if not filters else None
+        if store is not None:
+            return store.results("game_metrics")["game_metrics"]
+        if SESSION_SUMMARIES_ENABLED and get_snapshot() is None:
+            return load_session_aggregates("game_metrics", filters=filters)["game_metrics"]
+
+        return game_metrics(load_gonogo_trials(filters, with_users=False))
 
     except Exception as e:
-        print(f"Erro ao calcular métricas do jogo: {e}")
+        logger.error(f"Erro ao calcular métricas do jogo: {e}")
         return None
 
 @app.route('/api/game-metrics', methods=['GET'])
@@ -269,7 +1285,12 @@ def get_game_metrics():
     """
     Rota para retornar os erros Go, erros NoGo e a média do tempo de reação calculados pela função `calculate_game_metrics`.
     """
-    result = calculate_game_metrics()
+    try:
+        filters = parse_session_filters()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    result = calculate_game_metrics(filters=filters)
     
     if result:
         return jsonify(result)  # Retorna o resultado como um JSON
@@ -278,7 +1299,9 @@ def get_game_metrics():
     
 # //
 
-def calculate_game_zscores():
+@coalesced("calculate_game_zscores", key=metric_call_key)
+@timed_stage("calculate_game_zscores")
+def calculate_game_zscores(aggregates=None, filters=None):
     """
     Calcula os z-scores para erros GO, erros NoGO e o tempo de reação com base nos valores calculados em 'calculate_game_metrics'.
     
@@ -287,12 +1310,16 @@ def calculate_game_zscores():
     NOGOzscore = (errosNOGO - 6.9) / 7.46
     TempoReaçãozscore = (média_tempo_reação - 906.1) / 115.58
 
+    Parâmetros:
+    aggregates (dict, opcional): Resultado de `load_session_aggregates` já calculado, para reaproveitar a mesma varredura.
+    filters (dict, opcional): Filtros `user_id`, `from` e `to` (ver `parse_session_filters`), usados quando `aggregates` não for informado.
+
     Retorna:
     dict: Contendo os z-scores calculados.
     """
     try:
         # Obtendo os valores calculados pela função `calculate_game_metrics`
-        metrics = calculate_game_metrics()
+        metrics = calculate_game_metrics(aggregates, filters)
         if not metrics:
             raise ValueError("Erro ao calcular as métricas básicas do jogo.")
 
@@ -301,19 +1328,11 @@ def calculate_game_zscores():
         nogo_error_percentage = metrics.get("nogo_error_percentage", 0)
         reaction_time_average_ms = metrics.get("reaction_time_average_ms", 0)
 
-        # Cálculo dos z-scores
-        go_zscore = (go_error_percentage - 2.3) / 2.83
-        nogo_zscore = (nogo_error_percentage - 6.9) / 7.46
-        reaction_time_zscore = (reaction_time_average_ms - 906.1) / 115.58
-
-        return {
-            "go_zscore": go_zscore,
-            "nogo_zscore": nogo_zscore,
-            "reaction_time_zscore": reaction_time_zscore,
-        }
+        # Cálculo dos z-scores (fórmulas compartilhadas com a análise por tentativa)
+        return zscores_from_metrics(go_error_percentage, nogo_error_percentage, reaction_time_average_ms)
 
     except Exception as e:
-        print(f"Erro ao calcular z-scores: {e}")
+        logger.error(f"Erro ao calcular z-scores: {e}")
         return None
 
 @app.route('/api/game-zscores', methods=['GET'])
@@ -321,7 +1340,12 @@ def get_game_zscores():
     """
     Rota para retornar os z-scores calculados pela função `calculate_game_zscores`.
     """
-    result = calculate_game_zscores()
+    try:
+        filters = parse_session_filters()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    result = calculate_game_zscores(filters=filters)
     
     if result:
         return jsonify(result)  # Retorna o resultado como um JSON
@@ -330,7 +1354,9 @@ def get_game_zscores():
     
 # //
 
-def calculate_corrected_percentages():
+@coalesced("calculate_corrected_percentages", key=metric_call_key)
+@timed_stage("calculate_corrected_percentages")
+def calculate_corrected_percentages(aggregates=None, filters=None):
     """
     Calcula as porcentagens corrigidas para inattention, hyperactive e reaction time com base nos z-scores.
 
@@ -338,12 +1364,16 @@ def calculate_corrected_percentages():
     new_percentage = (zscore * 25) + 50
     final_percentage = (100 - new_percentage) / 100
 
+    Parâmetros:
+    aggregates (dict, opcional): Resultado de `load_session_aggregates` já calculado, para reaproveitar a mesma varredura.
+    filters (dict, opcional): Filtros `user_id`, `from` e `to` (ver `parse_session_filters`), usados quando `aggregates` não for informado.
+
     Retorna:
     dict: Contendo as porcentagens corrigidas para cada métrica com duas casas decimais.
     """
     try:
         # Obtendo os z-scores calculados pela função `calculate_game_zscores`
-        zscores = calculate_game_zscores()
+        zscores = calculate_game_zscores(aggregates, filters)
         if not zscores:
             raise ValueError("Erro ao calcular os z-scores do jogo.")
 
@@ -353,24 +1383,10 @@ def calculate_corrected_percentages():
         reaction_time_zscore = zscores.get("reaction_time_zscore", 0)
 
         # Aplicando a correção de porcentagem para cada métrica
-        def corrected_percentage(zscore):
-            new_percentage = (zscore * 25) + 50
-            return (100 - new_percentage) / 100
-        
-        inattention_final_percentage = corrected_percentage(go_zscore)
-        hyperactive_final_percentage = corrected_percentage(nogo_zscore)
-        # inattention_final_percentage = round(corrected_percentage(go_zscore) * 100, 2)
-        # hyperactive_final_percentage = round(corrected_percentage(nogo_zscore) * 100, 2)
-        reactiontime_final_percentage = corrected_percentage(reaction_time_zscore)
-
-        return {
-            "inattention_final_percentage": inattention_final_percentage,
-            "hyperactive_final_percentage": hyperactive_final_percentage,
-            "reactiontime_final_percentage": reactiontime_final_percentage,
-        }
+        return corrected_from_zscores(go_zscore, nogo_zscore, reaction_time_zscore)
 
     except Exception as e:
-        print(f"Erro ao calcular porcentagens corrigidas: {e}")
+        logger.error(f"Erro ao calcular porcentagens corrigidas: {e}")
         return None
 
 @app.route('/api/corrected-percentages', methods=['GET'])
@@ -378,7 +1394,12 @@ def get_corrected_percentages():
     """
     Rota para retornar as porcentagens corrigidas calculadas pela função `calculate_corrected_percentages`.
     """
-    result = calculate_corrected_percentages()
+    try:
+        filters = parse_session_filters()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    result = calculate_corrected_percentages(filters=filters)
     
     if result:
         return jsonify(result)  # Retorna o resultado como um JSON
@@ -387,19 +1408,25 @@ def get_corrected_percentages():
     
 # //
 
-def calculate_gonogo_final_mean():
+@coalesced("calculate_gonogo_final_mean", key=metric_call_key)
+@timed_stage("calculate_gonogo_final_mean")
+def calculate_gonogo_final_mean(aggregates=None, filters=None):
     """
     Calcula a média final (gonogo_game_final_mean) com base nas correções de porcentagem para GO, NoGo e tempo de reação.
 
     Fórmula:
     gonogo_game_final_mean = ((correcaoPorcentagemGO + correcaoPorcentagemNOGO + correcaoPorcentagemTempoReacao) / 3) * 100
 
+    Parâmetros:
+    aggregates (dict, opcional): Resultado de `load_session_aggregates` já calculado, para reaproveitar a mesma varredura.
+    filters (dict, opcional): Filtros `user_id`, `from` e `to` (ver `parse_session_filters`), usados quando `aggregates` não for informado.
+
     Retorna:
     dict: Contendo a média final.
     """
     try:
         # Obtendo as porcentagens corrigidas calculadas pela função `calculate_corrected_percentages`
-        corrected_percentages = calculate_corrected_percentages()
+        corrected_percentages = calculate_corrected_percentages(aggregates, filters)
         if not corrected_percentages:
             raise ValueError("Erro ao calcular as porcentagens corrigidas.")
 
@@ -409,16 +1436,16 @@ def calculate_gonogo_final_mean():
         reactiontime_final_percentage = corrected_percentages.get("reactiontime_final_percentage", 0)
 
         # Calculando a média final
-        gonogo_game_final_mean = (
-            (inattention_final_percentage + hyperactive_final_percentage + reactiontime_final_percentage) / 3
-        ) * 100
+        gonogo_game_final_mean = final_mean_from_corrected(
+            inattention_final_percentage, hyperactive_final_percentage, reactiontime_final_percentage
+        )
 
         return {
             "gonogo_game_final_mean": gonogo_game_final_mean
         }
 
     except Exception as e:
-        print(f"Erro ao calcular a média final do jogo Go/NoGo: {e}")
+        logger.error(f"Erro ao calcular a média final do jogo Go/NoGo: {e}")
         return None
 
 @app.route('/api/gonogo-final-mean', methods=['GET'])
@@ -426,17 +1453,86 @@ def get_gonogo_final_mean():
     """
     Rota para retornar a média final calculada pela função `calculate_gonogo_final_mean`.
     """
-    result = calculate_gonogo_final_mean()
+    try:
+        filters = parse_session_filters()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    result, meta = serve_metric("gonogo-final-mean", freeze_filters(filters))
     
     if result:
-        return jsonify(result)  # Retorna o resultado como um JSON
+        return jsonify({**result, **meta})  # Retorna o resultado como um JSON
     else:
         return jsonify({"error": "Erro ao calcular a média final do jogo Go/NoGo."}), 500
 
+# //////////////////////////////// (Go/NoGo por tentativa)
+
+def load_gonogo_trials(filters=None, with_users=True):
+    """
+    Monta as colunas das tentativas do Go/NoGo, a partir do snapshot colunar quando disponível.
+
+    Parâmetros:
+    filters (dict, opcional): Filtros `user_id`, `from` e `to` (ver `parse_session_filters`).
+    with_users (bool): Se False, lê só o 'game_data' do Firestore (sem o usuário de cada sessão).
+
+    Retorna:
+    GoNoGoTrials: Tentativas das sessões selecionadas.
+    """
+    snapshot = get_snapshot()
+    collection = snapshot.collection('sessionQuestionary') if snapshot is not None else None
+    if collection is not None:
+        return GoNoGoTrials.from_snapshot(collection, collection.mask(filters, SESSION_DATE_FIELD))
+
+    fields = ['game_data', 'user_id'] if with_users else ['game_data']
+    sessions = stream_query(session_query('sessionQuestionary', fields, filters), 'sessionQuestionary')
+    return GoNoGoTrials.from_documents(sessions)
+
+@coalesced("calculate_gonogo_analytics", key=call_key)
+@timed_stage("calculate_gonogo_analytics")
+def calculate_gonogo_analytics(filters=None, by="user"):
+    """
+    Calcula a análise por tentativa do jogo Go/NoGo: omissões e comissões, taxas de erro, distribuição
+    do tempo de reação e curva de aprendizado por iteração, no total e por usuário ou sessão.
+
+    Parâmetros:
+    filters (dict, opcional): Filtros `user_id`, `from` e `to` (ver `parse_session_filters`).
+    by (str): Agrupamento da lista de grupos: `user` ou `session`.
+
+    Retorna:
+    dict: Resultado de `gonogo_report`, ou None em caso de erro.
+    """
+    try:
+        return gonogo_report(load_gonogo_trials(filters), by)
+    except Exception as e:
+        logger.error(f"Erro ao calcular a análise por tentativa do Go/NoGo: {e}")
+        return None
+
+@app.route('/api/gonogo-analytics', methods=['GET'])
+def get_gonogo_analytics():
+    """
+    Rota para retornar a análise por tentativa calculada pela função `calculate_gonogo_analytics`.
+    """
+    try:
+        filters = parse_session_filters()
+        by = request.args.get('by', 'user')
+        if by not in GROUPINGS:
+            raise ValueError(f"O parâmetro by deve ser um de: {', '.join(GROUPINGS)}.")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    result = calculate_gonogo_analytics(filters=filters, by=by)
+
+    if result:
+        return jsonify(result)  # Retorna o resultado como um JSON
+    else:
+        return jsonify({"error": "Erro ao calcular a análise por tentativa do Go/NoGo."}), 500
+
 
 # ////////////////////////////////
 
-def calculate_stress_value():
+@coalesced("calculate_stress_value", key=metric_call_key)
+@timed_stage("calculate_stress_value")
+def calculate_stress_value(aggregates=None, filters=None):
     """
     Calcula o valor de stressValue com base no índice 0 de formAnswers da coleção sessionQuestionary.
 
@@ -444,42 +1540,22 @@ def calculate_stress_value():
     stressScore = (21 - float(formAnswers[0])) / 21
     stressValue = int(stressScore * 100)
 
+    Parâmetros:
+    aggregates (dict, opcional): Resultado de `load_session_aggregates` já calculado, para reaproveitar a mesma varredura.
+    filters (dict, opcional): Filtros `user_id`, `from` e `to` (ver `parse_session_filters`), usados quando `aggregates` não for informado.
+
     Retorna:
     dict: Contendo o valor calculado de stressValue.
     """
     try:
-        # Referência para a coleção 'sessionQuestionary'
-        sessions_ref = db.collection('sessionQuestionary')
-        sessions = sessions_ref.stream()
-        
-        stress_values = []
-
-        for session in sessions:
-            session_data = session.to_dict()
-            form_answers = session_data.get("form_answer", [])
-            
-            # Validando se o índice 0 existe em formAnswers
-            if len(form_answers) > 0:
-                try:
-                    # Obtendo o valor de stressScore e stressValue
-                    stress_score = (21 - float(form_answers[0])) / 21
-                    stress_value = int(stress_score * 100)
-                    stress_values.append(stress_value)
-
-                    # Print para depuração
-                    print(f"Session ID {session.id}: StressValue = {stress_value}")
-                except ValueError as e:
-                    print(f"Erro ao converter formAnswers[0] em float na sessão {session.id}: {e}")
-            else:
-                print(f"formAnswers vazio ou ausente na sessão {session.id}")
-        
+        if aggregates is None:
+            aggregates = load_session_aggregates("stress", filters=filters)
+
         # Retornar todos os valores de stressValue calculados
-        return {
-            "stress_values": stress_values
-        }
+        return aggregates["stress"]
 
     except Exception as e:
-        print(f"Erro ao calcular o valor de stressValue: {e}")
+        logger.error(f"Erro ao calcular o valor de stressValue: {e}")
         return None
 
 @app.route('/api/stress-value', methods=['GET'])
@@ -487,7 +1563,12 @@ def get_stress_value():
     """
     Rota para retornar os valores de stressValue calculados pela função `calculate_stress_value`.
     """
-    result = calculate_stress_value()
+    try:
+        filters = parse_session_filters()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    result = calculate_stress_value(filters=filters)
     
     if result:
         return jsonify(result)  # Retorna o resultado como um JSON
@@ -496,7 +1577,9 @@ def get_stress_value():
 
 # //
 
-def calculate_focus_value():
+@coalesced("calculate_focus_value", key=metric_call_key)
+@timed_stage("calculate_focus_value")
+def calculate_focus_value(aggregates=None, filters=None):
     """
     Calcula o valor de focusValue com base no índice 1 de formAnswers da coleção sessionQuestionary.
 
@@ -504,42 +1587,22 @@ def calculate_focus_value():
     focusScore = (36 - float(formAnswers[1])) / 36
     focusValue = int(focusScore * 100)
 
+    Parâmetros:
+    aggregates (dict, opcional): Resultado de `load_session_aggregates` já calculado, para reaproveitar a mesma varredura.
+    filters (dict, opcional): Filtros `user_id`, `from` e `to` (ver `parse_session_filters`), usados quando `aggregates` não for informado.
+
     Retorna:
     dict: Contendo os valores calculados de focusValue.
     """
     try:
-        # Referência para a coleção 'sessionQuestionary'
-        sessions_ref = db.collection('sessionQuestionary')
-        sessions = sessions_ref.stream()
-
-        focus_values = []
-
-        for session in sessions:
-            session_data = session.to_dict()
-            form_answers = session_data.get("form_answer", [])
-
-            # Validando se o índice 1 existe em formAnswers
-            if len(form_answers) > 1:
-                try:
-                    # Obtendo o valor de focusScore e focusValue
-                    focus_score = (36 - float(form_answers[1])) / 36
-                    focus_value = int(focus_score * 100)
-                    focus_values.append(focus_value)
-
-                    # Print para depuração
-                    print(f"Session ID {session.id}: FocusValue = {focus_value}")
-                except ValueError as e:
-                    print(f"Erro ao converter formAnswers[1] em float na sessão {session.id}: {e}")
-            else:
-                print(f"formAnswers não possui índice 1 na sessão {session.id}")
+        if aggregates is None:
+            aggregates = load_session_aggregates("focus", filters=filters)
 
         # Retornar todos os valores de focusValue calculados
-        return {
-            "focus_values": focus_values
-        }
+        return aggregates["focus"]
 
     except Exception as e:
-        print(f"Erro ao calcular o valor de focusValue: {e}")
+        logger.error(f"Erro ao calcular o valor de focusValue: {e}")
         return None
 
 @app.route('/api/focus-value', methods=['GET'])
@@ -547,7 +1610,12 @@ def get_focus_value():
     """
     Rota para retornar os valores de focusValue calculados pela função `calculate_focus_value`.
     """
-    result = calculate_focus_value()
+    try:
+        filters = parse_session_filters()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    result = calculate_focus_value(filters=filters)
     
     if result:
         return jsonify(result)  # Retorna o resultado como um JSON
@@ -556,7 +1624,9 @@ def get_focus_value():
     
 # //
 
-def calculate_control_value():
+@coalesced("calculate_control_value", key=metric_call_key)
+@timed_stage("calculate_control_value")
+def calculate_control_value(aggregates=None, filters=None):
     """
     Calcula o valor de controlValue com base no índice 2 de formAnswers da coleção sessionQuestionary.
 
@@ -564,42 +1634,22 @@ def calculate_control_value():
     controlScore = (36 - float(formAnswers[2])) / 36
     controlValue = int(controlScore * 100)
 
+    Parâmetros:
+    aggregates (dict, opcional): Resultado de `load_session_aggregates` já calculado, para reaproveitar a mesma varredura.
+    filters (dict, opcional): Filtros `user_id`, `from` e `to` (ver `parse_session_filters`), usados quando `aggregates` não for informado.
+
     Retorna:
     dict: Contendo os valores calculados de controlValue.
     """
     try:
-        # Referência para a coleção 'sessionQuestionary'
-        sessions_ref = db.collection('sessionQuestionary')
-        sessions = sessions_ref.stream()
-
-        control_values = []
-
-        for session in sessions:
-            session_data = session.to_dict()
-            form_answers = session_data.get("form_answer", [])
-
-            # Validando se o índice 2 existe em formAnswers
-            if len(form_answers) > 2:
-                try:
-                    # Obtendo o valor de controlScore e controlValue
-                    control_score = (36 - float(form_answers[2])) / 36
-                    control_value = int(control_score * 100)
-                    control_values.append(control_value)
-
-                    # Print para depuração
-                    print(f"Session ID {session.id}: ControlValue = {control_value}")
-                except ValueError as e:
-                    print(f"Erro ao converter formAnswers[2] em float na sessão {session.id}: {e}")
-            else:
-                print(f"formAnswers não possui índice 2 na sessão {session.id}")
+        if aggregates is None:
+            aggregates = load_session_aggregates("control", filters=filters)
 
         # Retornar todos os valores de controlValue calculados
-        return {
-            "control_values": control_values
-        }
+        return aggregates["control"]
 
     except Exception as e:
-        print(f"Erro ao calcular o valor de controlValue: {e}")
+        logger.error(f"Erro ao calcular o valor de controlValue: {e}")
         return None
 
 @app.route('/api/control-value', methods=['GET'])
@@ -607,7 +1657,12 @@ def get_control_value():
     """
     Rota para retornar os valores de controlValue calculados pela função `calculate_control_value`.
     """
-    result = calculate_control_value()
+    try:
+        filters = parse_session_filters()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    result = calculate_control_value(filters=filters)
     
     if result:
         return jsonify(result)  # Retorna o resultado como um JSON
@@ -616,7 +1671,9 @@ def get_control_value():
 
 # ////////////////////////////////
 
-def calculate_performance_global():
+@coalesced("calculate_performance_global", key=metric_call_key)
+@timed_stage("calculate_performance_global")
+def calculate_performance_global(aggregates=None, filters=None):
     """
     Calcula o valor de PerformanceGlobal com base nos resultados das funções:
     - brainActivity
@@ -625,16 +1682,24 @@ def calculate_performance_global():
     - focusValue
     - controlValue
     
+    Parâmetros:
+    aggregates (dict, opcional): Resultado de `load_session_aggregates` já calculado, para reaproveitar a mesma varredura.
+    filters (dict, opcional): Filtros `user_id`, `from` e `to` (ver `parse_session_filters`), usados quando `aggregates` não for informado.
+
     Retorna:
     dict: Contendo o valor de PerformanceGlobal e os componentes utilizados no cálculo.
     """
     try:
+        # Uma única varredura alimenta todos os componentes
+        if aggregates is None:
+            aggregates = load_session_aggregates(*PERFORMANCE_ACCUMULATORS, filters=filters)
+
         # Chamando as funções para obter os valores necessários
-        brain_activity_result = calculate_brain_activity()
-        gonogo_result = calculate_gonogo_final_mean()  # Supondo que você tem esta função pronta
-        stress_result = calculate_stress_value()       # Função para stressValue
-        focus_result = calculate_focus_value()         # Função para focusValue
-        control_result = calculate_control_value()     # Função para controlValue
+        brain_activity_result = calculate_brain_activity(aggregates)
+        gonogo_result = calculate_gonogo_final_mean(aggregates)  # Supondo que você tem esta função pronta
+        stress_result = calculate_stress_value(aggregates)       # Função para stressValue
+        focus_result = calculate_focus_value(aggregates)         # Função para focusValue
+        control_result = calculate_control_value(aggregates)     # Função para controlValue
         
         # Validar se todos os resultados foram calculados corretamente
         if not all([brain_activity_result, gonogo_result, stress_result, focus_result, control_result]):
@@ -667,7 +1732,7 @@ def calculate_performance_global():
         }
     
     except Exception as e:
-        print(f"Erro ao calcular PerformanceGlobal: {e}")
+        logger.error(f"Erro ao calcular PerformanceGlobal: {e}")
         return {"error": "Erro ao calcular PerformanceGlobal."}
 
 @app.route('/api/performance-global', methods=['GET'])
@@ -675,16 +1740,26 @@ def get_performance_global():
     """
     Rota para calcular e retornar o valor de PerformanceGlobal.
     """
-    result = calculate_performance_global()
+    try:
+        filters = parse_session_filters()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    result, meta = serve_metric("performance-global", freeze_filters(filters))
     
+    if result is None:
+        # O recálculo pelo agendador falhou sem um resultado
+        return jsonify({"error": "Erro ao calcular PerformanceGlobal."}), 500
     if "error" not in result:
-        return jsonify(result)  # Retorna o resultado como JSON
+        return jsonify({**result, **meta})  # Retorna o resultado como JSON
     else:
         return jsonify(result), 500  # Retorna o erro com status HTTP 500
 
 # ////////////////////////////////
 
-def calculate_global_performance():
+@coalesced("calculate_global_performance", key=metric_call_key)
+@timed_stage("calculate_global_performance")
+def calculate_global_performance(aggregates=None, filters=None):
     """
     Calcula o PerformanceGlobal usando os valores de:
     - brainActivity
@@ -696,16 +1771,24 @@ def calculate_global_performance():
     Fórmula:
     PerformanceGlobal = (brainActivity + gonogo_game_final_mean + stressValue + focusValue + controlValue) / 5
 
+    Parâmetros:
+    aggregates (dict, opcional): Resultado de `load_session_aggregates` já calculado, para reaproveitar a mesma varredura.
+    filters (dict, opcional): Filtros `user_id`, `from` e `to` (ver `parse_session_filters`), usados quando `aggregates` não for informado.
+
     Retorna:
     dict: Contendo o valor calculado de PerformanceGlobal.
     """
     try:
+        # Uma única varredura alimenta todos os componentes
+        if aggregates is None:
+            aggregates = load_session_aggregates(*PERFORMANCE_ACCUMULATORS, filters=filters)
+
         # Chamando as funções anteriores para obter os valores
-        brain_activity = calculate_brain_activity()  # Média final dos sinais cerebrais
-        gonogo_metrics = calculate_gonogo_final_mean()  # gonogo_game_final_mean
-        stress_values = calculate_stress_value()  # stress_values (usando média como exemplo)
-        focus_values = calculate_focus_value()  # focus_values (usando média como exemplo)
-        control_values = calculate_control_value()  # control_values (usando média como exemplo)
+        brain_activity = calculate_brain_activity(aggregates)  # Média final dos sinais cerebrais
+        gonogo_metrics = calculate_gonogo_final_mean(aggregates)  # gonogo_game_final_mean
+        stress_values = calculate_stress_value(aggregates)  # stress_values (usando média como exemplo)
+        focus_values = calculate_focus_value(aggregates)  # focus_values (usando média como exemplo)
+        control_values = calculate_control_value(aggregates)  # control_values (usando média como exemplo)
 
         # Obtendo os valores específicos sem valores padrão
         brain_activity_mean = brain_activity["final_mean"]
@@ -720,21 +1803,20 @@ def calculate_global_performance():
         # Limitando o resultado a duas casas decimais
         performance_global = round(performance_global, 2)
 
-        # Print para depuração
-        print(f"PerformanceGlobal: {performance_global}")
+        log_event(logger, logging.DEBUG, "performance_global", value=performance_global)
 
         return {
             "PerformanceGlobal": performance_global
         }
 
     except KeyError as e:
-        print(f"Erro: Chave ausente nos dados: {e}")
+        logger.error(f"Erro: Chave ausente nos dados: {e}")
         return None
     except ZeroDivisionError as e:
-        print(f"Erro: Tentativa de divisão por zero: {e}")
+        logger.error(f"Erro: Tentativa de divisão por zero: {e}")
         return None
     except Exception as e:
-        print(f"Erro ao calcular o PerformanceGlobal: {e}")
+        logger.error(f"Erro ao calcular o PerformanceGlobal: {e}")
         return None
 
 
@@ -743,14 +1825,407 @@ def get_global_performance():
     """
     Rota para retornar o valor de PerformanceGlobal calculado pela função `calculate_global_performance`.
     """
-    result = calculate_global_performance()
+    try:
+        filters = parse_session_filters()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    result, meta = serve_metric("global-performance", freeze_filters(filters))
     
     if result:
-        return jsonify(result)  # Retorna o resultado como um JSON
+        return jsonify({**result, **meta})  # Retorna o resultado como um JSON
     else:
         return jsonify({"error": "Erro ao calcular o PerformanceGlobal."}), 500
 
+# //////////////////////////////// (tendências por usuário)
+
+# Janelas padrão da tendência: últimas N sessões e últimos N dias
+TREND_DEFAULT_SESSIONS = 5
+TREND_DEFAULT_DAYS = 30
+TREND_MAX_SESSIONS = 1000
+TREND_MAX_DAYS = 3650
+
+# Peso da sessão mais recente na média exponencial dos componentes
+TREND_EWMA_ALPHA = float(os.getenv("TREND_EWMA_ALPHA", "0.3"))
+
+# Usuários com a tendência mantida em memória em cada worker
+TREND_MAX_USERS = int(os.getenv("TREND_MAX_USERS", "1000"))
+
+def performance_components(sessions):
+    """
+    Calcula os componentes do PerformanceGlobal (ver `calculate_global_performance`) sobre um grupo de sessões.
+
+    Componentes sem dados no grupo ficam None, e o PerformanceGlobal só é calculado quando os
+    cinco componentes existem.
+
+    Parâmetros:
+    sessions (list): Sessões do grupo (uma sessão ou uma janela da tendência).
+
+    Retorna:
+    dict: brain_activity, gonogo_game_final_mean, stress_value, focus_value, control_value e performance_global.
+    """
+    accumulators = {name: SESSION_ACCUMULATORS[name]() for name in PERFORMANCE_ACCUMULATORS}
+    aggregates = scan_documents(sessions, list(accumulators.values()))
+
+    components = dict.fromkeys(("brain_activity", "gonogo_game_final_mean", "stress_value", "focus_value", "control_value"))
+
+    if aggregates["brain_activity"] and aggregates["brain_activity"]["mean_per_session"]:
+        components["brain_activity"] = aggregates["brain_activity"]["final_mean"]
+
+    game = accumulators["game_metrics"]
+    if aggregates["game_metrics"] and game.total_go_count + game.total_nogo_count > 0:
+        gonogo = calculate_gonogo_final_mean(aggregates)
+        components["gonogo_game_final_mean"] = gonogo["gonogo_game_final_mean"] if gonogo else None
+
+    for name in ("stress", "focus", "control"):
+        values = aggregates[name] and aggregates[name][f"{name}_values"]
+        if values:
+            components[f"{name}_value"] = mean(values)
+
+    values = list(components.values())
+    components["performance_global"] = round(mean(values), 2) if None not in values else None
+    return components
+
+_trend_engine = TrendEngine(performance_components, alpha=TREND_EWMA_ALPHA, max_users=TREND_MAX_USERS)
+
+def read_user_sessions(user_id, since=None):
+    """
+    Lê as sessões do usuário com data a partir de `since`, trazendo apenas o que a tendência usa.
+    """
+    filters = {"user_id": user_id}
+    if since is not None:
+        filters["from"] = since
+
+    raw_fields = sorted({field for key in TREND_PARTS for field in SUMMARY_PARTS[key][0]})
+    if SESSION_SUMMARIES_ENABLED:
+        sessions = stream_query(
+            session_query('sessionQuestionary', [SUMMARY_FIELD, SESSION_DATE_FIELD], filters), 'sessionQuestionary'
+        )
+        return with_raw_fields(sessions, TREND_PARTS, raw_fields)
+    return stream_query(session_query('sessionQuestionary', raw_fields + [SESSION_DATE_FIELD], filters), 'sessionQuestionary')
+
+@timed_stage("calculate_user_trends")
+def calculate_user_trends(user_id, last_sessions=TREND_DEFAULT_SESSIONS, days=TREND_DEFAULT_DAYS,
+                          include_series=False, rebuild=False):
+    """
+    Calcula a tendência dos componentes do PerformanceGlobal de um usuário.
+
+    A tendência fica em memória e cada chamada lê apenas as sessões a partir da última data já
+    lida. Sessões excluídas só deixam a tendência com `rebuild`, que relê todo o histórico.
+
+    Parâmetros:
+    user_id (str): Usuário consultado.
+    last_sessions (int): Tamanho da janela das últimas sessões.
+    days (int): Tamanho da janela dos últimos dias (até agora).
+    include_series (bool): Inclui os componentes e a média exponencial de cada sessão.
+    rebuild (bool): Descarta a tendência em memória antes de calcular.
+
+    Retorna:
+    dict: Componentes da última sessão, média exponencial e janelas móveis (None em caso de erro).
+    """
+    try:
+        if rebuild:
+            _trend_engine.forget(user_id)
+
+        since = datetime.now(timezone.utc) - timedelta(days=days)
+        return _trend_engine.report(
+            user_id, lambda watermark: read_user_sessions(user_id, watermark), SESSION_DATE_FIELD,
+            last_sessions, since, include_series
+        )
+
+    except Exception as e:
+        logger.error(f"Erro ao calcular a tendência do usuário {user_id}: {e}")
+        return None
+
+def parse_trend_params():
+    """
+    Valida os parâmetros da tendência (`sessions`, `days`, `series` e `rebuild`).
+
+    Lança:
+    ValueError: Se algum parâmetro for inválido.
+    """
+    params = {}
+    for name, default, maximum in (("sessions", TREND_DEFAULT_SESSIONS, TREND_MAX_SESSIONS),
+                                   ("days", TREND_DEFAULT_DAYS, TREND_MAX_DAYS)):
+        try:
+            params[name] = int(request.args.get(name, default))
+        except ValueError:
+            raise ValueError(f"O parâmetro {name} deve ser um número inteiro.")
+        if not 1 <= params[name] <= maximum:
+            raise ValueError(f"O parâmetro {name} deve estar entre 1 e {maximum}.")
+
+    params["series"] = request.args.get('series', 'false').lower() == 'true'
+    params["rebuild"] = request.args.get('rebuild', 'false').lower() == 'true'
+    return params
+
+@app.route('/api/users/<user_id>/trends', methods=['GET'])
+def get_user_trends(user_id):
+    """
+    Rota para retornar a tendência do usuário calculada pela função `calculate_user_trends`.
+    """
+    try:
+        params = parse_trend_params()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    result = calculate_user_trends(user_id, params["sessions"], params["days"], params["series"], params["rebuild"])
+
+    if result:
+        return jsonify(result)  # Retorna o resultado como um JSON
+    else:
+        return jsonify({"error": "Erro ao calcular a tendência do usuário."}), 500
+
+# //////////////////////////////// (distribuições)
+
+@coalesced("calculate_distributions", key=metric_call_key)
+@timed_stage("calculate_distributions")
+def calculate_distributions(aggregates=None, filters=None):
+    """
+    Calcula as distribuições do tempo de reação por tentativa (ms), das amostras do HEG e da
+    taxa de erro por sessão, combinando os histogramas gravados no resumo de cada sessão.
+
+    Parâmetros:
+    aggregates (dict, opcional): Resultado de `load_session_aggregates` já calculado, para reaproveitar a mesma varredura.
+    filters (dict, opcional): Filtros `user_id`, `from` e `to` (ver `parse_session_filters`), usados quando `aggregates` não for informado.
+
+    Retorna:
+    dict: Para cada métrica, contagem, média, mínimo, máximo, percentis (p50, p90 e p99, com erro
+        relativo de até 1%) e os baldes do histograma.
+    """
+    try:
+        if aggregates is None:
+            aggregates = load_session_aggregates("distributions", filters=filters)
+
+        return aggregates["distributions"]
+
+    except Exception as e:
+        logger.error(f"Erro ao calcular as distribuições: {e}")
+        return None
+
+@app.route('/api/distributions', methods=['GET'])
+def get_distributions():
+    """
+    Rota para retornar as distribuições calculadas pela função `calculate_distributions`.
+    """
+    try:
+        filters = parse_session_filters()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    result = calculate_distributions(filters=filters)
+
+    if result:
+        return jsonify(result)  # Retorna o resultado como um JSON
+    else:
+        return jsonify({"error": "Erro ao calcular as distribuições."}), 500
+
+# //////////////////////////////// (rollups)
+
+def parse_granularity():
+    """
+    Valida o parâmetro `granularity` (day, week ou month; padrão: month).
+
+    Lança:
+    ValueError: Se a granularidade não for suportada.
+    """
+    granularity = request.args.get('granularity', 'month').lower()
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"O parâmetro granularity deve ser um de: {', '.join(GRANULARITIES)}.")
+    return granularity
+
+@app.route('/api/rollups/questionary', methods=['GET'])
+def get_questionary_rollup():
+    """
+    Rota para retornar a média das respostas do form_answer (estresse, foco e controle) por período.
+    """
+    try:
+        granularity = parse_granularity()
+        filters = parse_session_filters()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        query = session_query('sessionQuestionary', [SESSION_DATE_FIELD, 'form_answer'], filters)
+        sessions = stream_query(query, 'sessionQuestionary')
+        periods = rollup_questionary(sessions, granularity, SESSION_DATE_FIELD)
+        if periods is None:
+            raise ValueError("Resultado vazio.")
+        return jsonify({
+            "granularity": granularity,
+            "periods": periods
+        })
+    except Exception as e:
+        logger.error(f"Erro ao agrupar os questionários por período: {e}")
+        return jsonify({"error": "Erro ao agrupar os questionários por período."}), 500
+
+def load_engagement_summary(granularity, filters=None):
+    """
+    Lê as coleções 'sessionAvatar' e 'sessionMeditation' em paralelo e resume o engajamento por período.
+    """
+    common_fields = [SESSION_DATE_FIELD, 'user_id', 'session_duration']
+    avatar_query = session_query('sessionAvatar', common_fields + ['segment'], filters)
+    meditation_query = session_query('sessionMeditation', common_fields + ['category'], filters)
+    avatar_sessions = ReadAhead(stream_query(avatar_query, 'sessionAvatar'))
+    meditation_sessions = ReadAhead(stream_query(meditation_query, 'sessionMeditation'))
+    try:
+        return summarize_engagement(avatar_sessions, meditation_sessions, granularity, SESSION_DATE_FIELD)
+    finally:
+        avatar_sessions.close()
+        meditation_sessions.close()
+
+@app.route('/api/rollups/engagement', methods=['GET'])
+def get_engagement_rollup():
+    """
+    Rota para retornar a duração das sessões por segment (avatar) e category (meditação), com usuários distintos.
+    """
+    try:
+        granularity = parse_granularity()
+        filters = parse_session_filters()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        return jsonify(load_engagement_summary(granularity, filters))
+    except Exception as e:
+        logger.error(f"Erro ao resumir o engajamento: {e}")
+        return jsonify({"error": "Erro ao resumir o engajamento."}), 500
+
+# //////////////////////////////// (batch)
+
+# Métricas disponíveis em /api/batch: nome -> (acumuladores de 'sessionQuestionary' usados, função de cálculo)
+BATCH_METRICS = {
+    "brain-activity": (["brain_activity"], lambda aggregates, params: calculate_brain_activity(aggregates)),
+    "game-metrics": (["game_metrics"], lambda aggregates, params: calculate_game_metrics(aggregates)),
+    "game-zscores": (["game_metrics"], lambda aggregates, params: calculate_game_zscores(aggregates)),
+    "corrected-percentages": (["game_metrics"], lambda aggregates, params: calculate_corrected_percentages(aggregates)),
+    "gonogo-final-mean": (["game_metrics"], lambda aggregates, params: calculate_gonogo_final_mean(aggregates)),
+    "stress-value": (["stress"], lambda aggregates, params: calculate_stress_value(aggregates)),
+    "focus-value": (["focus"], lambda aggregates, params: calculate_focus_value(aggregates)),
+    "control-value": (["control"], lambda aggregates, params: calculate_control_value(aggregates)),
+    "performance-global": (list(PERFORMANCE_ACCUMULATORS), lambda aggregates, params: calculate_performance_global(aggregates)),
+    "global-performance": (list(PERFORMANCE_ACCUMULATORS), lambda aggregates, params: calculate_global_performance(aggregates)),
+    "distributions": (["distributions"], lambda aggregates, params: calculate_distributions(aggregates)),
+    "rollup-questionary": ([], lambda aggregates, params: aggregates["questionary_rollup"] and {
+        "granularity": params["granularity"],
+        "periods": aggregates["questionary_rollup"]
+    }),
+    "rollup-engagement": ([], lambda aggregates, params: aggregates["engagement"]),
+}
 
+def load_batch_engagement(granularity, filters=None):
+    """
+    Resume o engajamento para o lote, isolando a falha na própria métrica.
+    """
+    try:
+        return {"engagement": load_engagement_summary(granularity, filters)}
+    except Exception as e:
+        logger.error(f"Erro ao resumir o engajamento no lote: {e}")
+        return {"engagement": None}
+
+def run_metric_batch(names, params):
+    """
+    Calcula várias métricas compartilhando uma única varredura da coleção 'sessionQuestionary'.
+
+    Parâmetros:
+    names (list): Nomes das métricas (chaves de `BATCH_METRICS`).
+    params (dict): Parâmetros do lote: `granularity` e `filters` (ver `parse_session_filters`).
+
+    Retorna:
+    dict: Contendo `results` (métrica -> valor) e `errors` (métrica -> mensagem).
+    """
+    accumulator_names = sorted({name for metric in names for name in BATCH_METRICS[metric][0]})
+    extra = []
+    if "rollup-questionary" in names:
+        extra.append(QuestionaryRollupAccumulator(params["granularity"], SESSION_DATE_FIELD))
+
+    # Uma única varredura com todos os acumuladores necessários ao lote, em paralelo com as
+    # leituras das coleções de engajamento quando elas também forem pedidas
+    loads = []
+    if accumulator_names or extra:
+        loads.append(lambda: load_session_aggregates(*accumulator_names, extra=extra, filters=params.get("filters")))
+    if "rollup-engagement" in names:
+        loads.append(lambda: load_batch_engagement(params["granularity"], params.get("filters")))
+
+    aggregates = {}
+    for partial in run_concurrently(*loads):
+        aggregates.update(partial)
+
+    results = {}
+    errors = {}
+    for metric in names:
+        try:
+            result = BATCH_METRICS[metric][1](aggregates, params)
+        except Exception as e:
+            logger.error(f"Erro ao calcular a métrica {metric} no lote: {e}")
+            result = None
+
+        # As funções `calculate_*` sinalizam erro retornando None ou um dicionário com `error`
+        if result is None or (isinstance(result, dict) and "error" in result):
+            errors[metric] = f"Erro ao calcular a métrica {metric}."
+        else:
+            results[metric] = result
+
+    return {"results": results, "errors": errors}
+
+@app.route('/api/batch', methods=['GET', 'POST'])
+def get_metric_batch():
+    """
+    Rota para calcular várias métricas em uma única requisição.
+
+    GET: /api/batch?metrics=global-performance,stress-value&granularity=month&user_id=abc
+    POST: {"metrics": ["global-performance", "stress-value"], "params": {"granularity": "month", "user_id": "abc"}}
+
+    Os filtros `user_id`, `from` e `to` valem para todas as métricas do lote.
+    """
+    if request.method == 'POST':
+        body = request.get_json(silent=True) or {}
+        names = body.get("metrics") or []
+        params = body.get("params") or {}
+    else:
+        names = [name.strip() for name in request.args.get('metrics', '').split(',') if name.strip()]
+        params = request.args.to_dict()
+
+    if not isinstance(names, list) or not names:
+        return jsonify({"error": "Informe ao menos uma métrica em metrics."}), 400
+
+    invalid = [name for name in names if name not in BATCH_METRICS]
+    if invalid:
+        return jsonify({"error": f"Métrica desconhecida: {', '.join(map(str, invalid))}"}), 400
+
+    granularity = str(params.get("granularity", "month")).lower()
+    if granularity not in GRANULARITIES:
+        return jsonify({"error": f"O parâmetro granularity deve ser um de: {', '.join(GRANULARITIES)}."}), 400
+
+    try:
+        filters = parse_session_filters(params if isinstance(params, dict) else {})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        # Remove nomes repetidos mantendo a ordem
+        names = list(dict.fromkeys(names))
+        result, meta = serve_metric("batch", tuple(names), granularity, freeze_filters(filters))
+        if result is None:
+            return jsonify({"error": "Erro ao calcular o lote de métricas."}), 500
+        return jsonify({**result, **meta})
+    except Exception as e:
+        logger.error(f"Erro ao calcular o lote de métricas: {e}")
+        return jsonify({"error": "Erro ao calcular o lote de métricas."}), 500
+
+# //////////////////////////////// (inicialização)
+
+def warm_up():
+    """
+    Prepara o worker antes da primeira requisição: abre a conexão com o banco e, se ativados,
+    semeia o agregado incremental e inicia o agendador das métricas. Chamada pelo gunicorn em
+    cada worker (ver gunicorn.conf.py).
+    """
+    try:
+        log_event(logger, logging.INFO, "warm_up", seconds=round(warm_up_db(), 3))
+        get_aggregate_store()
+        get_metric_scheduler()
+    except Exception as e:
+        logger.error("Erro ao preparar o worker: %s", e)
 
 # ////////////////////////////////
 
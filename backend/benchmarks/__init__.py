@@ -0,0 +1,9 @@
+"""
+Benchmarks das rotas de métricas contra um Firestore em memória.
+
+Uso (a partir da pasta `backend`):
+
+    python -m benchmarks.run                      # 1k, 10k e 100k sessões
+    python -m benchmarks.run --sizes 1000 10000   # apenas alguns tamanhos
+    python -m benchmarks.run --update-baseline    # grava os resultados em baselines.json
+"""
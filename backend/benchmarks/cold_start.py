@@ -0,0 +1,55 @@
+"""
+Mede o tempo entre iniciar o processo e a primeira resposta (cold start).
+
+Cada medição roda em um processo Python novo, como um worker recém-criado:
+importação de `app.py` e primeira requisição (que cria o cliente do banco).
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+response = app.app.test_client().get(sys.argv[1])
+response.get_data()
+done = time.perf_counter()
+print(json.dumps({"status": response.status_code, "import_seconds": imported - start, "first_response_seconds": done - imported}))
+"""
+
+
+def measure(route, backend):
+    env = dict(os.environ, DATA_BACKEND=backend)
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE, route], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--route", default="/api/users", help="Rota da primeira requisição.")
+    parser.add_argument("--backend", default="memory", help="Valor de DATA_BACKEND (firestore exige as credenciais).")
+    parser.add_argument("--repeat", type=int, default=5, help="Processos a iniciar (vale o melhor tempo).")
+    args = parser.parse_args(argv)
+
+    results = [measure(args.route, args.backend) for _ in range(args.repeat)]
+    best = min(results, key=lambda result: result["import_seconds"] + result["first_response_seconds"])
+    print(
+        f"{args.backend}: importação {best['import_seconds']:.3f}s, primeira resposta "
+        f"{best['first_response_seconds']:.3f}s (status {best['status']}), "
+        f"total {best['import_seconds'] + best['first_response_seconds']:.3f}s"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,199 @@
+"""
+Mede tempo, pico de memória e leituras simuladas das rotas de métricas.
+
+Para cada tamanho de base (número de sessões) o Firestore em memória é preenchido com dados
+sintéticos e cada rota é chamada pelo cliente de testes do Flask. Os resultados são
+comparados com `baselines.json`, e o comando termina com código 1 se houver regressão.
+"""
+
+import argparse
+import gc
+import importlib
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+from benchmarks.synthetic import populate
+from data_backend import set_db
+from memory_firestore import MemoryFirestore
+
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines.json")
+
+ROUTES = (
+    "/api/global-performance",
+    "/api/game-metrics",
+    "/api/brain-activity",
+    "/activities",
+    "/api/batch?metrics=global-performance,rollup-questionary,focus-value,stress-value,control-value,corrected-percentages",
+)
+
+# Variação aceita em relação ao baseline antes de apontar regressão
+TIME_TOLERANCE = 0.25
+MEMORY_TOLERANCE = 0.20
+
+
+def load_app(client):
+    """
+    Importa `app.py` usando o Firestore em memória já preenchido.
+    """
+    os.environ["DATA_BACKEND"] = "memory"
+    app = importlib.import_module("app")
+    set_db(client)
+    return app
+
+
+def request(test_client, route):
+    response = test_client.get(route)
+    # Consome o corpo inteiro (as rotas de streaming só fazem o trabalho ao serem lidas)
+    body = response.get_data()
+    if response.status_code != 200:
+        raise RuntimeError(f"{route} retornou {response.status_code}: {body[:200]!r}")
+    return body
+
+
+def measure(test_client, client, route, repeat):
+    """
+    Retorna o melhor tempo de `repeat` execuções, o pico de memória e as leituras de uma execução.
+    """
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        # Como no timeit, o coletor fica desligado durante a medição (a base sintética tem
+        # milhões de objetos e uma coleta completa no meio da requisição distorce o tempo)
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            request(test_client, route)
+            timings.append(time.perf_counter() - start)
+        finally:
+            gc.enable()
+
+    # Memória medida em uma execução separada, pois o tracemalloc deixa tudo mais lento
+    client.reset_counters()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        request(test_client, route)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "seconds": round(min(timings), 4),
+        "peak_memory_bytes": peak,
+        "documents_read": client.documents_read,
+        "queries": client.queries,
+    }
+
+
+def run(sizes, routes=ROUTES, repeat=3, seed=0, latency=0.0, packed_heg=False):
+    results = {}
+    for size in sizes:
+        client = populate(MemoryFirestore(latency=latency), size, seed=seed, packed_heg=packed_heg)
+        app = load_app(client)
+        test_client = app.app.test_client()
+
+        results[str(size)] = {}
+        for route in routes:
+            results[str(size)][route] = measure(test_client, client, route, repeat)
+            print_row(size, route, results[str(size)][route])
+
+        del app, test_client, client
+        gc.collect()
+    return results
+
+
+def print_row(size, route, result):
+    print(
+        f"{size:>8} {route[:48]:<48} {result['seconds']:>9.3f}s "
+        f"{result['peak_memory_bytes'] / 2**20:>9.1f} MiB {result['documents_read']:>9} leituras"
+    )
+
+
+def compare(results, baselines):
+    """
+    Compara os resultados com o baseline.
+
+    Retorna:
+    list: Descrição de cada regressão encontrada.
+    """
+    regressions = []
+    for size, routes in results.items():
+        for route, result in routes.items():
+            baseline = baselines.get(size, {}).get(route)
+            if baseline is None:
+                continue
+            if result["seconds"] > baseline["seconds"] * (1 + TIME_TOLERANCE):
+                regressions.append(f"{size} {route}: tempo {baseline['seconds']}s -> {result['seconds']}s")
+            if result["peak_memory_bytes"] > baseline["peak_memory_bytes"] * (1 + MEMORY_TOLERANCE):
+                regressions.append(
+                    f"{size} {route}: memória {baseline['peak_memory_bytes']} -> {result['peak_memory_bytes']} bytes"
+                )
+            if result["documents_read"] > baseline["documents_read"]:
+                regressions.append(
+                    f"{size} {route}: leituras {baseline['documents_read']} -> {result['documents_read']}"
+                )
+    return regressions
+
+
+def load_baselines(path=BASELINE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as file:
+        return json.load(file).get("results", {})
+
+
+def save_baselines(results, path=BASELINE_PATH):
+    baselines = load_baselines(path)
+    for size, routes in results.items():
+        baselines.setdefault(size, {}).update(routes)
+
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump({
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "results": baselines,
+        }, file, indent=2, sort_keys=True)
+        file.write("\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Números de sessões a gerar.")
+    parser.add_argument("--routes", nargs="+", default=ROUTES, help="Rotas a medir.")
+    parser.add_argument("--repeat", type=int, default=3, help="Execuções por rota (vale o melhor tempo).")
+    parser.add_argument("--seed", type=int, default=0, help="Semente do gerador de dados.")
+    parser.add_argument(
+        "--latency-ms", type=float, default=0.0,
+        help="Latência simulada do Firestore por ida e volta (o baseline é medido sem latência)."
+    )
+    parser.add_argument(
+        "--packed-heg", action="store_true",
+        help="Gera o 'heg_data' no formato compacto (o baseline é medido com o formato em lista)."
+    )
+    parser.add_argument("--update-baseline", action="store_true", help="Grava os resultados em baselines.json.")
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.routes, args.repeat, args.seed, args.latency_ms / 1000, args.packed_heg)
+    if args.latency_ms or args.packed_heg:
+        # Tempos com latência simulada ou com outro formato de dados não são comparáveis com o baseline
+        return 0
+
+    if args.update_baseline:
+        save_baselines(results)
+        print(f"Baseline atualizado em {BASELINE_PATH}")
+        return 0
+
+    regressions = compare(results, load_baselines())
+    for regression in regressions:
+        print(f"REGRESSÃO {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""
+Gerador de dados sintéticos com o formato das coleções do Firestore usadas pelo backend.
+"""
+
+import random
+from datetime import datetime, timedelta, timezone
+
+from heg import pack_heg
+
+
+# Tamanhos aproximados dos dados reais
+HEG_SAMPLES = (60, 240)       # amostras de 'heg_data' por sessão
+GAME_TRIALS = (10, 30)        # tentativas de 'game_data' por sessão
+USERS_PER_SESSION = 0.05      # um usuário para cada 20 sessões
+SESSIONS_PER_ACTIVITY = 10
+
+START_DATE = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def _timestamp(rng):
+    return START_DATE + timedelta(seconds=rng.randrange(365 * 24 * 3600))
+
+
+def questionary_session(rng, user_id):
+    """
+    Cria um documento da coleção 'sessionQuestionary'.
+    """
+    baseline = rng.uniform(60, 90)
+    heg_data = [round(baseline + rng.gauss(0, 5), 3) for _ in range(rng.randint(*HEG_SAMPLES))]
+
+    game_data = []
+    for iteration in range(1, rng.randint(*GAME_TRIALS) + 1):
+        game_data.append({
+            "gonogo": "go" if rng.random() < 0.75 else "nogo",
+            "isCorrect": rng.random() > 0.1,
+            "timeScore": round(rng.uniform(0.3, 1.5), 3),
+            "iteration": iteration,
+        })
+
+    return {
+        "user_id": user_id,
+        "updated_at": _timestamp(rng),
+        "heg_data": heg_data,
+        "game_data": game_data,
+        "form_answer": [rng.randint(0, 21), rng.randint(0, 36), rng.randint(0, 36)],
+    }
+
+
+def populate(client, sessions, seed=0, packed_heg=False):
+    """
+    Preenche o Firestore em memória com `sessions` sessões de questionário, sessões de avatar e
+    meditação, usuários e atividades (com as subcoleções avatar, meditation e questionary).
+
+    Com `packed_heg`, o 'heg_data' é gravado no formato compacto (ver `heg.py`).
+    """
+    rng = random.Random(seed)
+    users = [f"user{index:06d}" for index in range(max(1, int(sessions * USERS_PER_SESSION)))]
+    collections = client.collections
+
+    collections["users"] = {user_id: {"name": f"Usuário {index}"} for index, user_id in enumerate(users)}
+
+    collections["sessionQuestionary"] = {
+        f"questionary{index:07d}": questionary_session(rng, rng.choice(users))
+        for index in range(sessions)
+    }
+    if packed_heg:
+        for session in collections["sessionQuestionary"].values():
+            session["heg_data"] = pack_heg(session["heg_data"])
+
+    for name, group_field, groups in (
+        ("sessionAvatar", "segment", ("social", "escolar", "familiar")),
+        ("sessionMeditation", "category", ("respiracao", "relaxamento", "foco")),
+    ):
+        collections[name] = {
+            f"{name}{index:07d}": {
+                "user_id": rng.choice(users),
+                "updated_at": _timestamp(rng),
+                "session_duration": rng.randint(60, 1200),
+                group_field: rng.choice(groups),
+            }
+            for index in range(sessions)
+        }
+
+    activities = collections["activities"] = {}
+    for index in range(max(1, sessions // SESSIONS_PER_ACTIVITY)):
+        activity_id = f"activity{index:06d}"
+        activities[activity_id] = {"name": f"Atividade {index}", "user_id": rng.choice(users)}
+        for subcollection in ("avatar", "meditation", "questionary"):
+            collections[f"activities/{activity_id}/{subcollection}"] = {
+                f"{subcollection}{item}": {"score": rng.randint(0, 100), "updated_at": _timestamp(rng)}
+                for item in range(rng.randint(0, 3))
+            }
+
+    return client
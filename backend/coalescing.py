@@ -0,0 +1,152 @@
+"""
+Coalescência de chamadas idênticas simultâneas (single-flight).
+
+Quando várias requisições pedem o mesmo cálculo ao mesmo tempo (ex.: vários painéis abertos
+na abertura da clínica), apenas a primeira executa a função; as demais aguardam essa execução
+e recebem o mesmo resultado (ou a mesma exceção). Nada é guardado depois que a execução
+termina: uma chamada que chega depois dela executa a função de novo.
+
+O resultado é compartilhado entre as chamadas coalescidas, então não deve ser alterado por
+quem o recebe.
+
+Cada chave tem a sua própria espera, então chamadas com parâmetros diferentes não bloqueiam
+umas às outras. `SingleFlight.do` atende threads e `SingleFlight.do_async` atende tarefas do
+asyncio (corrotinas são coalescidas por event loop; funções síncronas são executadas em uma
+thread e coalescidas com as chamadas das threads).
+"""
+
+import asyncio
+import functools
+import threading
+
+from instrumentation import COALESCED_CALLS
+
+
+def freeze(value):
+    """
+    Converte dicionários, listas e conjuntos em tuplas, para usar os parâmetros como chave.
+
+    Lança:
+    TypeError: Se algum valor não puder ser usado como chave.
+    """
+    if isinstance(value, dict):
+        return tuple(sorted((key, freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted(freeze(item) for item in value))
+    hash(value)
+    return value
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "owner")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.owner = threading.get_ident()
+
+
+class SingleFlight:
+    """
+    Executa no máximo uma chamada por chave ao mesmo tempo, compartilhando o seu resultado.
+
+    Parâmetros:
+    name (str): Nome usado nos contadores (`coalesced_calls_total`).
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self._tasks = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, function, *args, **kwargs):
+        """
+        Executa `function(*args, **kwargs)`, ou aguarda a execução em andamento com a mesma chave.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            if call.owner == threading.get_ident():
+                # Chamada reentrante na thread que executa a chave: aguardar seria esperar por si mesma
+                return function(*args, **kwargs)
+            COALESCED_CALLS.inc(name=self.name, role="collapsed")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        COALESCED_CALLS.inc(name=self.name, role="leader")
+        try:
+            call.result = function(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    async def do_async(self, key, function, *args, **kwargs):
+        """
+        Versão para o asyncio de `do`. Corrotinas são aguardadas por todas as tarefas com a mesma
+        chave; funções síncronas rodam no executor padrão do loop, coalescidas com `do`.
+        """
+        loop = asyncio.get_running_loop()
+        if not asyncio.iscoroutinefunction(function):
+            return await loop.run_in_executor(None, functools.partial(self.do, key, function, *args, **kwargs))
+
+        with self._lock:
+            task = self._tasks.get((loop, key))
+            leader = task is None
+            if leader:
+                task = self._tasks[(loop, key)] = loop.create_task(function(*args, **kwargs))
+                task.add_done_callback(lambda _: self._forget_task(loop, key, task))
+
+        COALESCED_CALLS.inc(name=self.name, role="leader" if leader else "collapsed")
+        # O cancelamento de uma tarefa que aguarda não cancela a execução compartilhada
+        return await asyncio.shield(task)
+
+    def _forget_task(self, loop, key, task):
+        with self._lock:
+            if self._tasks.get((loop, key)) is task:
+                del self._tasks[(loop, key)]
+
+
+def coalesced(name, key=None):
+    """
+    Decorador que coalesce as chamadas simultâneas da função com os mesmos parâmetros.
+
+    Parâmetros:
+    name (str): Nome usado nos contadores.
+    key: Função que recebe os mesmos parâmetros da função decorada e retorna a chave da chamada,
+        ou None para executá-la sem coalescer. Por padrão, todos os parâmetros (`freeze`).
+    """
+    flight = SingleFlight(name)
+
+    def default_key(*args, **kwargs):
+        return freeze((args, kwargs))
+
+    make_key = key or default_key
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            try:
+                call_key = make_key(*args, **kwargs)
+            except TypeError:
+                call_key = None
+            if call_key is None:
+                return function(*args, **kwargs)
+            return flight.do(call_key, function, *args, **kwargs)
+        wrapper.flight = flight
+        return wrapper
+    return decorator
@@ -0,0 +1,137 @@
+"""
+Execução concorrente das leituras independentes do Firestore.
+
+O cliente síncrono do Firestore libera o GIL enquanto espera a rede, então
+consultas independentes podem rodar em paralelo em threads:
+
+- `run_concurrently` executa leituras completas (ex.: duas varreduras de coleções
+  diferentes) em um pool limitado compartilhado pelo processo;
+- `ReadAhead` consome um stream em uma thread própria, mantendo alguns documentos
+  à frente do consumidor, para que vários streams avancem ao mesmo tempo (ex.: o
+  merge-join das subcoleções de /activities).
+"""
+
+import itertools
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+# Número máximo de leituras completas executadas em paralelo por processo
+FIRESTORE_MAX_WORKERS = int(os.getenv("FIRESTORE_MAX_WORKERS", "8"))
+
+# Documentos lidos à frente do consumidor em cada `ReadAhead`, entregues em blocos de
+# READ_AHEAD_CHUNK para não pagar a troca entre threads a cada documento
+READ_AHEAD_BUFFER = 512
+READ_AHEAD_CHUNK = 64
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Retorna o pool de threads do processo atual (criado na primeira chamada, um por worker do gunicorn).
+    """
+    global _executor, _executor_pid
+
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=FIRESTORE_MAX_WORKERS, thread_name_prefix="firestore")
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def run_concurrently(*calls):
+    """
+    Executa as funções (sem argumentos) em paralelo e retorna os resultados na mesma ordem.
+
+    A primeira função roda na thread atual; as demais no pool. Se alguma falhar, a exceção
+    é propagada depois que todas terminarem.
+    """
+    if len(calls) <= 1:
+        return [call() for call in calls]
+
+    executor = get_executor()
+    futures = [executor.submit(call) for call in calls[1:]]
+    try:
+        first = calls[0]()
+    finally:
+        # Aguarda as demais mesmo se a primeira falhar, para não deixar leituras órfãs
+        wait(futures)
+    return [first] + [future.result() for future in futures]
+
+
+class ReadAhead:
+    """
+    Iterador que consome `iterable` em uma thread própria, guardando até `buffer_size` itens
+    (em blocos de `chunk_size`).
+
+    A thread começa a ler já na criação, então vários `ReadAhead` criados em sequência abrem
+    as suas consultas ao mesmo tempo. Exceções do iterável são relançadas no consumidor.
+    """
+
+    _END = object()
+
+    def __init__(self, iterable, buffer_size=READ_AHEAD_BUFFER, chunk_size=READ_AHEAD_CHUNK):
+        self._queue = queue.Queue(maxsize=max(1, buffer_size // chunk_size))
+        self._chunk_size = chunk_size
+        self._chunk = iter(())
+        self._closed = threading.Event()
+        self._finished = False
+        self._thread = threading.Thread(target=self._produce, args=(iterable,), daemon=True)
+        self._thread.start()
+
+    def _put(self, item):
+        # Espera com timeout para perceber quando o consumidor desistiu (close)
+        while not self._closed.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self, iterable):
+        iterator = iter(iterable)
+        try:
+            while True:
+                chunk = list(itertools.islice(iterator, self._chunk_size))
+                if not chunk:
+                    break
+                if not self._put((chunk, None)):
+                    return
+            self._put((self._END, None))
+        except BaseException as e:
+            self._put((self._END, e))
+        finally:
+            if hasattr(iterator, "close"):
+                iterator.close()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        for item in self._chunk:
+            return item
+        if self._finished:
+            raise StopIteration
+
+        chunk, error = self._queue.get()
+        if chunk is self._END:
+            self._finished = True
+            if error is not None:
+                raise error
+            raise StopIteration
+        self._chunk = iter(chunk)
+        return next(self._chunk)
+
+    def close(self):
+        """
+        Interrompe a leitura (ex.: cliente desconectou no meio do streaming).
+        """
+        self._finished = True
+        self._chunk = iter(())
+        self._closed.set()
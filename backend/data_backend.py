@@ -0,0 +1,163 @@
+"""
+Acesso ao banco de dados, criado sob demanda em cada processo.
+
+O backend é escolhido pela variável `DATA_BACKEND`:
+- `firestore` (padrão): Firestore real, com as credenciais das variáveis de ambiente;
+- `memory`: Firestore em memória (vazio), para testes e benchmarks;
+- `file`: Firestore em memória carregado de (e gravado em) `DATA_BACKEND_PATH`.
+
+Nada é feito na importação: as credenciais são validadas e o cliente é criado na
+primeira chamada de `get_db()`, separadamente em cada worker do gunicorn (o canal
+gRPC de um processo não é compartilhado com os processos filhos após o fork).
+"""
+
+import logging
+import os
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+DATA_BACKENDS = ("firestore", "memory", "file")
+
+# Variáveis necessárias para o backend `firestore`
+FIREBASE_ENV_VARS = [
+    "TYPE", "PROJECT_ID", "PRIVATE_KEY_ID", "PRIVATE_KEY",
+    "CLIENT_EMAIL", "CLIENT_ID", "AUTH_URI", "TOKEN_URI",
+    "AUTH_PROVIDER_X509_CERT_URL", "CLIENT_X509_CERT_URL"
+]
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+# Classe do filtro de `where(filter=...)` do cliente atual (definida junto com o cliente)
+_filter_class = None
+
+
+def create_firestore_client():
+    """
+    Cria o cliente do Firestore a partir das credenciais das variáveis de ambiente.
+
+    O SDK é importado aqui (e não no topo do módulo) porque a sua importação é a parte mais
+    lenta da inicialização, e os backends `memory` e `file` não precisam dele.
+
+    Lança:
+    EnvironmentError: Se alguma variável necessária não estiver definida.
+    """
+    # Exibir um erro se alguma variável estiver faltando
+    for var in FIREBASE_ENV_VARS:
+        if os.getenv(var) is None:
+            raise EnvironmentError(f"A variável de ambiente {var} não foi definida no arquivo .env")
+
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    # Crie um dicionário com as credenciais do Firebase a partir das variáveis de ambiente
+    firebase_credentials = {
+        "type": os.getenv("TYPE"),
+        "project_id": os.getenv("PROJECT_ID"),
+        "private_key_id": os.getenv("PRIVATE_KEY_ID"),
+        "private_key": os.getenv("PRIVATE_KEY").replace("\\n", "\n"),
+        "client_email": os.getenv("CLIENT_EMAIL"),
+        "client_id": os.getenv("CLIENT_ID"),
+        "auth_uri": os.getenv("AUTH_URI"),
+        "token_uri": os.getenv("TOKEN_URI"),
+        "auth_provider_x509_cert_url": os.getenv("AUTH_PROVIDER_X509_CERT_URL"),
+        "client_x509_cert_url": os.getenv("CLIENT_X509_CERT_URL")
+    }
+
+    # Um app do Firebase por processo, para que cada worker abra o seu próprio canal gRPC
+    cred = credentials.Certificate(firebase_credentials)
+    firebase_app = firebase_admin.initialize_app(cred, name=f"worker-{os.getpid()}")
+    return firestore.client(firebase_app)
+
+
+def create_client(backend=None):
+    """
+    Cria o cliente do backend configurado em `DATA_BACKEND`.
+
+    Lança:
+    ValueError: Se o backend não for suportado.
+    """
+    backend = (backend or os.getenv("DATA_BACKEND", "firestore")).lower()
+    if backend == "firestore":
+        return create_firestore_client()
+
+    from memory_firestore import MemoryFirestore
+    if backend == "memory":
+        return MemoryFirestore()
+    if backend == "file":
+        return MemoryFirestore(path=os.getenv("DATA_BACKEND_PATH", "data.json"))
+
+    raise ValueError(f"DATA_BACKEND deve ser um de: {', '.join(DATA_BACKENDS)}.")
+
+
+def filter_class_for(client):
+    """
+    Retorna a classe do filtro de `where(filter=...)` do cliente.
+
+    O `FieldFilter` do SDK só é importado com o Firestore real; o backend em memória tem o seu.
+    """
+    from memory_firestore import FieldFilter as MemoryFieldFilter, MemoryFirestore
+    if isinstance(client, MemoryFirestore):
+        return MemoryFieldFilter
+
+    from google.cloud.firestore_v1.base_query import FieldFilter
+    return FieldFilter
+
+
+def get_db():
+    """
+    Retorna o cliente do banco de dados do processo atual, criando-o na primeira chamada.
+    """
+    global _client, _client_pid, _filter_class
+
+    if _client is not None and _client_pid == os.getpid():
+        return _client
+
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            start = time.perf_counter()
+            _client = create_client()
+            _filter_class = filter_class_for(_client)
+            _client_pid = os.getpid()
+            logger.info("Cliente do banco de dados criado em %.3fs", time.perf_counter() - start)
+        return _client
+
+
+def set_db(client):
+    """
+    Substitui o cliente do processo atual (ex.: um `MemoryFirestore` já preenchido nos benchmarks).
+    """
+    global _client, _client_pid, _filter_class
+
+    with _client_lock:
+        _client = client
+        _filter_class = filter_class_for(client)
+        _client_pid = os.getpid()
+
+
+def field_filter(field_path, op_string, value):
+    """
+    Cria o filtro de `where(filter=...)` para o cliente do processo atual.
+
+    A classe do filtro é escolhida uma vez, quando o cliente é criado (ver `filter_class_for`).
+    """
+    if _client_pid != os.getpid():
+        get_db()
+    return _filter_class(field_path, op_string, value)
+
+
+def warm_up():
+    """
+    Cria o cliente e faz uma leitura mínima para abrir a conexão antes da primeira requisição.
+
+    Retorna:
+    float: Tempo gasto, em segundos.
+    """
+    start = time.perf_counter()
+    for _ in get_db().collection("users").limit(1).stream():
+        pass
+    return time.perf_counter() - start
@@ -0,0 +1,518 @@
+"""
+Motor colunar das tentativas do jogo Go/NoGo.
+
+As tentativas de todas as sessões ficam em arrays com uma posição por tentativa (tipo,
+acerto, timeScore e iteration), junto com o índice da sessão e do usuário de cada uma. As
+colunas vêm do snapshot colunar (sem percorrer as tentativas em Python) ou são montadas a
+partir dos documentos do Firestore por `pack_game_data`, que também monta a coluna `game` da
+exportação do snapshot: cada campo de todas as tentativas é extraído de uma vez e convertido
+em um único array.
+
+A partir delas, cada agrupamento (total, por sessão, por usuário e por iteração) é calculado
+de uma vez com `np.bincount`:
+
+- omissões (erros em tentativas Go, não responder quando devia) e comissões (erros em
+  tentativas NoGo, responder quando não devia), com as respectivas taxas;
+- distribuição do tempo de reação de cada tentativa (timeScore em ms): média e percentis;
+- as métricas do jogo como em `GoNoGoAccumulator` e, a partir delas, os z-scores, as
+  porcentagens corrigidas e a média final (as mesmas fórmulas das rotas do Go/NoGo).
+
+`game_metrics` calcula só as métricas do jogo de todas as tentativas, e é usada pelas rotas
+`/api/game-metrics`, `/api/game-zscores` e `/api/corrected-percentages` quando não há um
+resultado agregado pronto.
+"""
+
+from itertools import chain, repeat
+
+import numpy as np
+
+from aggregation import GoNoGoAccumulator
+from summaries import game_entries
+
+
+TRIAL_PARTS = ("gonogo", "correct", "time_score", "iteration")
+
+GONOGO_CODES = {"go": 0, "nogo": 1}
+
+DEFAULT_PERCENTILES = (50, 90)
+
+# Normas (média, desvio padrão) dos z-scores do jogo
+GO_ERROR_NORM = (2.3, 2.83)
+NOGO_ERROR_NORM = (6.9, 7.46)
+REACTION_TIME_NORM = (906.1, 115.58)
+
+
+# //////////////////////////////// (fórmulas)
+
+def zscores_from_metrics(go_error_percentage, nogo_error_percentage, reaction_time_average_ms):
+    """
+    Calcula os z-scores a partir das métricas do jogo (números ou arrays do NumPy).
+
+    Fórmulas:
+    GOzscore = (errosGO - 2.3) / 2.83
+    NOGOzscore = (errosNOGO - 6.9) / 7.46
+    TempoReaçãozscore = (média_tempo_reação - 906.1) / 115.58
+    """
+    return {
+        "go_zscore": (go_error_percentage - GO_ERROR_NORM[0]) / GO_ERROR_NORM[1],
+        "nogo_zscore": (nogo_error_percentage - NOGO_ERROR_NORM[0]) / NOGO_ERROR_NORM[1],
+        "reaction_time_zscore": (reaction_time_average_ms - REACTION_TIME_NORM[0]) / REACTION_TIME_NORM[1],
+    }
+
+
+def corrected_percentage(zscore):
+    """
+    Fórmulas:
+    new_percentage = (zscore * 25) + 50
+    final_percentage = (100 - new_percentage) / 100
+    """
+    new_percentage = (zscore * 25) + 50
+    return (100 - new_percentage) / 100
+
+
+def corrected_from_zscores(go_zscore, nogo_zscore, reaction_time_zscore):
+    """
+    Calcula as porcentagens corrigidas de inattention, hyperactive e reaction time a partir dos z-scores.
+    """
+    return {
+        "inattention_final_percentage": corrected_percentage(go_zscore),
+        "hyperactive_final_percentage": corrected_percentage(nogo_zscore),
+        "reactiontime_final_percentage": corrected_percentage(reaction_time_zscore),
+    }
+
+
+def final_mean_from_corrected(inattention_final_percentage, hyperactive_final_percentage,
+                              reactiontime_final_percentage):
+    """
+    Fórmula:
+    gonogo_game_final_mean = ((correcaoPorcentagemGO + correcaoPorcentagemNOGO + correcaoPorcentagemTempoReacao) / 3) * 100
+    """
+    return (
+        (inattention_final_percentage + hyperactive_final_percentage + reactiontime_final_percentage) / 3
+    ) * 100
+
+
+# //////////////////////////////// (empacotamento)
+
+def _trial_number(value):
+    # Como a soma do resumo do jogo: bool conta como número; texto e None são inválidos (NaN)
+    return float(value) if isinstance(value, (bool, int, float)) else np.nan
+
+
+_NUMBER_TYPES = {bool, int, float}
+
+
+def _trial_numbers(values):
+    # Caso comum (só números): uma única conversão; senão, valor a valor com `_trial_number`
+    if set(map(type, values)) <= _NUMBER_TYPES:
+        return np.array(values, dtype=np.float64)
+    return np.fromiter(map(_trial_number, values), dtype=np.float64, count=len(values))
+
+
+def _trial_field(entries, key, default):
+    # Um campo de todas as tentativas, com `dict.get` chamado pelo `map` (sem laço interpretado)
+    count = len(entries)
+    return list(map(dict.get, entries, repeat(key, count), repeat(default, count)))
+
+
+class GameDataPacker:
+    """
+    Empacota o 'game_data' de várias sessões nas partes da coluna `game` (`TRIAL_PARTS`, `invalid`
+    e `offsets`).
+
+    Cada sessão segue a regra de `game_entries`: sem 'game_data' (ou nulo) não tem tentativas, e um
+    'game_data' que não é lista ou tem tentativas que não são objetos marca a sessão como inválida.
+    As tentativas só são percorridas em `finish`, um campo por vez.
+    """
+
+    def __init__(self):
+        self.lengths = []
+        self.invalid = []
+        self.games = []
+
+    def append(self, value):
+        """
+        Acrescenta o 'game_data' de uma sessão e retorna a quantidade de tentativas empacotadas.
+        """
+        try:
+            entries = game_entries(value)
+            invalid = False
+        except TypeError:
+            # As tentativas que são objetos ainda entram nas colunas (a sessão invalida as métricas)
+            items = value if isinstance(value, list) else []
+            entries = [entry for entry in items if isinstance(entry, dict)]
+            invalid = True
+        self.lengths.append(len(entries))
+        self.invalid.append(invalid)
+        self.games.append(entries)
+        return len(entries)
+
+    def finish(self):
+        entries = list(chain.from_iterable(self.games))
+        count = len(entries)
+        # Comparação elemento a elemento: valores que não são textos nunca são "go" ou "nogo"
+        raw_gonogo = np.array(_trial_field(entries, "gonogo", None), dtype=object)
+        codes = np.full(count, -1, dtype=np.int8)
+        for name, code in GONOGO_CODES.items():
+            codes[raw_gonogo == name] = code
+        return {
+            "gonogo": codes,
+            "correct": np.fromiter(map(bool, _trial_field(entries, "isCorrect", True)), dtype=bool, count=count),
+            "time_score": _trial_numbers(_trial_field(entries, "timeScore", 0)),
+            "iteration": _trial_numbers(_trial_field(entries, "iteration", 0)),
+            "invalid": np.array(self.invalid, dtype=bool),
+            "offsets": np.concatenate(([0], np.cumsum(self.lengths))).astype(np.int64),
+        }
+
+
+def pack_game_data(values):
+    """
+    Empacota o 'game_data' de várias sessões nas mesmas partes da coluna `game` do snapshot.
+    """
+    packer = GameDataPacker()
+    for value in values:
+        packer.append(value)
+    return packer.finish()
+
+
+def fill_game_totals(accumulator, gonogo, correct, time_score, iteration):
+    """
+    Preenche os contadores de um `GoNoGoAccumulator` a partir das colunas das tentativas.
+
+    Lança:
+    TypeError: Se algum timeScore ou iteration não for numérico.
+    """
+    if np.isnan(time_score).any() or np.isnan(iteration).any():
+        raise TypeError("timeScore ou iteration não numérico no game_data")
+
+    go, nogo = gonogo == GONOGO_CODES["go"], gonogo == GONOGO_CODES["nogo"]
+    accumulator.total_go_count = int(np.count_nonzero(go))
+    accumulator.total_nogo_count = int(np.count_nonzero(nogo))
+    accumulator.total_go_errors = int(np.count_nonzero(go & ~correct))
+    accumulator.total_nogo_errors = int(np.count_nonzero(nogo & ~correct))
+    accumulator.total_time_score = float(time_score.sum())
+    accumulator.total_iterations = float(iteration.sum())
+
+
+# //////////////////////////////// (colunas)
+
+def _encode_users(values):
+    codes = {}
+    session_users = [codes.setdefault(value, len(codes)) if isinstance(value, str) else -1 for value in values]
+    return np.array(list(codes), dtype=object), np.array(session_users, dtype=np.int64)
+
+
+class GoNoGoTrials:
+    """
+    Tentativas do Go/NoGo em colunas.
+
+    Parâmetros:
+    arrays (dict): Partes da coluna `game` (`TRIAL_PARTS`, `invalid` e `offsets` de cada sessão).
+    session_ids: Id de cada sessão.
+    session_users: Índice do usuário de cada sessão em `user_ids` (-1 quando a sessão não tem usuário).
+    user_ids: Ids dos usuários.
+    """
+
+    def __init__(self, arrays, session_ids, session_users, user_ids):
+        lengths = np.diff(arrays["offsets"])
+        self.gonogo = np.asarray(arrays["gonogo"])
+        self.correct = np.asarray(arrays["correct"], dtype=bool)
+        self.time_score = np.asarray(arrays["time_score"])
+        self.iteration = np.asarray(arrays["iteration"])
+        # Sessões com 'game_data' inválido (ver `game_entries`), que invalidam as métricas do jogo
+        self.invalid = np.asarray(arrays.get("invalid", np.zeros(len(lengths))), dtype=bool)
+        self.session = np.repeat(np.arange(len(lengths)), lengths)
+        self.session_ids = np.asarray(session_ids)
+        self.session_users = np.asarray(session_users, dtype=np.int64)
+        self.user_ids = np.asarray(user_ids, dtype=object)
+
+    def __len__(self):
+        return len(self.gonogo)
+
+    @property
+    def sessions(self):
+        return len(self.session_ids)
+
+    @classmethod
+    def from_documents(cls, docs):
+        """
+        Monta as colunas a partir dos documentos de 'sessionQuestionary' (com `game_data` e, para os
+        agrupamentos por usuário, `user_id`).
+        """
+        session_ids, users, games = [], [], []
+        for doc in docs:
+            data = doc.to_dict() or {}
+            session_ids.append(doc.id)
+            users.append(data.get("user_id"))
+            games.append(data.get("game_data"))
+        user_ids, session_users = _encode_users(users)
+        return cls(pack_game_data(games), np.array(session_ids, dtype=object), session_users, user_ids)
+
+    @classmethod
+    def from_snapshot(cls, collection, mask):
+        """
+        Seleciona as tentativas das linhas `mask` do snapshot de 'sessionQuestionary', sem copiar as demais.
+        """
+        rows = np.flatnonzero(mask)
+        kind, arrays = collection.column("game_data")
+        if kind != "game":
+            arrays = pack_game_data([None] * len(rows))
+        else:
+            trials = np.repeat(mask, np.diff(arrays["offsets"]))
+            lengths = np.diff(arrays["offsets"])[rows]
+            arrays = {
+                **{part: arrays[part][trials] for part in TRIAL_PARTS},
+                "invalid": arrays["invalid"][rows],
+                "offsets": np.concatenate(([0], np.cumsum(lengths))).astype(np.int64),
+            }
+
+        kind, users = collection.column("user_id")
+        if kind == "string":
+            session_users, user_ids = np.asarray(users["codes"][rows], dtype=np.int64), users["dict"]
+        else:
+            session_users, user_ids = np.full(len(rows), -1, dtype=np.int64), []
+        return cls(arrays, collection.ids()[rows], session_users, user_ids)
+
+
+def game_metrics(trials):
+    """
+    Calcula as métricas do jogo de todas as tentativas, como `GoNoGoAccumulator` (mesmas fórmulas).
+
+    Retorna:
+    dict: Porcentagens de erros Go e NoGo e a média do tempo de reação.
+
+    Lança:
+    TypeError: Se alguma sessão tiver 'game_data' inválido (ver `game_entries`), ou timeScore ou iteration não numérico.
+    """
+    if trials.invalid.any():
+        raise TypeError("game_data com tentativas que não são objetos")
+    accumulator = GoNoGoAccumulator()
+    fill_game_totals(accumulator, trials.gonogo, trials.correct, trials.time_score, trials.iteration)
+    return accumulator.result()
+
+
+# //////////////////////////////// (agrupamentos)
+
+def _rate(numerator, denominator):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominator > 0, numerator / denominator * 100, np.nan)
+
+
+def _group_quantiles(groups, values, size, quantiles):
+    """
+    Calcula os quantis de `values` em cada grupo (interpolação linear, como `np.quantile`).
+    """
+    order = np.lexsort((values, groups))
+    ordered = values[order]
+    counts = np.bincount(groups, minlength=size)
+    starts = np.cumsum(counts) - counts
+    present = counts > 0
+
+    result = []
+    for q in quantiles:
+        # Posição dentro do grupo (somar o início antes perderia precisão na fração)
+        position = q * (counts[present] - 1)
+        low = np.floor(position)
+        low_index = starts[present] + low.astype(np.int64)
+        high_index = starts[present] + np.ceil(position).astype(np.int64)
+        quantile = np.full(size, np.nan)
+        quantile[present] = ordered[low_index] + (ordered[high_index] - ordered[low_index]) * (position - low)
+        result.append(quantile)
+    return result
+
+
+def _group_stats(trials, groups, size, selected=None, percentiles=DEFAULT_PERCENTILES):
+    """
+    Calcula os contadores, as taxas e o tempo de reação das tentativas em cada grupo.
+
+    Parâmetros:
+    trials (GoNoGoTrials): Tentativas.
+    groups: Grupo de cada tentativa selecionada (de 0 a size - 1).
+    size (int): Quantidade de grupos.
+    selected: Máscara das tentativas consideradas (todas, se None).
+    """
+    gonogo, correct = trials.gonogo, trials.correct
+    time_score, iteration = trials.time_score, trials.iteration
+    if selected is not None:
+        gonogo, correct = gonogo[selected], correct[selected]
+        time_score, iteration = time_score[selected], iteration[selected]
+
+    def count(mask):
+        return np.bincount(groups[mask], minlength=size)
+
+    def total(values):
+        return np.bincount(groups, weights=values, minlength=size)
+
+    go, nogo = gonogo == GONOGO_CODES["go"], gonogo == GONOGO_CODES["nogo"]
+    stats = {
+        "trials": np.bincount(groups, minlength=size),
+        "go_count": count(go),
+        "nogo_count": count(nogo),
+        "omissions": count(go & ~correct),
+        "commissions": count(nogo & ~correct),
+    }
+    stats["error_rate"] = _rate(stats["omissions"] + stats["commissions"], stats["go_count"] + stats["nogo_count"])
+    stats["omission_rate"] = _rate(stats["omissions"], stats["go_count"])
+    stats["commission_rate"] = _rate(stats["commissions"], stats["nogo_count"])
+
+    # Tempo de reação de cada tentativa em ms (tentativas com timeScore inválido ficam de fora)
+    timed = ~np.isnan(time_score)
+    reaction_times = time_score[timed] * 1000
+    timed_count = count(timed)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        stats["reaction_time_mean"] = np.where(
+            timed_count > 0,
+            np.bincount(groups[timed], weights=reaction_times, minlength=size) / timed_count,
+            np.nan,
+        )
+    quantiles = _group_quantiles(groups[timed], reaction_times, size, [p / 100 for p in percentiles])
+    stats["reaction_time_percentiles"] = dict(zip((f"p{p:g}" for p in percentiles), quantiles))
+
+    # Somas usadas pelas métricas do jogo (como em `GoNoGoAccumulator`, inválidas com algum valor não numérico)
+    stats["invalid"] = total(np.isnan(time_score) | np.isnan(iteration)) > 0
+    stats["time_score"] = total(np.nan_to_num(time_score))
+    stats["iterations"] = total(np.nan_to_num(iteration))
+    return stats
+
+
+def _round2(values):
+    # `round` do Python, como em `GoNoGoAccumulator.result` (o arredondamento do NumPy pode diferir)
+    return np.array([round(value, 2) for value in values.tolist()], dtype=np.float64)
+
+
+def _game_scores(stats):
+    """
+    Aplica as fórmulas das métricas do jogo, dos z-scores e das porcentagens corrigidas em cada grupo.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        go_error_percentage = np.where(stats["go_count"] > 0, stats["omissions"] / stats["go_count"] * 100, 0)
+        nogo_error_percentage = np.where(stats["nogo_count"] > 0, stats["commissions"] / stats["nogo_count"] * 100, 0)
+        total_time = stats["iterations"] * 2  # Tempo total = 2 segundos por iteração
+        reaction_time_average = np.where(total_time > 0, stats["time_score"] / total_time * 1000, 0)
+
+    metrics = {
+        "go_error_percentage": _round2(go_error_percentage),
+        "nogo_error_percentage": _round2(nogo_error_percentage),
+        "reaction_time_average_ms": _round2(reaction_time_average),
+    }
+    zscores = zscores_from_metrics(**metrics)
+    corrected = corrected_from_zscores(**zscores)
+    final_mean = final_mean_from_corrected(**corrected)
+    return metrics, zscores, corrected, final_mean
+
+
+def _value(value):
+    # NaN (grupo sem tentativas do tipo) vira None no JSON
+    return None if value != value else value
+
+
+def _rows(stats, scores=None):
+    """
+    Converte as colunas de cada grupo em uma lista de dicionários.
+    """
+    percentiles = stats["reaction_time_percentiles"]
+    columns = {
+        name: stats[name].tolist() for name in (
+            "trials", "go_count", "nogo_count", "omissions", "commissions",
+            "error_rate", "omission_rate", "commission_rate", "reaction_time_mean", "invalid",
+        )
+    }
+    columns.update({name: values.tolist() for name, values in percentiles.items()})
+    if scores is not None:
+        metrics, zscores, corrected, final_mean = scores
+        for group in (metrics, zscores, corrected):
+            columns.update({name: np.asarray(values).tolist() for name, values in group.items()})
+        columns["gonogo_game_final_mean"] = np.asarray(final_mean).tolist()
+
+    rows = []
+    for index in range(len(columns["trials"])):
+        row = {
+            name: columns[name][index]
+            for name in ("trials", "go_count", "nogo_count", "omissions", "commissions")
+        }
+        row.update({
+            name: _value(columns[name][index]) for name in ("error_rate", "omission_rate", "commission_rate")
+        })
+        row["reaction_time_ms"] = {
+            "mean": _value(columns["reaction_time_mean"][index]),
+            **{name: _value(columns[name][index]) for name in percentiles},
+        }
+        if scores is not None:
+            # Sem as métricas do jogo quando alguma tentativa tem timeScore ou iteration inválido
+            valid = not columns["invalid"][index]
+            row["game_metrics"] = {name: columns[name][index] for name in metrics} if valid else None
+            row["zscores"] = {name: columns[name][index] for name in zscores} if valid else None
+            row["corrected_percentages"] = {name: columns[name][index] for name in corrected} if valid else None
+            row["gonogo_game_final_mean"] = columns["gonogo_game_final_mean"][index] if valid else None
+        rows.append(row)
+    return rows
+
+
+# //////////////////////////////// (relatório)
+
+GROUPINGS = ("user", "session")
+
+
+def gonogo_report(trials, by="user", percentiles=DEFAULT_PERCENTILES):
+    """
+    Resume as tentativas no total, por iteração (curva de aprendizado) e por usuário ou sessão.
+
+    Parâmetros:
+    trials (GoNoGoTrials): Tentativas selecionadas.
+    by (str): Agrupamento da lista de grupos: `user` ou `session`.
+    percentiles: Percentis do tempo de reação.
+
+    Retorna:
+    dict: `totals`, `learning_curve` (uma linha por iteração) e `by_user` ou `by_session` (em ordem de
+        id). Cada linha traz os contadores, as taxas de erro (em %, None sem tentativas do tipo), o tempo
+        de reação (ms) e, exceto na curva de aprendizado, as métricas, os z-scores e as porcentagens
+        corrigidas do jogo.
+    """
+    if by not in GROUPINGS:
+        raise ValueError(f"Agrupamento inválido: {by}. Use um de: {', '.join(GROUPINGS)}.")
+
+    everything = np.zeros(len(trials), dtype=np.int64)
+    totals = _group_stats(trials, everything, 1, percentiles=percentiles)
+
+    # Curva de aprendizado: tentativas agrupadas pelo número da iteração (inteiro)
+    numbered = ~np.isnan(trials.iteration)
+    numbered[numbered] = trials.iteration[numbered] == np.floor(trials.iteration[numbered])
+    iterations, iteration_groups = np.unique(trials.iteration[numbered], return_inverse=True)
+    curve = _group_stats(trials, iteration_groups.astype(np.int64), len(iterations), numbered, percentiles)
+
+    result = {
+        "sessions": trials.sessions,
+        "trials": len(trials),
+        "totals": _rows(totals, _game_scores(totals))[0],
+        "learning_curve": [
+            {"iteration": int(iteration), **row}
+            for iteration, row in zip(iterations.tolist(), _rows(curve))
+        ],
+    }
+
+    if by == "session":
+        stats = _group_stats(trials, trials.session, trials.sessions, percentiles=percentiles)
+        users = [
+            str(trials.user_ids[index]) if index >= 0 else None for index in trials.session_users.tolist()
+        ]
+        result["by_session"] = sorted((
+            {"id": session_id, "user_id": user_id, **row}
+            for session_id, user_id, row in zip(
+                trials.session_ids.tolist(), users, _rows(stats, _game_scores(stats))
+            )
+        ), key=lambda row: row["id"])
+        return result
+
+    # Por usuário: sessões sem usuário ficam de fora da lista (mas entram no total)
+    trial_users = trials.session_users[trials.session]
+    with_user = trial_users >= 0
+    stats = _group_stats(trials, trial_users[with_user], len(trials.user_ids), with_user, percentiles)
+    sessions = np.bincount(trials.session_users[trials.session_users >= 0], minlength=len(trials.user_ids))
+    result["by_user"] = sorted((
+        {"user_id": str(user_id), "sessions": count, **row}
+        for user_id, count, row in zip(
+            trials.user_ids.tolist(), sessions.tolist(), _rows(stats, _game_scores(stats))
+        )
+        if count
+    ), key=lambda row: row["user_id"])
+    return result
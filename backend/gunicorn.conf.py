@@ -0,0 +1,20 @@
+"""
+Configuração do gunicorn, lida automaticamente ao executar `gunicorn app:app` na pasta backend.
+
+Os workers `gthread` atendem várias requisições por processo: enquanto uma thread espera
+o Firestore (o cliente libera o GIL durante a rede), as outras continuam atendendo.
+"""
+
+import os
+
+
+worker_class = "gthread"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+threads = int(os.getenv("GUNICORN_THREADS", "16"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+
+
+def post_worker_init(worker):
+    # Cada worker cria a sua conexão com o banco depois do fork, antes de aceitar requisições
+    from app import warm_up
+    warm_up()
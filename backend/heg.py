@@ -0,0 +1,342 @@
+"""
+Análise vetorizada dos sinais HEG ('heg_data') da coleção 'sessionQuestionary'.
+
+Os sinais de todas as sessões são concatenados em um único array contíguo
+(com os deslocamentos de início de cada sessão), e as estatísticas por sessão
+são calculadas com operações em lote do NumPy (`reduceat`, `bincount`,
+ordenação por segmento), sem laços em Python por amostra.
+
+O 'heg_data' pode estar gravado como lista de números (ou textos numéricos) ou no
+formato compacto: um campo bytes com o cabeçalho `HEG` + versão, seguido das amostras
+em float32 little-endian. `to_float_array` aceita os dois formatos e rejeita amostras não
+numéricas ou não finitas (None, NaN, infinito), que não são JSON válido.
+"""
+
+import logging
+
+import numpy as np
+
+from instrumentation import log_event
+
+
+logger = logging.getLogger(__name__)
+
+
+# Percentis calculados por padrão
+DEFAULT_PERCENTILES = (5, 25, 50, 75, 95)
+
+# Formato compacto do 'heg_data' (incrementar a versão se o formato mudar)
+HEG_PACKED_MAGIC = b"HEG"
+HEG_PACKED_VERSION = 1
+HEG_PACKED_DTYPE = np.dtype("<f4")
+_PACKED_HEADER_SIZE = len(HEG_PACKED_MAGIC) + 1
+
+
+def is_packed_heg(heg_data):
+    """
+    Verifica se o 'heg_data' está no formato compacto (bytes).
+    """
+    return isinstance(heg_data, (bytes, bytearray, memoryview))
+
+
+def pack_heg(heg_data):
+    """
+    Converte o 'heg_data' (lista de números ou textos numéricos) para o formato compacto.
+
+    Lança:
+    ValueError: Se algum valor não for numérico, não for finito ou não couber em float32.
+    """
+    with np.errstate(over="ignore"):
+        samples = to_float_array(heg_data).astype(HEG_PACKED_DTYPE)
+    _check_finite(samples)
+    return HEG_PACKED_MAGIC + bytes([HEG_PACKED_VERSION]) + samples.tobytes()
+
+
+def unpack_heg(packed):
+    """
+    Lê as amostras do 'heg_data' compacto sem copiá-las (array float32 somente leitura sobre os bytes).
+
+    Lança:
+    ValueError: Se o cabeçalho, a versão ou o tamanho forem inválidos.
+    """
+    header = bytes(packed[:_PACKED_HEADER_SIZE])
+    if len(header) < _PACKED_HEADER_SIZE or header[:-1] != HEG_PACKED_MAGIC:
+        raise ValueError("heg_data compactado sem o cabeçalho HEG")
+    if header[-1] != HEG_PACKED_VERSION:
+        raise ValueError(f"Versão {header[-1]} do heg_data compactado não suportada")
+    if (len(packed) - _PACKED_HEADER_SIZE) % HEG_PACKED_DTYPE.itemsize:
+        raise ValueError("heg_data compactado com tamanho inválido")
+    return np.frombuffer(packed, dtype=HEG_PACKED_DTYPE, offset=_PACKED_HEADER_SIZE)
+
+
+def to_float_array(heg_data):
+    """
+    Converte o 'heg_data' de uma sessão (números, textos numéricos ou formato compacto) para
+    um array float64.
+
+    Lança:
+    ValueError: Se algum valor não for numérico (inclusive None) ou não for finito (NaN, infinito).
+    """
+    if is_packed_heg(heg_data):
+        # Os cálculos acumulam em float64, como no formato em lista
+        samples = unpack_heg(heg_data).astype(np.float64)
+    else:
+        try:
+            samples = np.asarray(heg_data, dtype=np.float64).ravel()
+        except TypeError as e:
+            # None e objetos não numéricos chegam aqui como TypeError
+            raise ValueError(f"heg_data com valor não numérico: {e}") from e
+    _check_finite(samples)
+    return samples
+
+
+def _check_finite(samples):
+    # NaN e infinito não são JSON válidos e contaminam as médias
+    if not np.isfinite(samples).all():
+        raise ValueError("heg_data com valores não finitos (NaN ou infinito)")
+
+
+def pack_sessions(arrays):
+    """
+    Concatena os sinais das sessões em um único array contíguo.
+
+    Retorna:
+    tuple: (valores, início de cada sessão, quantidade de amostras de cada sessão)
+    """
+    counts = np.fromiter((len(array) for array in arrays), dtype=np.int64, count=len(arrays))
+    starts = np.zeros(len(arrays), dtype=np.int64)
+    if len(arrays) > 1:
+        np.cumsum(counts[:-1], out=starts[1:])
+    values = np.concatenate(arrays) if arrays else np.empty(0, dtype=np.float64)
+    return values, starts, counts
+
+
+def _segment_percentiles(values, starts, counts, percentiles):
+    """
+    Calcula os percentis (interpolação linear) de cada sessão com uma única ordenação.
+    """
+    segment_ids = np.repeat(np.arange(len(counts)), counts)
+    # Ordena por sessão e, dentro de cada sessão, por valor
+    ordered = values[np.lexsort((values, segment_ids))]
+
+    positions = np.asarray(percentiles, dtype=np.float64)[None, :] / 100 * (counts[:, None] - 1)
+    lower = np.floor(positions).astype(np.int64)
+    upper = np.minimum(lower + 1, counts[:, None] - 1)
+    fraction = positions - lower
+
+    low_values = ordered[starts[:, None] + lower]
+    high_values = ordered[starts[:, None] + upper]
+    return low_values + (high_values - low_values) * fraction
+
+
+def _epoch_means(values, starts, counts, epoch):
+    """
+    Calcula a média de cada janela de `epoch` amostras de cada sessão.
+
+    Retorna:
+    list: Um array de médias por sessão.
+    """
+    epochs_per_session = -(-counts // epoch)
+    epoch_starts = np.zeros(len(counts), dtype=np.int64)
+    if len(counts) > 1:
+        np.cumsum(epochs_per_session[:-1], out=epoch_starts[1:])
+
+    local_index = np.arange(len(values)) - np.repeat(starts, counts)
+    groups = np.repeat(epoch_starts, counts) + local_index // epoch
+
+    total_epochs = int(epochs_per_session.sum())
+    sums = np.bincount(groups, weights=values, minlength=total_epochs)
+    sizes = np.bincount(groups, minlength=total_epochs)
+    means = sums / sizes
+
+    return np.split(means, epoch_starts[1:])
+
+
+def analyze_sessions(session_ids, arrays, percentiles=DEFAULT_PERCENTILES, epoch=None):
+    """
+    Calcula as estatísticas por sessão e entre sessões dos sinais HEG.
+
+    Por sessão: quantidade de amostras, média, desvio padrão, mínimo, máximo, percentis,
+    inclinação (tendência linear por amostra) e, se `epoch` for informado, a média de cada
+    janela de `epoch` amostras.
+
+    Entre sessões: média das médias (a mesma `final_mean` da brainActivity), média e desvio
+    padrão de todas as amostras, mínimo, máximo, percentis e inclinação média.
+
+    Parâmetros:
+    session_ids (list): Id de cada sessão.
+    arrays (list): Sinal de cada sessão (arrays float64 não vazios).
+    percentiles (tuple): Percentis a calcular (0 a 100).
+    epoch (int, opcional): Tamanho da janela, em amostras.
+
+    Retorna:
+    dict: Contendo `sessions` (lista por sessão) e `summary` (agregado entre sessões).
+    """
+    values, starts, counts = pack_sessions(arrays)
+    percentiles = tuple(percentiles)
+    percentile_keys = [f"p{p:g}" for p in percentiles]
+
+    if len(values) == 0:
+        return {
+            "sessions": [],
+            "summary": {"sessions": 0, "samples": 0, "mean_of_means": 0}
+        }
+
+    sums = np.add.reduceat(values, starts)
+    means = sums / counts
+    deviations = values - np.repeat(means, counts)
+    stds = np.sqrt(np.add.reduceat(deviations * deviations, starts) / counts)
+    minimums = np.minimum.reduceat(values, starts)
+    maximums = np.maximum.reduceat(values, starts)
+
+    # Inclinação da regressão linear de cada sessão (x = índice da amostra)
+    local_index = np.arange(len(values)) - np.repeat(starts, counts)
+    n = counts.astype(np.float64)
+    sum_x = n * (n - 1) / 2
+    sum_xx = (n - 1) * n * (2 * n - 1) / 6
+    sum_xy = np.add.reduceat(local_index * values, starts)
+    denominator = n * sum_xx - sum_x * sum_x
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slopes = np.where(denominator > 0, (n * sum_xy - sum_x * sums) / denominator, 0.0)
+
+    session_percentiles = _segment_percentiles(values, starts, counts, percentiles) if percentiles else None
+    epoch_means = _epoch_means(values, starts, counts, epoch) if epoch else None
+
+    sessions = []
+    for index, session_id in enumerate(session_ids):
+        session = {
+            "id": session_id,
+            "count": int(counts[index]),
+            "mean": float(means[index]),
+            "std": float(stds[index]),
+            "min": float(minimums[index]),
+            "max": float(maximums[index]),
+            "slope": float(slopes[index]),
+        }
+        if session_percentiles is not None:
+            session["percentiles"] = dict(zip(percentile_keys, session_percentiles[index].tolist()))
+        if epoch_means is not None:
+            session["epoch_means"] = epoch_means[index].tolist()
+        sessions.append(session)
+
+    summary = {
+        "sessions": len(session_ids),
+        "samples": int(len(values)),
+        "mean_of_means": float(means.mean()),
+        "pooled_mean": float(values.mean()),
+        "pooled_std": float(values.std()),
+        "min": float(values.min()),
+        "max": float(values.max()),
+        "mean_slope": float(slopes.mean()),
+    }
+    if percentiles:
+        summary["percentiles"] = dict(zip(percentile_keys, np.percentile(values, percentiles).tolist()))
+
+    return {"sessions": sessions, "summary": summary}
+
+
+def downsample_lttb(values, max_points):
+    """
+    Escolhe até `max_points` amostras preservando a forma do sinal (Largest-Triangle-Three-Buckets).
+
+    A primeira e a última amostra são mantidas; em cada balde intermediário fica a amostra que
+    forma o maior triângulo com a amostra escolhida no balde anterior e a média do balde seguinte.
+
+    Lança:
+    ValueError: Se `max_points` for menor que 3.
+
+    Retorna:
+    np.ndarray: Índices das amostras escolhidas, em ordem crescente.
+    """
+    count = len(values)
+    if max_points >= count:
+        return np.arange(count)
+    if max_points < 3:
+        raise ValueError("O LTTB precisa de pelo menos 3 pontos.")
+
+    # max_points - 2 baldes entre a primeira e a última amostra
+    edges = np.linspace(1, count - 1, max_points - 1).astype(np.int64)
+    positions = np.arange(count, dtype=np.float64)
+    indices = np.empty(max_points, dtype=np.int64)
+    indices[0], indices[-1] = 0, count - 1
+
+    selected = 0
+    for bucket in range(max_points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_end = edges[bucket + 2] if bucket + 2 < len(edges) else count
+        next_x = positions[end:next_end].mean()
+        next_y = values[end:next_end].mean()
+
+        # Dobro da área do triângulo (a escala não muda o máximo)
+        areas = np.abs(
+            (positions[selected] - next_x) * (values[start:end] - values[selected])
+            - (positions[selected] - positions[start:end]) * (next_y - values[selected])
+        )
+        selected = start + int(np.argmax(areas))
+        indices[bucket + 1] = selected
+
+    return indices
+
+
+def downsample_minmax(values, max_points):
+    """
+    Mantém a primeira e a última amostra e o mínimo e o máximo de cada balde entre elas
+    ((`max_points` - 2) / 2 baldes), preservando os picos do sinal.
+
+    Lança:
+    ValueError: Se `max_points` for menor que 2.
+
+    Retorna:
+    np.ndarray: Índices das amostras escolhidas, em ordem crescente.
+    """
+    count = len(values)
+    if max_points >= count:
+        return np.arange(count)
+    if max_points < 2:
+        raise ValueError("O min/max precisa de pelo menos 2 pontos.")
+
+    buckets = (max_points - 2) // 2
+    edges = np.linspace(1, count - 1, buckets + 1).astype(np.int64)
+    lows = [start + int(np.argmin(values[start:end])) for start, end in zip(edges[:-1], edges[1:])]
+    highs = [start + int(np.argmax(values[start:end])) for start, end in zip(edges[:-1], edges[1:])]
+    return np.unique(np.concatenate(([0, count - 1], lows, highs)).astype(np.int64))
+
+
+DOWNSAMPLING_METHODS = {
+    "lttb": downsample_lttb,
+    "minmax": downsample_minmax,
+}
+
+
+class HegSignalAccumulator:
+    """
+    Acumulador (ver `aggregation.py`) que guarda o sinal HEG de cada sessão como array float64
+    para a análise em lote de `analyze_sessions`.
+    """
+
+    name = "heg_signal"
+    fields = ["heg_data"]
+    error_message = "Erro ao analisar os sinais cerebrais"
+
+    def __init__(self, percentiles=DEFAULT_PERCENTILES, epoch=None):
+        self.percentiles = percentiles
+        self.epoch = epoch
+        self.arrays = {}
+
+    def add(self, doc_id, session_data):
+        heg_data = session_data.get("heg_data", [])
+        if not heg_data:
+            return
+        try:
+            samples = to_float_array(heg_data)
+        except ValueError as e:
+            log_event(logger, logging.WARNING, "heg_data_invalid", session_id=doc_id, error=e)
+            return
+        if len(samples):
+            self.arrays[doc_id] = samples
+
+    def remove(self, doc_id, session_data):
+        self.arrays.pop(doc_id, None)
+
+    def result(self):
+        return analyze_sessions(list(self.arrays), list(self.arrays.values()), self.percentiles, self.epoch)
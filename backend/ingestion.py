@@ -0,0 +1,296 @@
+"""
+Ingestão em lote de sessões (importação de históricos e sincronização de dispositivos).
+
+O corpo da requisição (NDJSON ou array JSON) é lido em streaming, registro por registro.
+Cada registro é validado e os válidos são gravados com `WriteBatch` em lotes de até
+INGEST_BATCH_SIZE documentos. Até INGEST_MAX_IN_FLIGHT lotes são confirmados ao mesmo
+tempo no pool de `concurrency.py`, e o resultado de cada registro (id gravado ou motivo
+da falha) é devolvido na ordem do corpo.
+"""
+
+import codecs
+import json
+import os
+from collections import deque
+
+from concurrency import get_executor
+from heg import pack_heg
+from instrumentation import FIRESTORE_WRITES
+from rollups import parse_timestamp
+from summaries import SUMMARY_FIELD, summarize_session
+
+
+# Coleções que aceitam ingestão em lote
+INGEST_COLLECTIONS = ("sessionQuestionary", "sessionAvatar", "sessionMeditation")
+
+# Limite do Firestore para um WriteBatch
+INGEST_BATCH_SIZE = 500
+
+# Lotes confirmados ao mesmo tempo por requisição
+INGEST_MAX_IN_FLIGHT = int(os.getenv("INGEST_MAX_IN_FLIGHT", "4"))
+
+# Campo opcional do registro usado como id do documento (reimportações não duplicam sessões)
+RECORD_ID_FIELD = "id"
+
+# Campos de lista das sessões do questionário
+QUESTIONARY_LIST_FIELDS = ("heg_data", "game_data", "form_answer")
+
+# Grava o 'heg_data' das novas sessões no formato compacto (ver `heg.py`)
+HEG_PACKED_ENCODING = os.getenv("HEG_PACKED_ENCODING", "false").lower() == "true"
+
+_READ_SIZE = 64 * 1024
+
+
+class RecordError:
+    """
+    Registro que não pôde ser lido do corpo (ex.: linha NDJSON inválida).
+    """
+
+    def __init__(self, message):
+        self.message = message
+
+
+def _iter_lines(stream):
+    # Lê em blocos: iterar linha a linha sobre o stream da requisição lê um byte por vez
+    pending = b""
+    while True:
+        chunk = stream.read(_READ_SIZE)
+        if not chunk:
+            break
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        yield from lines
+    if pending:
+        yield pending
+
+
+def iter_ndjson(stream):
+    """
+    Lê um registro por linha. Uma linha inválida vira um `RecordError` sem interromper a leitura.
+    """
+    for line in _iter_lines(stream):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield RecordError(f"JSON inválido: {e}")
+
+
+def iter_json_array(stream):
+    """
+    Lê os itens de um array JSON sem carregar o corpo inteiro na memória.
+
+    Um erro de sintaxe vira um último `RecordError`, pois não é possível continuar depois dele.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    eof = False
+    expect = "["
+
+    def read():
+        nonlocal buffer, eof
+        chunk = stream.read(_READ_SIZE)
+        eof = not chunk
+        buffer += text_decoder.decode(chunk, final=eof)
+
+    try:
+        while True:
+            buffer = buffer.lstrip()
+            if not buffer:
+                if eof:
+                    raise ValueError("array JSON incompleto")
+                read()
+                continue
+
+            if expect == "[":
+                if buffer[0] != "[":
+                    raise ValueError("o corpo deve ser um array JSON")
+                buffer = buffer[1:]
+                expect = "first"
+                continue
+
+            if expect in ("first", "separator"):
+                if buffer[0] == "]":
+                    return
+                if expect == "separator":
+                    if buffer[0] != ",":
+                        raise ValueError("esperado ',' ou ']' entre os registros")
+                    buffer = buffer[1:]
+                    expect = "value"
+                    continue
+
+            try:
+                value, end = decoder.raw_decode(buffer)
+            except ValueError:
+                if eof:
+                    raise
+                read()
+                continue
+
+            # Um valor que termina no fim do buffer pode estar cortado (ex.: o número 12 de 123)
+            if end == len(buffer) and not eof:
+                read()
+                continue
+
+            buffer = buffer[end:]
+            expect = "separator"
+            yield value
+    except (UnicodeDecodeError, ValueError) as e:
+        yield RecordError(f"JSON inválido: {e}")
+
+
+def prepare_record(collection_name, record, date_field):
+    """
+    Valida um registro e o converte no documento a ser gravado.
+
+    `user_id` e a data em `date_field` são obrigatórios. A data em `date_field` é gravada como Timestamp (necessário para os filtros `from`/`to`)
+    e as sessões do questionário recebem o resumo usado pelas métricas (e, com
+    HEG_PACKED_ENCODING, o 'heg_data' no formato compacto).
+
+    Retorna:
+    tuple: (id do documento ou None para gerar um novo, dados do documento)
+
+    Lança:
+    ValueError: Se o registro for inválido.
+    """
+    if isinstance(record, RecordError):
+        raise ValueError(record.message)
+    if not isinstance(record, dict):
+        raise ValueError("o registro deve ser um objeto JSON")
+
+    data = dict(record)
+    doc_id = data.pop(RECORD_ID_FIELD, None)
+    if doc_id is not None and (not isinstance(doc_id, str) or not doc_id or "/" in doc_id):
+        raise ValueError(f"{RECORD_ID_FIELD} deve ser um texto não vazio e sem '/'")
+
+    # Sem o usuário e a data, a sessão ficaria fora dos filtros `user_id`, `from` e `to`
+    if not isinstance(data.get("user_id"), str) or not data["user_id"]:
+        raise ValueError("user_id é obrigatório e deve ser um texto não vazio")
+    if data.get(date_field) is None:
+        raise ValueError(f"{date_field} é obrigatório")
+
+    date = parse_timestamp(data[date_field])
+    if date is None:
+        raise ValueError(f"{date_field} não é uma data válida")
+    data[date_field] = date
+
+    if collection_name == "sessionQuestionary":
+        for field in QUESTIONARY_LIST_FIELDS:
+            if field in data and not isinstance(data[field], list):
+                raise ValueError(f"{field} deve ser uma lista")
+        if not all(isinstance(entry, dict) for entry in data.get("game_data", [])):
+            raise ValueError("os itens de game_data devem ser objetos")
+        data[SUMMARY_FIELD] = summarize_session(data)
+        if HEG_PACKED_ENCODING and data.get("heg_data"):
+            try:
+                data["heg_data"] = pack_heg(data["heg_data"])
+            except ValueError:
+                # Valores não numéricos continuam em lista (as métricas os ignoram, como antes)
+                pass
+
+    return doc_id, data
+
+
+def _commit(db, collection_name, writes):
+    batch = db.batch()
+    for reference, data in writes:
+        batch.set(reference, data)
+    batch.commit()
+    FIRESTORE_WRITES.inc(len(writes), collection=collection_name)
+
+
+def apply_updates(db, collection_name, updates, batch_size=INGEST_BATCH_SIZE):
+    """
+    Aplica atualizações parciais (referência, campos) em lotes de `batch_size` (usado pelas migrações).
+
+    Retorna:
+    int: Quantidade de documentos atualizados.
+    """
+    batch = db.batch()
+    pending = 0
+    updated = 0
+    for reference, fields in updates:
+        batch.update(reference, fields)
+        pending += 1
+        if pending >= batch_size:
+            batch.commit()
+            FIRESTORE_WRITES.inc(pending, collection=collection_name)
+            updated += pending
+            batch, pending = db.batch(), 0
+
+    if pending:
+        batch.commit()
+        FIRESTORE_WRITES.inc(pending, collection=collection_name)
+        updated += pending
+    return updated
+
+
+def ingest_records(db, collection_name, records, date_field,
+                   batch_size=INGEST_BATCH_SIZE, max_in_flight=INGEST_MAX_IN_FLIGHT):
+    """
+    Valida e grava os registros em lotes, confirmando até `max_in_flight` lotes ao mesmo tempo.
+
+    Parâmetros:
+    db: Cliente do banco de dados.
+    collection_name (str): Coleção de destino (uma de `INGEST_COLLECTIONS`).
+    records: Iterável de registros (dicionários ou `RecordError`).
+    date_field (str): Campo de data das sessões, gravado como Timestamp.
+
+    Um `id` repetido na mesma requisição é rejeitado (o segundo registro sobrescreveria o primeiro).
+
+    Retorna:
+    generator: Um resultado por registro, na ordem de entrada: `index`, `status`
+        (`ok` ou `error`) e `id` ou `error`.
+    """
+    collection = db.collection(collection_name)
+    executor = get_executor()
+    pending = deque()
+    # Índice do registro que usou cada id informado
+    seen_ids = {}
+
+    def finish(results, future):
+        # Uma falha no commit invalida o lote inteiro (o WriteBatch é atômico)
+        error = future.exception() if future is not None else None
+        for result in results:
+            if error is not None and result["status"] == "ok":
+                yield {"index": result["index"], "status": "error", "error": f"Falha ao gravar o lote: {error}"}
+            else:
+                yield result
+
+    def submit(results, writes):
+        future = executor.submit(_commit, db, collection_name, writes) if writes else None
+        pending.append((results, future))
+
+    results, writes = [], []
+    for index, record in enumerate(records):
+        try:
+            doc_id, data = prepare_record(collection_name, record, date_field)
+        except ValueError as e:
+            results.append({"index": index, "status": "error", "error": str(e)})
+            continue
+
+        if doc_id is not None:
+            if doc_id in seen_ids:
+                results.append({
+                    "index": index, "status": "error",
+                    "error": f"{RECORD_ID_FIELD} {doc_id} repetido (já usado no registro {seen_ids[doc_id]})",
+                })
+                continue
+            seen_ids[doc_id] = index
+
+        reference = collection.document(doc_id)
+        writes.append((reference, data))
+        results.append({"index": index, "status": "ok", "id": reference.id})
+
+        if len(writes) >= batch_size:
+            submit(results, writes)
+            results, writes = [], []
+            # Limita os lotes em andamento (e a memória usada) aguardando o mais antigo
+            while len(pending) >= max_in_flight:
+                yield from finish(*pending.popleft())
+
+    submit(results, writes)
+    while pending:
+        yield from finish(*pending.popleft())
@@ -0,0 +1,306 @@
+"""
+Instrumentação do backend: métricas no formato de texto do Prometheus e logs estruturados.
+
+Métricas registradas:
+- latência por rota (histograma);
+- consultas, documentos e bytes (estimados) lidos do Firestore por coleção;
+- tempo gasto em cada etapa `calculate_*` (histograma);
+- recálculos das métricas agendadas e chamadas coalescidas.
+
+Os logs por documento usam `log_event`, que não faz nada quando o nível está
+desativado e amostra os eventos de DEBUG (`LOG_SAMPLE_RATE`).
+"""
+
+import functools
+import logging
+import os
+import random
+import threading
+import time
+from datetime import datetime
+
+
+# Limites (em segundos) dos histogramas de latência
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    Contador monotônico com rótulos.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(label, "") for label in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(labels.get(label, "") for label in self.labels)
+        return self._values.get(key, 0)
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram:
+    """
+    Histograma cumulativo com limites fixos, no formato do Prometheus.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(label, "") for label in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][index] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        with self._lock:
+            items = sorted((key, {**series, "counts": list(series["counts"])}) for key, series in self._series.items())
+
+        lines = []
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series["counts"]):
+                cumulative += count
+                labels = _format_labels(self.labels + ("le",), key + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels + ("le",), key + ("+Inf",))
+            lines.append(f"{self.name}_bucket{labels} {series['count']}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(series['sum'])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {series['count']}")
+        return lines
+
+
+class Registry:
+    """
+    Conjunto de métricas exportadas pela rota /metrics.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self.register(Counter(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def render(self):
+        """
+        Gera o texto no formato de exposição do Prometheus (versão 0.0.4).
+        """
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+ROUTE_LATENCY = REGISTRY.histogram(
+    "http_request_duration_seconds", "Latência das requisições por rota.", ("route", "method", "status")
+)
+FIRESTORE_QUERIES = REGISTRY.counter(
+    "firestore_queries_total", "Consultas ao Firestore por coleção.", ("collection",)
+)
+FIRESTORE_DOCUMENTS = REGISTRY.counter(
+    "firestore_documents_read_total", "Documentos lidos do Firestore por coleção.", ("collection",)
+)
+FIRESTORE_BYTES = REGISTRY.counter(
+    "firestore_document_bytes_read_total", "Bytes (estimados) lidos do Firestore por coleção.", ("collection",)
+)
+FIRESTORE_WRITES = REGISTRY.counter(
+    "firestore_documents_written_total", "Documentos gravados no Firestore por coleção.", ("collection",)
+)
+STAGE_DURATION = REGISTRY.histogram(
+    "calculate_stage_duration_seconds", "Tempo gasto em cada etapa calculate_*.", ("stage",)
+)
+METRIC_JOB_DURATION = REGISTRY.histogram(
+    "metric_job_duration_seconds", "Tempo de cada recálculo das métricas agendadas por job.", ("job",)
+)
+METRIC_JOB_FAILURES = REGISTRY.counter(
+    "metric_job_failures_total", "Recálculos das métricas agendadas que falharam por job.", ("job",)
+)
+METRIC_CACHE_REQUESTS = REGISTRY.counter(
+    "metric_cache_requests_total",
+    "Requisições às métricas agendadas por job e estado (fresh, stale ou miss).",
+    ("job", "state"),
+)
+COALESCED_CALLS = REGISTRY.counter(
+    "coalesced_calls_total",
+    "Chamadas coalescidas por nome e papel (leader executou a função, collapsed aguardou outra chamada).",
+    ("name", "role"),
+)
+
+
+def estimate_document_size(value):
+    """
+    Estima o tamanho de um valor segundo as regras de armazenamento do Firestore.
+
+    Para não custar O(amostras) em arrays grandes (ex.: heg_data), o tamanho de uma lista é
+    estimado a partir do primeiro elemento.
+    """
+    if value is None or isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float, datetime)):
+        return 8
+    if isinstance(value, str):
+        return len(value) + 1
+    if isinstance(value, bytes):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(len(key) + 1 + estimate_document_size(item) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return len(value) * estimate_document_size(value[0]) if value else 0
+    return 8
+
+
+def _snapshot_data(doc):
+    # Os snapshots do SDK e do Firestore em memória guardam os campos em `_data`; `to_dict()`
+    # devolveria uma cópia profunda só para estimar o tamanho
+    try:
+        return doc._data or {}
+    except AttributeError:
+        return doc.to_dict() or {}
+
+
+def instrument_stream(docs, collection):
+    """
+    Envolve o resultado de `stream()` contando a consulta, os documentos e os bytes lidos.
+
+    O tamanho é estimado sobre os campos do snapshot, sem copiá-los.
+    """
+    FIRESTORE_QUERIES.inc(collection=collection)
+    for doc in docs:
+        FIRESTORE_DOCUMENTS.inc(collection=collection)
+        FIRESTORE_BYTES.inc(estimate_document_size(_snapshot_data(doc)) + 32, collection=collection)
+        yield doc
+
+
+def record_documents_read(collection, documents):
+    """
+    Registra documentos lidos fora de `instrument_stream` (ex.: eventos do on_snapshot).
+    """
+    if not documents:
+        return
+    FIRESTORE_DOCUMENTS.inc(len(documents), collection=collection)
+    FIRESTORE_BYTES.inc(sum(estimate_document_size(data or {}) + 32 for data in documents), collection=collection)
+
+
+def timed_stage(stage):
+    """
+    Decorador que registra o tempo de execução de uma etapa `calculate_*`.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                STAGE_DURATION.observe(time.perf_counter() - start, stage=stage)
+        return wrapper
+    return decorator
+
+
+# //////////////////////////////// (logs)
+
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.01"))
+
+
+class StructuredFormatter(logging.Formatter):
+    """
+    Formata os registros como pares chave=valor (logfmt).
+    """
+
+    def format(self, record):
+        fields = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        fields.update(getattr(record, "fields", {}))
+        return " ".join(f"{key}={self._quote(value)}" for key, value in fields.items())
+
+    @staticmethod
+    def _quote(value):
+        text = str(value)
+        if not text or any(char in text for char in ' "='):
+            return '"' + text.replace('"', '\\"') + '"'
+        return text
+
+
+def configure_logging():
+    """
+    Configura o logger raiz com o formato estruturado e o nível de `LOG_LEVEL` (padrão: WARNING).
+
+    É o único canal de saída do backend: os erros das rotas e dos cálculos também passam por ele.
+    """
+    handler = logging.StreamHandler()
+    handler.setFormatter(StructuredFormatter())
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(os.getenv("LOG_LEVEL", "WARNING").upper())
+
+
+def log_event(logger, level, event, **fields):
+    """
+    Registra um evento estruturado. Não faz nada se o nível estiver desativado, e os eventos de
+    DEBUG são amostrados segundo `LOG_SAMPLE_RATE`.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    if level <= logging.DEBUG and random.random() >= LOG_SAMPLE_RATE:
+        return
+    logger.log(level, event, extra={"fields": fields})
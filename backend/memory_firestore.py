@@ -0,0 +1,428 @@
+"""
+Firestore em memória, com a parte da API do `google.cloud.firestore` usada pelo backend.
+
+Implementa `collection()`, `collection_group()`, `document()`, `select()`, `where()`,
+`order_by()`, `start_after()`, `limit()`, `stream()`, `on_snapshot()`, `batch()` e
+`get_all()`, e conta os
+documentos lidos para simular o custo de leitura de cada rota. É usado pelos backends
+`memory` e `file` (ver `data_backend.py`) e pelos benchmarks.
+
+Opcionalmente simula a latência da rede (uma espera no início da consulta e a cada lote
+de documentos), para medir leituras concorrentes.
+"""
+
+import base64
+import copy
+import json
+import operator
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import namedtuple
+from datetime import datetime, timezone
+
+
+DOCUMENT_ID_FIELD = "__name__"
+
+# Documentos por resposta do stream (cada lote paga uma latência simulada)
+STREAM_BATCH_SIZE = 300
+
+_OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "in": lambda value, options: value in options,
+    "not-in": lambda value, options: value not in options,
+    "array-contains": lambda value, item: isinstance(value, list) and item in value,
+}
+
+
+# Filtro de `where(filter=...)`, com os mesmos atributos do FieldFilter do SDK
+FieldFilter = namedtuple("FieldFilter", ["field_path", "op_string", "value"])
+
+# Evento entregue aos listeners de `on_snapshot`, no mesmo formato do SDK (change.type.name, change.document)
+ChangeType = namedtuple("ChangeType", ["name"])
+MemoryDocumentChange = namedtuple("MemoryDocumentChange", ["type", "document"])
+
+
+def _encode_json(value):
+    # Campos bytes (ex.: 'heg_data' compacto) e datas são gravados com uma marca do tipo no arquivo
+    # do backend `file`, para voltarem com o mesmo tipo (e continuarem comparáveis nos filtros)
+    if isinstance(value, (bytes, bytearray)):
+        return {"__bytes__": base64.b64encode(value).decode("ascii")}
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    raise TypeError(f"Tipo não suportado pelo backend file: {type(value).__name__}")
+
+
+def _decode_json(value):
+    if len(value) == 1 and "__bytes__" in value:
+        return base64.b64decode(value["__bytes__"])
+    if len(value) == 1 and "__datetime__" in value:
+        return datetime.fromisoformat(value["__datetime__"])
+    return value
+
+
+class MemoryDocumentSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        # Cópia profunda, como o SDK: alterar o resultado não muda o documento guardado
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field):
+        return copy.deepcopy(self._data.get(field)) if self._data is not None else None
+
+
+class MemoryDocumentReference:
+    def __init__(self, client, collection_path, doc_id):
+        self._client = client
+        self._collection_path = collection_path
+        self.id = doc_id
+        self.path = f"{collection_path}/{doc_id}"
+
+    @property
+    def parent(self):
+        return MemoryCollectionReference(self._client, self._collection_path)
+
+    def collection(self, name):
+        return MemoryCollectionReference(self._client, f"{self.path}/{name}")
+
+    def get(self, field_paths=None):
+        data = self._client.collections.get(self._collection_path, {}).get(self.id)
+        if data is not None:
+            self._client.documents_read += 1
+            if field_paths is not None:
+                data = {field: data[field] for field in field_paths if field in data}
+        return MemoryDocumentSnapshot(self, data)
+
+    def set(self, data, merge=False):
+        self._client.write(self._collection_path, self.id, data, merge=merge)
+
+    def update(self, data):
+        if self.id not in self._client.collections.get(self._collection_path, {}):
+            raise KeyError(f"Documento {self.path} não encontrado")
+        self._client.write(self._collection_path, self.id, data, merge=True)
+
+    def delete(self):
+        self._client.delete(self._collection_path, self.id)
+
+
+class MemoryQuery:
+    def __init__(self, client, paths, filters=(), orders=(), cursor=None, limit=None, fields=None):
+        self._client = client
+        self._paths = paths
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._cursor = cursor
+        self._limit = limit
+        self._fields = fields
+
+    def _copy(self, **changes):
+        state = {
+            "filters": self._filters,
+            "orders": self._orders,
+            "cursor": self._cursor,
+            "limit": self._limit,
+            "fields": self._fields,
+        }
+        state.update(changes)
+        return MemoryQuery(self._client, self._paths, **state)
+
+    def where(self, field_path=None, op_string=None, value=None, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + ((field_path, op_string, value),))
+
+    def order_by(self, field_path, direction="ASCENDING"):
+        return self._copy(orders=self._orders + ((field_path, direction),))
+
+    def start_after(self, values):
+        return self._copy(cursor=values)
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def select(self, field_paths):
+        return self._copy(fields=list(field_paths))
+
+    @staticmethod
+    def _value(field, reference, data):
+        return reference.path if field == DOCUMENT_ID_FIELD else data.get(field)
+
+    @staticmethod
+    def _matches(field_value, op_string, value):
+        if field_value is None:
+            return False
+        try:
+            return _OPERATORS[op_string](field_value, value)
+        except TypeError:
+            # Como no Firestore, valores de tipos diferentes (ex.: texto e data) nunca atendem ao filtro
+            return False
+
+    def _documents(self):
+        for path in self._paths():
+            for doc_id, data in self._client.collections.get(path, {}).items():
+                yield MemoryDocumentReference(self._client, path, doc_id), data
+
+    def stream(self):
+        self._client.queries += 1
+        self._client.wait()
+        with self._client.lock:
+            documents = list(self._documents())
+
+        for field, op_string, value in self._filters:
+            documents = [
+                (reference, data) for reference, data in documents
+                if self._matches(self._value(field, reference, data), op_string, value)
+            ]
+
+        # Sem order_by explícito, o Firestore ordena pelo caminho do documento
+        orders = self._orders or ((DOCUMENT_ID_FIELD, "ASCENDING"),)
+        for field, direction in reversed(orders):
+            documents = [(reference, data) for reference, data in documents if self._value(field, reference, data) is not None]
+            documents.sort(key=lambda item: self._value(field, *item), reverse=direction == "DESCENDING")
+
+        if self._cursor is not None:
+            fields = [field for field, _ in orders if field in self._cursor]
+            cursor = tuple(self._cursor_value(field) for field in fields)
+            documents = [
+                (reference, data) for reference, data in documents
+                if tuple(self._value(field, reference, data) for field in fields) > cursor
+            ]
+
+        if self._limit is not None:
+            documents = documents[:self._limit]
+
+        for index, (reference, data) in enumerate(documents):
+            if index and index % STREAM_BATCH_SIZE == 0:
+                self._client.wait()
+            if self._fields is not None:
+                data = {field: data[field] for field in self._fields if field in data}
+            self._client.documents_read += 1
+            yield MemoryDocumentSnapshot(reference, data)
+
+    def _cursor_value(self, field):
+        value = self._cursor[field]
+        if field == DOCUMENT_ID_FIELD and "/" not in value:
+            # Cursor informado apenas com o id do documento
+            return f"{self._paths()[0]}/{value}" if len(self._paths()) == 1 else value
+        return value
+
+
+class MemoryCollectionReference(MemoryQuery):
+    def __init__(self, client, path):
+        super().__init__(client, lambda: [path])
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    @property
+    def parent(self):
+        if "/" not in self.path:
+            return None
+        collection_path, doc_id = self.path.rsplit("/", 2)[:2]
+        return MemoryDocumentReference(self._client, collection_path, doc_id)
+
+    def document(self, doc_id=None):
+        if doc_id is None:
+            doc_id = uuid.uuid4().hex[:20]
+        return MemoryDocumentReference(self._client, self.path, doc_id)
+
+    def add(self, data):
+        reference = self.document()
+        reference.set(data)
+        return None, reference
+
+    def on_snapshot(self, callback):
+        """
+        Registra um listener: recebe todos os documentos como "ADDED" e, depois, cada alteração.
+        """
+        return self._client.listen(self.path, callback)
+
+
+class MemoryWriteBatch:
+    """
+    Lote de escritas aplicado de uma vez em `commit()` (até 500 operações, como no Firestore).
+    """
+
+    MAX_OPERATIONS = 500
+
+    def __init__(self, client):
+        self._client = client
+        self._operations = []
+
+    def _add(self, operation):
+        if len(self._operations) >= self.MAX_OPERATIONS:
+            raise ValueError(f"Um lote aceita no máximo {self.MAX_OPERATIONS} operações")
+        self._operations.append(operation)
+
+    def set(self, reference, data, merge=False):
+        self._add(("set", reference, dict(data), merge))
+
+    def update(self, reference, data):
+        self._add(("update", reference, dict(data), True))
+
+    def delete(self, reference):
+        self._add(("delete", reference, None, False))
+
+    def commit(self):
+        client = self._client
+        client.wait()
+        with client.lock:
+            # Como no Firestore, o lote inteiro falha se algum documento do update não existir
+            for kind, reference, _, _ in self._operations:
+                if kind == "update" and reference.id not in client.collections.get(reference._collection_path, {}):
+                    raise KeyError(f"Documento {reference.path} não encontrado")
+            for kind, reference, data, merge in self._operations:
+                if kind == "delete":
+                    client.delete(reference._collection_path, reference.id, persist=False)
+                else:
+                    client.write(reference._collection_path, reference.id, data, merge=merge, persist=False)
+            client.save()
+        operations, self._operations = self._operations, []
+        return operations
+
+
+class MemoryWatch:
+    def __init__(self, client, path, callback):
+        self._client = client
+        self._path = path
+        self._callback = callback
+
+    def unsubscribe(self):
+        with self._client.lock:
+            listeners = self._client.listeners.get(self._path, [])
+            if self._callback in listeners:
+                listeners.remove(self._callback)
+
+
+class MemoryFirestore:
+    """
+    Cliente em memória: `collections` mapeia o caminho de cada coleção para {id: dados}.
+
+    Parâmetros:
+    path (str, opcional): Arquivo JSON no mesmo formato de `collections`. É carregado na criação
+        do cliente e regravado a cada escrita.
+    latency (float): Espera (em segundos) simulada a cada ida e volta ao servidor.
+    """
+
+    def __init__(self, path=None, latency=0.0):
+        self.path = path
+        self.latency = latency
+        self.collections = {}
+        self.listeners = {}
+        self.lock = threading.RLock()
+        self.queries = 0
+        self.documents_read = 0
+        self.documents_written = 0
+
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as file:
+                self.collections = json.load(file, object_hook=_decode_json)
+
+    def collection(self, path):
+        return MemoryCollectionReference(self, path)
+
+    def collection_group(self, collection_id):
+        def paths():
+            return sorted(path for path in self.collections if path.rsplit("/", 1)[-1] == collection_id)
+        return MemoryQuery(self, paths)
+
+    def batch(self):
+        return MemoryWriteBatch(self)
+
+    def get_all(self, references, field_paths=None):
+        """
+        Lê vários documentos em uma única ida ao servidor (os inexistentes vêm com `exists` falso).
+        """
+        self.wait()
+        with self.lock:
+            snapshots = []
+            for reference in references:
+                data = self.collections.get(reference._collection_path, {}).get(reference.id)
+                if data is not None:
+                    self.documents_read += 1
+                    if field_paths is not None:
+                        data = {field: data[field] for field in field_paths if field in data}
+                snapshots.append(MemoryDocumentSnapshot(reference, data))
+        return snapshots
+
+    def write(self, collection_path, doc_id, data, merge=False, persist=True):
+        with self.lock:
+            documents = self.collections.setdefault(collection_path, {})
+            kind = "MODIFIED" if doc_id in documents else "ADDED"
+            # Guarda uma cópia, como o SDK (que serializa o documento ao gravar)
+            data = copy.deepcopy(data)
+            if merge and doc_id in documents:
+                documents[doc_id] = {**documents[doc_id], **data}
+            else:
+                documents[doc_id] = data
+            self.documents_written += 1
+            self._notify(collection_path, kind, doc_id, documents[doc_id])
+            if persist:
+                self.save()
+
+    def delete(self, collection_path, doc_id, persist=True):
+        with self.lock:
+            data = self.collections.get(collection_path, {}).pop(doc_id, None)
+            if data is not None:
+                self._notify(collection_path, "REMOVED", doc_id, data)
+                if persist:
+                    self.save()
+
+    def listen(self, collection_path, callback):
+        with self.lock:
+            self.listeners.setdefault(collection_path, []).append(callback)
+            documents = self.collections.get(collection_path, {})
+            changes = [self._change(collection_path, "ADDED", doc_id, data) for doc_id, data in documents.items()]
+            callback([change.document for change in changes], changes, datetime.now(timezone.utc))
+        return MemoryWatch(self, collection_path, callback)
+
+    def _change(self, collection_path, kind, doc_id, data):
+        reference = MemoryDocumentReference(self, collection_path, doc_id)
+        return MemoryDocumentChange(ChangeType(kind), MemoryDocumentSnapshot(reference, data))
+
+    def _notify(self, collection_path, kind, doc_id, data):
+        listeners = self.listeners.get(collection_path)
+        if not listeners:
+            return
+        change = self._change(collection_path, kind, doc_id, data)
+        for callback in list(listeners):
+            callback([change.document], [change], datetime.now(timezone.utc))
+
+    def save(self):
+        """
+        Grava as coleções no arquivo `path` (se houver), de forma atômica.
+        """
+        if not self.path:
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=directory, delete=False, suffix=".tmp") as file:
+            try:
+                json.dump(self.collections, file, default=_encode_json)
+            except TypeError:
+                file.close()
+                os.remove(file.name)
+                raise
+        os.replace(file.name, self.path)
+
+    def wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def reset_counters(self):
+        self.queries = 0
+        self.documents_read = 0
+        self.documents_written = 0
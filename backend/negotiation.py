@@ -0,0 +1,160 @@
+"""
+Negociação do formato e da compressão das respostas.
+
+- Formato: com `Accept: application/msgpack` as respostas são codificadas em MessagePack
+  em vez de JSON. O 'heg_data' dos documentos vai como binário no formato compacto (ver
+  `heg.py`). Nas rotas em streaming, a resposta é uma sequência de objetos MessagePack
+  (um por registro, como no NDJSON).
+- Compressão: com `Accept-Encoding: br` ou `gzip`, as respostas acima de
+  COMPRESSION_MIN_SIZE bytes são comprimidas. As respostas em streaming são comprimidas
+  bloco a bloco, sem reunir o corpo inteiro na memória, e cada bloco é enviado assim que
+  é gerado. O brotli é opcional: sem o
+  pacote `brotli` instalado, apenas o gzip é oferecido.
+"""
+
+import os
+import zlib
+from datetime import datetime
+
+import msgpack
+import numpy as np
+
+from heg import is_packed_heg, pack_heg
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+MSGPACK_MIMETYPE = "application/msgpack"
+MSGPACK_MIMETYPES = (MSGPACK_MIMETYPE, "application/x-msgpack")
+
+# Respostas menores que isso não compensam o custo da compressão
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+
+# Níveis rápidos: o objetivo é reduzir a transferência sem pesar na CPU do worker
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+COMPRESSIBLE_MIMETYPES = (
+    "application/json", "application/x-ndjson", MSGPACK_MIMETYPE, "text/plain", "text/html", "text/csv",
+)
+
+
+def wants_msgpack(accept_mimetypes):
+    """
+    Verifica se o cliente prefere MessagePack a JSON (em caso de empate, vale o JSON).
+    """
+    best = accept_mimetypes.best_match(("application/json",) + MSGPACK_MIMETYPES)
+    return best in MSGPACK_MIMETYPES
+
+
+def _msgpack_default(value):
+    if isinstance(value, datetime):
+        # Datas sem fuso (as com fuso viram o tipo Timestamp do MessagePack)
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, (set, tuple)):
+        return list(value)
+    raise TypeError(f"Objeto do tipo {type(value).__name__} não é serializável em MessagePack")
+
+
+def packb(value):
+    """
+    Codifica um valor em MessagePack.
+    """
+    return msgpack.packb(value, default=_msgpack_default, use_bin_type=True, datetime=True)
+
+
+def pack_heg_fields(document):
+    """
+    Retorna o documento com o 'heg_data' em lista convertido para o formato compacto (para o MessagePack).
+    """
+    heg_data = document.get("heg_data") if isinstance(document, dict) else None
+    if not heg_data or is_packed_heg(heg_data):
+        return document
+    try:
+        return {**document, "heg_data": pack_heg(heg_data)}
+    except (TypeError, ValueError):
+        return document
+
+
+def stream_msgpack(items):
+    """
+    Escreve uma sequência de objetos MessagePack. Um erro no meio do streaming vira um último objeto com `error`.
+    """
+    packer = msgpack.Packer(default=_msgpack_default, use_bin_type=True, datetime=True)
+    try:
+        for item in items:
+            yield packer.pack(item)
+    except Exception as e:
+        yield packer.pack({"error": str(e)})
+
+
+def choose_encoding(accept_encodings):
+    """
+    Escolhe a compressão aceita pelo cliente (`br` quando disponível, senão `gzip`), ou None.
+    """
+    encodings = ("br", "gzip") if brotli is not None else ("gzip",)
+    best = accept_encodings.best_match(encodings)
+    return best if best and accept_encodings[best] > 0 else None
+
+
+def _compressor(encoding):
+    # Retorna (comprimir, esvaziar o buffer sem encerrar o stream, encerrar)
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        return compressor.process, compressor.flush, compressor.finish
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    return compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+
+
+def _compress_stream(original, chunks, encoding):
+    compress, flush, finish = _compressor(encoding)
+    try:
+        for chunk in chunks:
+            # Cada bloco sai assim que é gerado (senão o compressor o retém até encher o buffer)
+            data = compress(chunk) + flush()
+            if data:
+                yield data
+        yield finish()
+    finally:
+        close = getattr(original, "close", None)
+        if close is not None:
+            close()
+
+
+def compress_response(response, accept_encodings):
+    """
+    Comprime a resposta com a codificação aceita pelo cliente, quando valer a pena.
+
+    Respostas em streaming são sempre comprimidas (o tamanho não é conhecido de antemão e elas
+    existem justamente para corpos grandes). As demais, apenas acima de COMPRESSION_MIN_SIZE.
+    """
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES or response.direct_passthrough:
+        return response
+    response.vary.add("Accept-Encoding")
+
+    if response.status_code < 200 or response.status_code in (204, 304) or "Content-Encoding" in response.headers:
+        return response
+
+    encoding = choose_encoding(accept_encodings)
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, response.iter_encoded(), encoding)
+        response.headers.pop("Content-Length", None)
+    else:
+        body = response.get_data()
+        if len(body) < COMPRESSION_MIN_SIZE:
+            return response
+        compress, _, finish = _compressor(encoding)
+        response.set_data(compress(body) + finish())
+
+    response.headers["Content-Encoding"] = encoding
+    return response
@@ -0,0 +1,224 @@
+"""
+Agregações por período usadas pelas telas de Avaliação e Engajamento.
+
+As funções recebem os documentos já lidos do Firestore (DocumentSnapshot) e
+devolvem apenas os valores agrupados, para que o navegador não precise baixar
+as coleções inteiras.
+"""
+
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+
+from aggregation import scan_documents
+
+
+# Granularidades aceitas para os períodos
+GRANULARITIES = ("day", "week", "month")
+
+
+def parse_timestamp(value):
+    """
+    Converte o valor de data de uma sessão para datetime (UTC).
+
+    Aceita datetime (Timestamp do Firestore), texto ISO 8601 ou RFC 2822 e números em
+    segundos ou milissegundos desde a época.
+
+    Retorna:
+    datetime: A data convertida, ou None se o valor não puder ser interpretado.
+    """
+    if value is None or isinstance(value, bool):
+        return None
+
+    if isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, (int, float)):
+        # Valores muito grandes estão em milissegundos (padrão do JavaScript)
+        seconds = value / 1000 if value > 1e11 else value
+        parsed = datetime.fromtimestamp(seconds, tz=timezone.utc)
+    elif isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            try:
+                parsed = parsedate_to_datetime(value)
+            except (TypeError, ValueError):
+                return None
+    else:
+        return None
+
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def period_key(value, granularity):
+    """
+    Retorna a chave do período ao qual a data pertence.
+
+    Formatos:
+    day = AAAA-MM-DD
+    week = AAAA-MM-DD (segunda-feira da semana)
+    month = AAAA-MM
+
+    Retorna:
+    str: A chave do período, ou None se a data for inválida.
+    """
+    date = parse_timestamp(value)
+    if date is None:
+        return None
+    if granularity == "day":
+        return date.strftime("%Y-%m-%d")
+    if granularity == "week":
+        return (date - timedelta(days=date.weekday())).strftime("%Y-%m-%d")
+    return date.strftime("%Y-%m")
+
+
+def to_number(value):
+    """
+    Converte um valor numérico (ou texto numérico) para float, retornando None se não for possível.
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class QuestionaryRollupAccumulator:
+    """
+    Acumulador (ver `aggregation.py`) que agrupa as respostas do form_answer por período.
+
+    Para cada período é calculada a média das respostas brutas:
+    form_answer[0] = estresse, form_answer[1] = foco, form_answer[2] = controle.
+    """
+
+    name = "questionary_rollup"
+    error_message = "Erro ao agrupar os questionários por período"
+    keys = ("stress_value", "focus_value", "control_value")
+
+    def __init__(self, granularity="month", date_field="updated_at"):
+        self.granularity = granularity
+        self.date_field = date_field
+        self.fields = [date_field, "form_answer"]
+        self.periods = defaultdict(lambda: {"sessions": 0, "sums": [0.0, 0.0, 0.0], "counts": [0, 0, 0]})
+
+    def _contribution(self, session_data):
+        form_answers = session_data.get("form_answer")
+        period = period_key(session_data.get(self.date_field), self.granularity)
+        if not form_answers or period is None:
+            return None, []
+
+        values = [to_number(form_answers[index]) if len(form_answers) > index else None for index in range(len(self.keys))]
+        return period, values
+
+    def _apply(self, session_data, sign):
+        period, values = self._contribution(session_data)
+        if period is None:
+            return
+
+        bucket = self.periods[period]
+        bucket["sessions"] += sign
+        for index, value in enumerate(values):
+            if value is not None:
+                bucket["sums"][index] += sign * value
+                bucket["counts"][index] += sign
+
+        if bucket["sessions"] == 0:
+            del self.periods[period]
+
+    def add(self, doc_id, session_data):
+        self._apply(session_data, 1)
+
+    def remove(self, doc_id, session_data):
+        self._apply(session_data, -1)
+
+    def result(self):
+        result = []
+        for period in sorted(self.periods):
+            bucket = self.periods[period]
+            row = {"period": period, "sessions": bucket["sessions"]}
+            for index, key in enumerate(self.keys):
+                count = bucket["counts"][index]
+                row[key] = bucket["sums"][index] / count if count else None
+            result.append(row)
+        return result
+
+
+def rollup_questionary(sessions, granularity="month", date_field="updated_at"):
+    """
+    Agrupa as respostas do form_answer da coleção 'sessionQuestionary' por período.
+
+    Retorna:
+    list: Um dicionário por período, em ordem cronológica (None em caso de erro).
+    """
+    accumulator = QuestionaryRollupAccumulator(granularity, date_field)
+    return scan_documents(sessions, [accumulator])[accumulator.name]
+
+
+class _EngagementGroup:
+    """
+    Soma de duração, número de sessões e usuários distintos de um grupo.
+    """
+
+    def __init__(self):
+        self.session_duration = 0
+        self.sessions = 0
+        self.users = set()
+
+    def add(self, session_data):
+        self.session_duration += to_number(session_data.get("session_duration")) or 0
+        self.sessions += 1
+        if session_data.get("user_id"):
+            self.users.add(session_data["user_id"])
+
+    def to_dict(self, **extra):
+        return {
+            **extra,
+            "session_duration": self.session_duration,
+            "sessions": self.sessions,
+            "distinct_users": len(self.users)
+        }
+
+
+def summarize_engagement(avatar_sessions, meditation_sessions, granularity="month", date_field="updated_at"):
+    """
+    Resume o engajamento das coleções 'sessionAvatar' (por segment) e 'sessionMeditation' (por category).
+
+    As durações são retornadas em segundos, como estão armazenadas em `session_duration`.
+
+    Retorna:
+    dict: Totais gerais, totais por segment/category e totais por período.
+    """
+    overall = _EngagementGroup()
+    periods = defaultdict(_EngagementGroup)
+    sources = {
+        "avatar": (avatar_sessions, "segment", "segments"),
+        "meditation": (meditation_sessions, "category", "categories"),
+    }
+
+    result = {"granularity": granularity}
+    for source, (sessions, group_field, groups_key) in sources.items():
+        total = _EngagementGroup()
+        groups = defaultdict(_EngagementGroup)
+
+        for session in sessions:
+            session_data = session.to_dict()
+            total.add(session_data)
+            overall.add(session_data)
+            if session_data.get(group_field):
+                groups[session_data[group_field]].add(session_data)
+
+            period = period_key(session_data.get(date_field), granularity)
+            if period is not None:
+                periods[period].add(session_data)
+
+        result[source] = total.to_dict(**{
+            groups_key: [groups[name].to_dict(**{group_field: name}) for name in sorted(groups)]
+        })
+
+    result["session_duration"] = overall.session_duration
+    result["distinct_users"] = len(overall.users)
+    result["periods"] = [periods[period].to_dict(period=period) for period in sorted(periods)]
+    return result
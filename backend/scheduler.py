@@ -0,0 +1,241 @@
+"""
+Recálculo das métricas derivadas em segundo plano (stale-while-revalidate).
+
+Cada métrica registrada (job) é guardada por combinação de parâmetros (ex.: filtros). Uma
+requisição recebe imediatamente o último resultado calculado, junto com a sua idade:
+
+- até `interval` segundos: o resultado é servido como está (fresh);
+- até `max_staleness` segundos, ou depois de uma alteração dos dados (`invalidate`): o
+  resultado é servido e um recálculo é agendado (stale);
+- sem resultado ou acima de `max_staleness`: a requisição aguarda o recálculo (miss).
+
+Os recálculos rodam em um pool próprio com no máximo `max_concurrency` jobs ao mesmo tempo,
+e cada combinação tem no máximo um recálculo em andamento (as requisições que chegam durante
+ele aguardam o mesmo resultado). Uma thread também recalcula antecipadamente as combinações
+antigas (ou invalidadas) que foram consultadas desde o último cálculo, no máximo
+`max_refreshes_per_tick` por rodada, começando pelas invalidadas e pelas mais antigas.
+
+`invalidate` só conhece as alterações avisadas a este processo. Alterações feitas por outros
+workers ou diretamente no Firestore aparecem quando o resultado passa de `interval` segundos
+(e no máximo depois de `max_staleness`), a menos que uma fonte de eventos chame `invalidate`
+(ver `AggregateStore(on_change=...)`).
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from instrumentation import METRIC_CACHE_REQUESTS, METRIC_JOB_DURATION, METRIC_JOB_FAILURES, log_event
+
+
+logger = logging.getLogger(__name__)
+
+
+def is_valid_result(result):
+    """
+    Verifica se o resultado pode ser guardado (as funções `calculate_*` sinalizam erro com None ou `error`).
+    """
+    return bool(result) and not (isinstance(result, dict) and "error" in result)
+
+
+class _Entry:
+    __slots__ = ("result", "computed_at", "computed_wall", "dirty", "future", "last_access")
+
+    def __init__(self):
+        self.result = None
+        self.computed_at = None
+        self.computed_wall = None
+        self.dirty = False
+        self.future = None
+        self.last_access = time.monotonic()
+
+
+class MetricScheduler:
+    """
+    Guarda o último resultado de cada job e o recalcula em segundo plano.
+
+    Parâmetros:
+    interval (float): Idade (em segundos) a partir da qual o resultado é recalculado.
+    max_staleness (float): Idade máxima de um resultado servido sem aguardar o recálculo.
+    max_concurrency (int): Recálculos executados ao mesmo tempo.
+    max_entries (int): Combinações de job e parâmetros guardadas (as usadas há mais tempo são descartadas).
+    max_refreshes_per_tick (int, opcional): Recálculos antecipados agendados por rodada (padrão: max_concurrency).
+    """
+
+    def __init__(self, interval=60, max_staleness=300, max_concurrency=2, max_entries=256, max_refreshes_per_tick=None):
+        if max_staleness < interval:
+            raise ValueError("max_staleness deve ser maior ou igual a interval")
+        self.interval = interval
+        self.max_staleness = max_staleness
+        self.max_entries = max_entries
+        self.max_refreshes_per_tick = max_refreshes_per_tick or max_concurrency
+        self._jobs = {}
+        self._stats = {}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="metric-job")
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._ticker = None
+
+    def register(self, name, compute, is_valid=is_valid_result):
+        """
+        Registra um job. `compute` recebe os parâmetros passados a `get` (que devem ser hasheáveis).
+        """
+        self._jobs[name] = (compute, is_valid)
+        self._stats[name] = {"runs": 0, "failures": 0, "total_seconds": 0.0, "last_seconds": None, "last_run_at": None}
+
+    def start(self):
+        """
+        Inicia a thread que recalcula periodicamente os resultados consultados recentemente.
+        """
+        if self._ticker is None:
+            self._ticker = threading.Thread(target=self._tick_loop, name="metric-scheduler", daemon=True)
+            self._ticker.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+        self._executor.shutdown(wait=False)
+
+    def get(self, name, *args):
+        """
+        Retorna o resultado do job para os parâmetros `args`, recalculando-o se necessário.
+
+        Retorna:
+        tuple: (resultado, data do cálculo, idade em segundos). Se o recálculo necessário falhar,
+            o resultado é o valor de erro retornado pelo job (ex.: None) e a data é None.
+        """
+        key = (name, args)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _Entry()
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            self._entries.move_to_end(key)
+            entry.last_access = now
+
+            age = now - entry.computed_at if entry.result is not None else None
+            if age is not None and age <= self.max_staleness:
+                state = "stale" if entry.dirty or age >= self.interval else "fresh"
+                if state == "stale":
+                    self._submit(key, entry)
+                result = (entry.result, entry.computed_wall, age)
+            else:
+                state = "miss"
+                future = self._submit(key, entry)
+
+        METRIC_CACHE_REQUESTS.inc(job=name, state=state)
+        if state != "miss":
+            return result
+
+        value = future.result()
+        with self._lock:
+            if entry.result is not value:
+                return value, None, None
+            return entry.result, entry.computed_wall, time.monotonic() - entry.computed_at
+
+    def invalidate(self, *names):
+        """
+        Marca os resultados dos jobs `names` (todos, se nenhum for informado) para recálculo.
+        """
+        with self._lock:
+            for (name, _), entry in self._entries.items():
+                if not names or name in names:
+                    entry.dirty = True
+        self._wake.set()
+
+    def stats(self):
+        """
+        Retorna, por job, as execuções, as falhas, a duração média e a última, e os resultados guardados.
+        """
+        with self._lock:
+            entries = {}
+            for (name, _), entry in self._entries.items():
+                entries[name] = entries.get(name, 0) + (entry.result is not None)
+            return {
+                name: {
+                    "runs": stats["runs"],
+                    "failures": stats["failures"],
+                    "mean_seconds": stats["total_seconds"] / stats["runs"] if stats["runs"] else None,
+                    "last_seconds": stats["last_seconds"],
+                    "last_run_at": stats["last_run_at"],
+                    "cached_results": entries.get(name, 0),
+                }
+                for name, stats in self._stats.items()
+            }
+
+    def _submit(self, key, entry):
+        # Um único recálculo em andamento por combinação (chamado com o lock adquirido)
+        if entry.future is None or entry.future.done():
+            entry.future = self._executor.submit(self._run, key, entry)
+        return entry.future
+
+    def _run(self, key, entry):
+        name, args = key
+        compute, is_valid = self._jobs[name]
+        with self._lock:
+            # Alterações durante o cálculo marcam o resultado para um novo recálculo
+            entry.dirty = False
+
+        started_at, started_wall = time.monotonic(), datetime.now(timezone.utc)
+        start = time.perf_counter()
+        try:
+            value = compute(*args)
+        except Exception as e:
+            logger.error("Erro ao recalcular a métrica %s: %s", name, e)
+            value = None
+        duration = time.perf_counter() - start
+        METRIC_JOB_DURATION.observe(duration, job=name)
+
+        valid = is_valid(value)
+        with self._lock:
+            stats = self._stats[name]
+            stats["runs"] += 1
+            stats["total_seconds"] += duration
+            stats["last_seconds"] = duration
+            stats["last_run_at"] = started_wall.isoformat()
+            if valid:
+                # A idade conta a partir do início do cálculo (os dados foram lidos depois disso)
+                entry.result, entry.computed_at, entry.computed_wall = value, started_at, started_wall
+            else:
+                stats["failures"] += 1
+
+        if not valid:
+            METRIC_JOB_FAILURES.inc(job=name)
+        log_event(logger, logging.DEBUG, "metric_job", job=name, seconds=round(duration, 4), valid=valid)
+        return value
+
+    def _due_entries(self, now):
+        """
+        Retorna as combinações a recalcular antecipadamente, as invalidadas e as mais antigas primeiro
+        (chamado com o lock adquirido).
+        """
+        due = []
+        for key, entry in self._entries.items():
+            if entry.result is None or (entry.future is not None and not entry.future.done()):
+                continue
+            # Só as consultadas desde o último cálculo (as demais aguardam a próxima consulta)
+            if entry.last_access < entry.computed_at or now - entry.last_access > self.max_staleness:
+                continue
+            if entry.dirty or now - entry.computed_at >= self.interval:
+                due.append((not entry.dirty, entry.computed_at, key, entry))
+        due.sort(key=lambda item: item[:2])
+        return [(key, entry) for _, _, key, entry in due[:self.max_refreshes_per_tick]]
+
+    def _tick_loop(self):
+        while not self._stopped.is_set():
+            self._wake.wait(timeout=min(self.interval, 1.0))
+            self._wake.clear()
+            with self._lock:
+                for key, entry in self._due_entries(time.monotonic()):
+                    try:
+                        self._submit(key, entry)
+                    except RuntimeError:
+                        # Pool encerrado (stop ou fim do interpretador)
+                        return
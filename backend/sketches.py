@@ -0,0 +1,263 @@
+"""
+Histogramas logarítmicos (no estilo DDSketch) para distribuições em memória limitada.
+
+Cada valor cai no balde `ceil(log(|valor|) / log(gamma))`, com
+gamma = (1 + precisão) / (1 - precisão). Qualquer percentil é estimado com erro relativo
+de no máximo `relative_accuracy` (1% por padrão), e a memória depende do intervalo dos
+valores (quantidade de baldes), não da quantidade de valores.
+
+Dois histogramas com a mesma precisão são combinados somando as contagens de cada balde,
+então o histograma de cada sessão pode ser gravado no seu resumo e combinado entre
+sessões e usuários em tempo proporcional ao número de baldes (limitado a `max_buckets`).
+"""
+
+import math
+
+import numpy as np
+
+
+DEFAULT_RELATIVE_ACCURACY = 0.01
+DEFAULT_MAX_BUCKETS = 2048
+
+# Valores com módulo abaixo disso contam como zero
+MIN_INDEXABLE_VALUE = 1e-9
+
+
+class LogHistogram:
+    """
+    Histograma combinável de valores reais com erro relativo limitado nos percentis.
+
+    Parâmetros:
+    relative_accuracy (float): Erro relativo máximo dos percentis (entre 0 e 1).
+    max_buckets (int): Baldes por sinal. Acima disso, os baldes dos menores módulos são unidos.
+    """
+
+    def __init__(self, relative_accuracy=DEFAULT_RELATIVE_ACCURACY, max_buckets=DEFAULT_MAX_BUCKETS):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy deve estar entre 0 e 1")
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.positive = {}
+        self.negative = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _key(self, magnitude):
+        return math.ceil(math.log(magnitude) / self._log_gamma)
+
+    def _value(self, key):
+        # Ponto do balde com o mesmo erro relativo para as duas bordas
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def add(self, value, weight=1):
+        """
+        Adiciona um valor (um `weight` negativo remove uma ocorrência adicionada antes, e o mínimo
+        e o máximo passam a ser limitados pelos baldes restantes, como em `subtract`).
+        """
+        value = float(value)
+        if value > MIN_INDEXABLE_VALUE:
+            store = self.positive
+            key = self._key(value)
+        elif value < -MIN_INDEXABLE_VALUE:
+            store = self.negative
+            key = self._key(-value)
+        else:
+            store = None
+            self.zero_count += weight
+
+        if store is not None:
+            store[key] = store.get(key, 0) + weight
+            if store[key] <= 0:
+                del store[key]
+            self._collapse(store)
+        self._update_stats(weight, value * weight, value, value)
+        if weight < 0:
+            # Como em `subtract`, o valor removido pode ser o mínimo ou o máximo
+            self._tighten_bounds()
+
+    def add_many(self, values):
+        """
+        Adiciona vários valores de uma vez (vetorizado com NumPy).
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+
+        for store, magnitudes in (
+            (self.positive, values[values > MIN_INDEXABLE_VALUE]),
+            (self.negative, -values[values < -MIN_INDEXABLE_VALUE]),
+        ):
+            if len(magnitudes):
+                keys, counts = np.unique(np.ceil(np.log(magnitudes) / self._log_gamma), return_counts=True)
+                for key, count in zip(keys.astype(np.int64).tolist(), counts.tolist()):
+                    store[key] = store.get(key, 0) + count
+                self._collapse(store)
+
+        self.zero_count += int(np.count_nonzero(np.abs(values) <= MIN_INDEXABLE_VALUE))
+        self._update_stats(len(values), float(values.sum()), float(values.min()), float(values.max()))
+
+    def _update_stats(self, count, total, low, high):
+        self.count += count
+        self.sum += total
+        if count > 0:
+            self.min = min(self.min, low)
+            self.max = max(self.max, high)
+
+    def _collapse(self, store):
+        # Une os baldes dos menores módulos (os percentis altos continuam precisos)
+        if len(store) <= self.max_buckets:
+            return
+        keys = sorted(store)
+        excess = keys[:len(keys) - self.max_buckets + 1]
+        target = excess[-1]
+        store[target] = sum(store.pop(key) for key in excess[:-1]) + store[target]
+
+    def _check_compatible(self, other):
+        if not math.isclose(self.relative_accuracy, other.relative_accuracy):
+            raise ValueError("Só é possível combinar histogramas com a mesma precisão")
+
+    def merge(self, other):
+        """
+        Soma as contagens de `other` a este histograma.
+        """
+        self._check_compatible(other)
+        for store, other_store in ((self.positive, other.positive), (self.negative, other.negative)):
+            for key, count in other_store.items():
+                store[key] = store.get(key, 0) + count
+            self._collapse(store)
+        self.zero_count += other.zero_count
+        self._update_stats(other.count, other.sum, other.min, other.max)
+        return self
+
+    def subtract(self, other):
+        """
+        Remove as contagens de `other` (adicionadas antes com `merge`).
+
+        O mínimo e o máximo não podem ser recalculados exatamente: passam a ser as bordas dos baldes
+        restantes (com o mesmo erro relativo dos percentis).
+        """
+        self._check_compatible(other)
+        for store, other_store in ((self.positive, other.positive), (self.negative, other.negative)):
+            for key, count in other_store.items():
+                remaining = store.get(key, 0) - count
+                if remaining > 0:
+                    store[key] = remaining
+                else:
+                    store.pop(key, None)
+        self.zero_count -= other.zero_count
+        self.count -= other.count
+        self.sum -= other.sum
+        self._tighten_bounds()
+        return self
+
+    def _tighten_bounds(self):
+        # Limita o mínimo e o máximo às bordas dos baldes que ainda têm valores
+        if self.count <= 0:
+            self.min, self.max = math.inf, -math.inf
+            return
+        if self.negative:
+            low = -self.gamma ** max(self.negative)
+        elif self.zero_count > 0:
+            low = 0.0
+        else:
+            low = self.gamma ** (min(self.positive) - 1)
+        if self.positive:
+            high = self.gamma ** max(self.positive)
+        elif self.zero_count > 0:
+            high = 0.0
+        else:
+            high = -self.gamma ** (min(self.negative) - 1)
+        self.min = max(self.min, low)
+        self.max = min(self.max, high)
+
+    def quantile(self, q):
+        """
+        Estima o valor do quantil `q` (entre 0 e 1), ou None se o histograma estiver vazio.
+        """
+        if self.count <= 0:
+            return None
+        rank = q * (self.count - 1)
+
+        seen = 0
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                return self._clamp(-self._value(key))
+        seen += self.zero_count
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return self._clamp(self._value(key))
+        return self._clamp(self.max)
+
+    def _clamp(self, value):
+        return min(max(value, self.min), self.max)
+
+    def buckets(self):
+        """
+        Retorna os baldes não vazios em ordem crescente: [(início, fim, contagem), ...].
+        """
+        result = [
+            (-self.gamma ** key, -self.gamma ** (key - 1), count)
+            for key, count in sorted(self.negative.items(), reverse=True)
+        ]
+        if self.zero_count:
+            result.append((0.0, 0.0, self.zero_count))
+        result += [(self.gamma ** (key - 1), self.gamma ** key, count) for key, count in sorted(self.positive.items())]
+        return result
+
+    def summary(self, percentiles=(50, 90, 99)):
+        """
+        Resume a distribuição: contagem, média, mínimo, máximo, percentis e histograma.
+        """
+        if self.count <= 0:
+            return {"count": 0, "mean": None, "min": None, "max": None,
+                    "percentiles": {f"p{p:g}": None for p in percentiles}, "histogram": []}
+        return {
+            "count": self.count,
+            "mean": self.sum / self.count,
+            "min": self.min,
+            "max": self.max,
+            "percentiles": {f"p{p:g}": self.quantile(p / 100) for p in percentiles},
+            "histogram": [
+                {"start": start, "end": end, "count": count} for start, end, count in self.buckets()
+            ],
+        }
+
+    def to_dict(self):
+        """
+        Serializa o histograma em um dicionário compatível com o Firestore (sem listas aninhadas).
+        """
+        return {
+            "accuracy": self.relative_accuracy,
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "zero": self.zero_count,
+            "positive": {"keys": list(self.positive), "counts": list(self.positive.values())},
+            "negative": {"keys": list(self.negative), "counts": list(self.negative.values())},
+        }
+
+    @classmethod
+    def from_dict(cls, data, max_buckets=DEFAULT_MAX_BUCKETS):
+        histogram = cls(data["accuracy"], max_buckets)
+        histogram.count = data["count"]
+        histogram.sum = data["sum"]
+        histogram.zero_count = data["zero"]
+        if data["count"]:
+            histogram.min = data["min"]
+            histogram.max = data["max"]
+        for store, stored in ((histogram.positive, data["positive"]), (histogram.negative, data["negative"])):
+            store.update(zip(stored["keys"], stored["counts"]))
+        histogram._collapse(histogram.positive)
+        histogram._collapse(histogram.negative)
+        return histogram
@@ -0,0 +1,639 @@
+"""
+Snapshot colunar local das coleções, para as leituras analíticas.
+
+As coleções são exportadas periodicamente (comando `export-snapshot`) para um diretório
+local, com um arquivo `.npy` por coluna, aberto com `mmap`:
+
+- number: float64 (NaN quando ausente);
+- bool: int8 (-1 quando ausente);
+- string: códigos int32 (-1 quando ausente) e o dicionário de valores distintos;
+- datetime: microssegundos desde a época em int64 (MISSING_DATE quando ausente);
+- heg (`heg_data`): as amostras de todas as sessões em um único float64 e os deslocamentos
+  (`offsets`) de cada sessão;
+- game (`game_data`): uma coluna por campo da tentativa (gonogo, isCorrect, timeScore,
+  iteration), as sessões inválidas e os deslocamentos de cada sessão, com as regras do motor
+  do Go/NoGo (`gonogo.GameDataPacker`);
+- answers (`form_answer`): as respostas em float64 (NaN nas inválidas) e os deslocamentos.
+
+Campos de outros tipos (mapas, listas e campos com tipos misturados) ficam fora do snapshot.
+
+Cada exportação é gravada em um novo diretório de versão, e o arquivo CURRENT passa a
+apontar para ela de forma atômica. Os workers do gunicorn abrem os mesmos arquivos, então
+as páginas lidas ficam no cache do sistema operacional e são compartilhadas entre eles.
+
+A atualização incremental lê apenas os documentos com data a partir da marca d'água
+(a maior data do snapshot anterior) e substitui as linhas desses documentos. Exclusões não
+são percebidas, então uma exportação completa (`--full`) deve ser feita de tempos em tempos.
+"""
+
+import json
+import logging
+import os
+import shutil
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+
+from aggregation import FormAnswerAccumulator, GoNoGoAccumulator, HegMeanAccumulator
+from gonogo import GameDataPacker, fill_game_totals
+from heg import to_float_array
+from instrumentation import log_event
+
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT_VERSION = 1
+SNAPSHOT_COLLECTIONS = ("sessionQuestionary", "sessionAvatar", "sessionMeditation", "users")
+
+CURRENT_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+
+# Versões antigas mantidas no disco (workers podem estar lendo a anterior)
+KEEP_VERSIONS = 2
+
+MISSING_DATE = np.iinfo(np.int64).min
+
+# Campos de lista com formato conhecido
+LIST_FIELDS = {"heg_data": "heg", "game_data": "game", "form_answer": "answers"}
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def to_microseconds(value):
+    """
+    Converte um datetime para microssegundos desde a época (datas sem fuso são tratadas como UTC).
+    """
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    delta = value - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def from_microseconds(value):
+    return datetime.fromtimestamp(int(value) / 1_000_000, tz=timezone.utc)
+
+
+def _kind_of(value):
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, (int, float)):
+        return "number"
+    if isinstance(value, str):
+        return "string"
+    if isinstance(value, datetime):
+        return "datetime"
+    return None
+
+
+def _answer_number(value):
+    # Como o resumo do form_answer: tudo que `float` aceita (NaN nas respostas inválidas)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+# //////////////////////////////// (construção das colunas)
+
+# Partes das colunas de tamanho variável com um valor por linha (as demais têm um valor por item)
+ROW_PARTS = ("invalid",)
+
+
+class _ScalarColumn:
+    missing = {"number": np.nan, "bool": -1, "datetime": MISSING_DATE}
+    dtypes = {"number": np.float64, "bool": np.int8, "datetime": np.int64}
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.values = []
+
+    def __len__(self):
+        return len(self.values)
+
+    def pad(self, count):
+        self.values.extend([None] * count)
+
+    def append(self, value):
+        self.values.append(value)
+
+    def finish(self):
+        if self.kind == "string":
+            dictionary = sorted({value for value in self.values if value is not None})
+            positions = {value: code for code, value in enumerate(dictionary)}
+            codes = np.array([positions.get(value, -1) for value in self.values], dtype=np.int32)
+            return {"codes": codes, "dict": np.array(dictionary, dtype=str)}
+
+        missing = self.missing[self.kind]
+        if self.kind == "datetime":
+            values = [missing if value is None else to_microseconds(value) for value in self.values]
+        else:
+            values = [missing if value is None else value for value in self.values]
+        return {"values": np.array(values, dtype=self.dtypes[self.kind])}
+
+
+class _RaggedColumn:
+    """
+    Coluna de tamanho variável: os itens de todas as linhas concatenados e os deslocamentos de cada linha.
+    """
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.lengths = []
+        self.parts = {"values": []}
+        # Tentativas do jogo, empacotadas com as regras do motor do Go/NoGo
+        self.game = GameDataPacker() if kind == "game" else None
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def pad(self, count):
+        for _ in range(count):
+            self.append(None)
+
+    def append(self, value):
+        if self.kind == "heg":
+            try:
+                samples = to_float_array(value) if value else np.empty(0)
+            except ValueError:
+                # Como no resumo: um heg_data inválido conta como sessão sem amostras
+                samples = np.empty(0)
+            self.lengths.append(len(samples))
+            self.parts["values"].append(samples)
+            return
+
+        if self.game is not None:
+            self.lengths.append(self.game.append(value))
+            return
+
+        items = value if isinstance(value, list) else []
+        self.lengths.append(len(items))
+        self.parts["values"].append(np.array([_answer_number(answer) for answer in items], dtype=np.float64))
+
+    def finish(self):
+        if self.game is not None:
+            return self.game.finish()
+        arrays = {name: np.concatenate(parts) if parts else np.empty(0) for name, parts in self.parts.items()}
+        arrays["offsets"] = np.concatenate(([0], np.cumsum(self.lengths))).astype(np.int64)
+        return arrays
+
+
+def build_columns(docs, date_field):
+    """
+    Converte os documentos em colunas, em uma única passada.
+
+    Retorna:
+    tuple: (ids, {campo: (tipo, arrays)}, campos ignorados)
+    """
+    ids = []
+    columns = {}
+    skipped = set()
+
+    for row, doc in enumerate(docs):
+        ids.append(doc.id)
+        for field, value in (doc.to_dict() or {}).items():
+            if field in skipped:
+                continue
+            if field == date_field:
+                # Como nos filtros do Firestore, datas gravadas como texto não são datas
+                kind = "datetime"
+                value = value if isinstance(value, datetime) else None
+            elif field in LIST_FIELDS:
+                kind = LIST_FIELDS[field]
+            elif value is None:
+                continue
+            else:
+                kind = _kind_of(value)
+
+            column = columns.get(field)
+            if kind is None or (column is not None and column.kind != kind):
+                skipped.add(field)
+                columns.pop(field, None)
+                continue
+            if column is None:
+                column = _RaggedColumn(kind) if kind in ("heg", "game", "answers") else _ScalarColumn(kind)
+                column.pad(row)
+                columns[field] = column
+            column.append(value)
+
+        # Campos ausentes neste documento
+        for column in columns.values():
+            if len(column) <= row:
+                column.pad(row + 1 - len(column))
+
+    return ids, {field: (column.kind, column.finish()) for field, column in columns.items()}, sorted(skipped)
+
+
+def _missing_column(kind, rows):
+    column = _RaggedColumn(kind) if kind in ("heg", "game", "answers") else _ScalarColumn(kind)
+    column.pad(rows)
+    return column.finish()
+
+
+# //////////////////////////////// (combinação para a atualização incremental)
+
+def _take(kind, arrays, rows):
+    """
+    Seleciona as linhas `rows` (índices) de uma coluna.
+    """
+    if "offsets" not in arrays:
+        if kind == "string":
+            return {"codes": arrays["codes"][rows], "dict": arrays["dict"]}
+        return {"values": arrays["values"][rows]}
+
+    offsets = arrays["offsets"]
+    starts, lengths = offsets[:-1][rows], np.diff(offsets)[rows]
+    new_offsets = np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)
+    items = np.repeat(starts - new_offsets[:-1], lengths) + np.arange(new_offsets[-1])
+    taken = {"offsets": new_offsets}
+    for name, values in arrays.items():
+        if name != "offsets":
+            taken[name] = values[rows] if name in ROW_PARTS else values[items]
+    return taken
+
+
+def _concat(kind, first, second):
+    """
+    Junta as linhas de duas colunas do mesmo tipo.
+    """
+    if kind == "string":
+        dictionary = list(first["dict"]) + sorted(set(second["dict"]) - set(first["dict"]))
+        positions = {value: code for code, value in enumerate(dictionary)}
+        remap = np.array([positions[value] for value in second["dict"]] + [-1], dtype=np.int32)
+        # O código -1 (ausente) aponta para o último item de `remap`, que também é -1
+        return {
+            "codes": np.concatenate((first["codes"], remap[second["codes"]])),
+            "dict": np.array(dictionary, dtype=str),
+        }
+    if "offsets" not in first:
+        return {"values": np.concatenate((first["values"], second["values"]))}
+
+    merged = {"offsets": np.concatenate((first["offsets"], second["offsets"][1:] + first["offsets"][-1]))}
+    for name in first:
+        if name != "offsets":
+            merged[name] = np.concatenate((first[name], second[name]))
+    return merged
+
+
+def merge_columns(previous, previous_ids, update, update_ids):
+    """
+    Substitui as linhas dos documentos atualizados e acrescenta os novos.
+
+    Parâmetros:
+    previous (dict): Colunas do snapshot anterior ({campo: (tipo, arrays)}).
+    previous_ids (list): Ids das linhas anteriores.
+    update (dict): Colunas dos documentos lidos na atualização.
+    update_ids (list): Ids desses documentos.
+
+    Retorna:
+    tuple: (ids, colunas), ou None se algum campo mudou de tipo (é preciso exportar tudo).
+    """
+    updated = set(update_ids)
+    kept = np.array([index for index, doc_id in enumerate(previous_ids) if doc_id not in updated], dtype=np.int64)
+
+    merged = {}
+    for field in set(previous) | set(update):
+        kind = (previous.get(field) or update.get(field))[0]
+        if field in previous and field in update and previous[field][0] != update[field][0]:
+            return None
+        old = previous[field][1] if field in previous else _missing_column(kind, len(previous_ids))
+        new = update[field][1] if field in update else _missing_column(kind, len(update_ids))
+        merged[field] = (kind, _concat(kind, _take(kind, old, kept), new))
+
+    return [previous_ids[index] for index in kept] + list(update_ids), merged
+
+
+# //////////////////////////////// (gravação)
+
+def _column_summary(ids, columns, date_field):
+    kind, arrays = columns.get(date_field, (None, None))
+    dates = arrays["values"] if kind == "datetime" else np.full(len(ids), MISSING_DATE, dtype=np.int64)
+    present = dates != MISSING_DATE
+    watermark = from_microseconds(dates[present].max()).isoformat() if present.any() else None
+    # Só é possível atualizar de forma incremental se toda linha tiver data (as demais nunca seriam relidas)
+    return watermark, bool(present.all()) and watermark is not None
+
+
+def write_snapshot(root, collections, date_field):
+    """
+    Grava uma nova versão do snapshot e passa o CURRENT para ela.
+
+    Parâmetros:
+    root (str): Diretório do snapshot.
+    collections (dict): {coleção: (ids, colunas, campos ignorados)}, como retornado por `build_columns`.
+    date_field (str): Campo de data usado na marca d'água.
+
+    Retorna:
+    str: Nome da versão gravada.
+    """
+    exported_at = datetime.now(timezone.utc)
+    version = exported_at.strftime("%Y%m%dT%H%M%S%fZ")
+    path = os.path.join(root, version)
+    os.makedirs(path)
+
+    manifest = {
+        "format": SNAPSHOT_FORMAT_VERSION,
+        "exported_at": exported_at.isoformat(),
+        "date_field": date_field,
+        "collections": {},
+    }
+    for name, (ids, columns, skipped) in collections.items():
+        directory = os.path.join(path, name)
+        os.makedirs(directory)
+        np.save(os.path.join(directory, "id.npy"), np.array(ids, dtype=str))
+
+        # Os arquivos usam a posição do campo (nomes de campos podem ter caracteres inválidos em arquivos)
+        fields = {}
+        for position, (field, (kind, arrays)) in enumerate(sorted(columns.items())):
+            fields[field] = {"kind": kind, "file": f"c{position}", "parts": sorted(arrays)}
+            for part, array in arrays.items():
+                np.save(os.path.join(directory, f"c{position}.{part}.npy"), array)
+
+        watermark, incremental = _column_summary(ids, columns, date_field)
+        manifest["collections"][name] = {
+            "rows": len(ids), "fields": fields, "skipped": skipped,
+            "watermark": watermark, "incremental": incremental,
+        }
+
+    with open(os.path.join(path, MANIFEST_FILE), "w") as file:
+        json.dump(manifest, file, indent=1)
+
+    current = os.path.join(root, CURRENT_FILE)
+    with open(current + ".tmp", "w") as file:
+        file.write(version)
+    os.replace(current + ".tmp", current)
+
+    versions = sorted(entry for entry in os.listdir(root) if os.path.isdir(os.path.join(root, entry)))
+    for old in versions[:-KEEP_VERSIONS]:
+        shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+    return version
+
+
+# //////////////////////////////// (leitura)
+
+class CollectionSnapshot:
+    """
+    Colunas de uma coleção no snapshot, abertas com `mmap` na primeira vez que são usadas.
+    """
+
+    def __init__(self, directory, meta):
+        self.directory = directory
+        self.meta = meta
+        self.rows = meta["rows"]
+        self._arrays = {}
+
+    @property
+    def fields(self):
+        return {field: info["kind"] for field, info in self.meta["fields"].items()}
+
+    def _load(self, name):
+        array = self._arrays.get(name)
+        if array is None:
+            path = os.path.join(self.directory, f"{name}.npy")
+            try:
+                array = np.load(path, mmap_mode="r")
+            except ValueError:
+                # Arquivos vazios não podem ser mapeados
+                array = np.load(path)
+            self._arrays[name] = array
+        return array
+
+    def ids(self):
+        return self._load("id")
+
+    def column(self, field):
+        """
+        Retorna o tipo e as partes da coluna, ou (None, None) se o campo não estiver no snapshot.
+        """
+        info = self.meta["fields"].get(field)
+        if info is None:
+            return None, None
+        return info["kind"], {part: self._load(f"{info['file']}.{part}") for part in info["parts"]}
+
+    def columns(self):
+        return {field: self.column(field) for field in self.meta["fields"]}
+
+    def mask(self, filters, date_field):
+        """
+        Seleciona as linhas que atendem aos filtros `user_id`, `from` e `to` (como na consulta ao Firestore).
+        """
+        mask = np.ones(self.rows, dtype=bool)
+        if not filters:
+            return mask
+
+        if "user_id" in filters:
+            kind, arrays = self.column("user_id")
+            if kind != "string":
+                return np.zeros(self.rows, dtype=bool)
+            codes = np.flatnonzero(arrays["dict"] == filters["user_id"])
+            mask &= arrays["codes"] == (codes[0] if len(codes) else -2)
+
+        if "from" in filters or "to" in filters:
+            kind, arrays = self.column(date_field)
+            if kind != "datetime":
+                return np.zeros(self.rows, dtype=bool)
+            dates = arrays["values"]
+            mask &= dates != MISSING_DATE
+            if "from" in filters:
+                mask &= dates >= to_microseconds(filters["from"])
+            if "to" in filters:
+                mask &= dates < to_microseconds(filters["to"])
+        return mask
+
+
+class Snapshot:
+    """
+    Uma versão do snapshot (manifesto e coleções).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, MANIFEST_FILE)) as file:
+            self.manifest = json.load(file)
+        self.exported_at = datetime.fromisoformat(self.manifest["exported_at"])
+        self.date_field = self.manifest["date_field"]
+        self._collections = {}
+
+    def age(self):
+        """
+        Retorna há quantos segundos o snapshot foi exportado.
+        """
+        return (datetime.now(timezone.utc) - self.exported_at).total_seconds()
+
+    def collection(self, name):
+        meta = self.manifest["collections"].get(name)
+        if meta is None:
+            return None
+        if name not in self._collections:
+            self._collections[name] = CollectionSnapshot(os.path.join(self.path, name), meta)
+        return self._collections[name]
+
+
+def open_snapshot(root):
+    """
+    Abre a versão apontada pelo CURRENT, ou retorna None se ainda não houver snapshot.
+    """
+    try:
+        with open(os.path.join(root, CURRENT_FILE)) as file:
+            version = file.read().strip()
+        snapshot = Snapshot(os.path.join(root, version))
+    except FileNotFoundError:
+        return None
+    if snapshot.manifest.get("format") != SNAPSHOT_FORMAT_VERSION:
+        return None
+    return snapshot
+
+
+class SnapshotReader:
+    """
+    Mantém aberta a versão atual do snapshot, reabrindo-a quando o CURRENT muda.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._snapshot = None
+        self._stamp = None
+        self._lock = threading.Lock()
+
+    def current(self):
+        try:
+            stat = os.stat(os.path.join(self.root, CURRENT_FILE))
+        except FileNotFoundError:
+            return None
+        stamp = (stat.st_mtime_ns, stat.st_ino)
+        with self._lock:
+            if stamp != self._stamp:
+                self._snapshot = open_snapshot(self.root)
+                self._stamp = stamp
+            return self._snapshot
+
+
+# //////////////////////////////// (exportação)
+
+def export_snapshot(root, read, date_field, collections=SNAPSHOT_COLLECTIONS, full=False):
+    """
+    Exporta as coleções para uma nova versão do snapshot.
+
+    Sem `full`, cada coleção que já está no snapshot é atualizada de forma incremental: são lidos
+    apenas os documentos com data a partir da marca d'água, que substituem as suas linhas antigas.
+
+    Parâmetros:
+    root (str): Diretório do snapshot.
+    read: Função que recebe o nome da coleção e a data inicial (ou None para ler tudo) e retorna os documentos.
+    date_field (str): Campo de data usado na marca d'água.
+    collections (tuple): Coleções exportadas.
+    full (bool): Relê todas as coleções.
+
+    Retorna:
+    dict: Por coleção, o modo (`full` ou `incremental`), os documentos lidos e as linhas do snapshot.
+    """
+    os.makedirs(root, exist_ok=True)
+    previous = None if full else open_snapshot(root)
+    if previous is not None and previous.date_field != date_field:
+        previous = None
+
+    exported, stats = {}, {}
+    for name in collections:
+        merged = None
+        old = previous.collection(name) if previous is not None else None
+        if old is not None and old.meta["incremental"]:
+            since = datetime.fromisoformat(old.meta["watermark"])
+            ids, columns, skipped = build_columns(read(name, since), date_field)
+            old_skipped = set(old.meta["skipped"])
+            # Um campo que passou a ter tipos misturados exige a exportação completa
+            if not set(skipped) & set(old.meta["fields"]):
+                columns = {field: column for field, column in columns.items() if field not in old_skipped}
+                merged = merge_columns(old.columns(), old.ids().tolist(), columns, ids)
+            if merged is not None:
+                exported[name] = (merged[0], merged[1], sorted(old_skipped | set(skipped)))
+                stats[name] = {"mode": "incremental", "read": len(ids), "rows": len(merged[0])}
+
+        if merged is None:
+            ids, columns, skipped = build_columns(read(name, None), date_field)
+            exported[name] = (ids, columns, skipped)
+            stats[name] = {"mode": "full", "read": len(ids), "rows": len(ids)}
+
+        log_event(logger, logging.INFO, "snapshot_collection_exported", collection=name, **stats[name])
+
+    write_snapshot(root, exported, date_field)
+    return stats
+
+
+# //////////////////////////////// (métricas vetorizadas)
+
+def _fill_heg_mean(accumulator, collection, mask, ids):
+    kind, arrays = collection.column("heg_data")
+    if kind != "heg":
+        return
+    offsets, values = arrays["offsets"], arrays["values"]
+    lengths = np.diff(offsets)
+    present = lengths > 0
+
+    sums = np.zeros(collection.rows)
+    if present.any():
+        sums[present] = np.add.reduceat(values, offsets[:-1][present])
+    selected = mask & present
+    means = sums[selected] / lengths[selected]
+    accumulator.session_means = dict(zip(ids[selected].tolist(), means.tolist()))
+
+
+def _fill_game(accumulator, collection, mask, ids):
+    kind, arrays = collection.column("game_data")
+    if kind != "game":
+        return
+    if (arrays["invalid"] & mask).any():
+        raise TypeError("game_data com tentativas que não são objetos")
+
+    trials = np.repeat(mask, np.diff(arrays["offsets"]))
+    fill_game_totals(
+        accumulator, arrays["gonogo"][trials], arrays["correct"][trials],
+        arrays["time_score"][trials], arrays["iteration"][trials],
+    )
+
+
+def _fill_form_answer(accumulator, collection, mask, ids):
+    kind, arrays = collection.column("form_answer")
+    if kind != "answers":
+        return
+    offsets, answers = arrays["offsets"], arrays["values"]
+    selected = mask & (np.diff(offsets) > accumulator.index)
+    values = answers[offsets[:-1][selected] + accumulator.index]
+    valid = ~np.isnan(values)
+
+    scores = (accumulator.max_score - values[valid]) / accumulator.max_score
+    accumulator.values = dict(zip(ids[selected][valid].tolist(), np.trunc(scores * 100).astype(np.int64).tolist()))
+
+
+# Acumuladores de `aggregation.py` que podem ser calculados a partir do snapshot
+_FILLERS = {
+    HegMeanAccumulator: _fill_heg_mean,
+    GoNoGoAccumulator: _fill_game,
+    FormAnswerAccumulator: _fill_form_answer,
+}
+
+
+def snapshot_aggregates(collection, accumulators, filters=None, date_field="updated_at"):
+    """
+    Calcula os acumuladores sobre as linhas do snapshot com operações vetorizadas.
+
+    O estado de cada acumulador é preenchido a partir das colunas, e o resultado vem do seu
+    próprio `result()`, então as fórmulas são as mesmas da varredura do Firestore.
+
+    Retorna:
+    dict: Resultado de cada acumulador indexado pelo seu nome (None em caso de erro), ou None se
+        algum acumulador não puder ser calculado a partir do snapshot.
+    """
+    if any(type(accumulator) not in _FILLERS for accumulator in accumulators):
+        return None
+
+    mask = collection.mask(filters, date_field)
+    ids = collection.ids()
+    results = {}
+    for accumulator in accumulators:
+        try:
+            _FILLERS[type(accumulator)](accumulator, collection, mask, ids)
+            results[accumulator.name] = accumulator.result()
+        except Exception as e:
+            logger.error("%s: %s", accumulator.error_message, e)
+            results[accumulator.name] = None
+    return results
@@ -0,0 +1,251 @@
+"""
+Resumo compacto de cada sessão da coleção 'sessionQuestionary'.
+
+O resumo é calculado quando a sessão é gravada (ou pelo backfill) e guardado no campo
+`summary` do próprio documento. Ele contém apenas o que as métricas precisam:
+
+- heg: média e quantidade de amostras do 'heg_data';
+- game: contadores Go/NoGo, erros e somas de timeScore e iteration do 'game_data';
+- form_answer: respostas do 'form_answer' convertidas para número;
+- sketches: histogramas (`sketches.py`) das amostras do HEG e dos tempos de reação, e a
+  taxa de erro da sessão.
+
+Assim as leituras das métricas trazem algumas centenas de bytes por sessão em vez dos
+arrays brutos. Cada parte é calculada separadamente: se uma delas não puder ser
+calculada (dados inválidos), ela fica fora do resumo e as métricas que dependem dela
+voltam a ler o campo bruto.
+
+O resumo guarda em `source` uma impressão digital (hash do conteúdo) de cada campo bruto de
+onde foi calculado. Quando a sessão é lida com os campos brutos, a parte só é usada se a
+impressão digital ainda corresponder; senão, é recalculada. Em leituras só do resumo os
+campos brutos não estão disponíveis e o resumo é usado como está: um campo bruto alterado
+sem passar pela API só é percebido no próximo `backfill-summaries`.
+"""
+
+import hashlib
+import json
+import logging
+from itertools import repeat
+
+import numpy as np
+
+from heg import HEG_PACKED_DTYPE, to_float_array
+from instrumentation import log_event
+from sketches import LogHistogram
+
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_FIELD = "summary"
+
+# Incrementar quando o formato do resumo mudar (resumos antigos passam a ser recalculados)
+SUMMARY_VERSION = 2
+
+SOURCE_FIELD = "source"
+
+
+def fingerprint(field, value):
+    """
+    Calcula a impressão digital do conteúdo de um campo bruto.
+
+    O 'heg_data' é comparado pelas amostras em float32, então a lista e o formato compacto das
+    mesmas amostras têm a mesma impressão digital.
+    """
+    if field == "heg_data":
+        try:
+            with np.errstate(over="ignore"):
+                content = to_float_array(value).astype(HEG_PACKED_DTYPE).tobytes()
+        except ValueError:
+            content = json.dumps(value, sort_keys=True, default=str).encode()
+    else:
+        content = json.dumps(value, sort_keys=True, default=str).encode()
+    return hashlib.blake2b(content, digest_size=8).hexdigest()
+
+
+def source_fields():
+    """
+    Retorna os campos brutos de onde as partes do resumo são calculadas.
+    """
+    return sorted({field for fields, _ in SUMMARY_PARTS.values() for field in fields})
+
+
+def summarize_heg(session_data):
+    """
+    Retorna a média e a quantidade de amostras do 'heg_data', ou None se não houver amostras válidas.
+    """
+    heg_data = session_data.get("heg_data", [])
+    if not heg_data:
+        return None
+    try:
+        samples = to_float_array(heg_data)
+    except ValueError as e:
+        log_event(logger, logging.WARNING, "heg_data_invalid", error=e)
+        return None
+    if not len(samples):
+        return None
+    return {"mean": float(samples.mean()), "count": int(len(samples))}
+
+
+def game_entries(game_data):
+    """
+    Retorna as tentativas de um 'game_data'. Um 'game_data' ausente ou nulo não tem tentativas.
+
+    Lança:
+    TypeError: Se o 'game_data' não for uma lista ou tiver tentativas que não são objetos.
+    """
+    if game_data is None:
+        return []
+    if not isinstance(game_data, list) or not all(map(isinstance, game_data, repeat(dict))):
+        raise TypeError("game_data com tentativas que não são objetos")
+    return game_data
+
+
+def summarize_game(session_data):
+    """
+    Retorna os contadores Go/NoGo do 'game_data'.
+
+    Lança:
+    TypeError: Se o 'game_data' for inválido (ver `game_entries`) ou alguma tentativa tiver valores não numéricos.
+    """
+    summary = {"go_errors": 0, "nogo_errors": 0, "go_count": 0, "nogo_count": 0, "time_score": 0, "iterations": 0}
+
+    for entry in game_entries(session_data.get("game_data")):
+        gonogo = entry.get("gonogo", "")
+        is_correct = entry.get("isCorrect", True)
+
+        if gonogo == "go":
+            summary["go_count"] += 1
+            if not is_correct:
+                summary["go_errors"] += 1
+        elif gonogo == "nogo":
+            summary["nogo_count"] += 1
+            if not is_correct:
+                summary["nogo_errors"] += 1
+
+        summary["time_score"] += entry.get("timeScore", 0)
+        summary["iterations"] += entry.get("iteration", 0)
+
+    return summary
+
+
+def summarize_form_answer(session_data):
+    """
+    Retorna as respostas do 'form_answer' como números (None nas respostas inválidas).
+    """
+    scores = []
+    for index, answer in enumerate(session_data.get("form_answer", [])):
+        try:
+            scores.append(float(answer))
+        except (TypeError, ValueError) as e:
+            log_event(logger, logging.WARNING, "form_answer_invalid", index=index, error=e)
+            scores.append(None)
+    return scores
+
+
+def summarize_sketches(session_data):
+    """
+    Retorna os histogramas das amostras do HEG e do tempo de reação de cada tentativa (em ms),
+    e a taxa de erro da sessão (None se não houver tentativas Go/NoGo).
+    """
+    heg = None
+    heg_data = session_data.get("heg_data", [])
+    if heg_data:
+        try:
+            samples = to_float_array(heg_data)
+        except ValueError as e:
+            log_event(logger, logging.WARNING, "heg_data_invalid", error=e)
+        else:
+            heg = LogHistogram()
+            heg.add_many(samples)
+
+    reaction_time = LogHistogram()
+    trials = errors = 0
+    for entry in game_entries(session_data.get("game_data")):
+        time_score = entry.get("timeScore")
+        if isinstance(time_score, (int, float)) and not isinstance(time_score, bool):
+            reaction_time.add(time_score * 1000)
+        if entry.get("gonogo", "") in ("go", "nogo"):
+            trials += 1
+            if not entry.get("isCorrect", True):
+                errors += 1
+
+    return {
+        "heg": heg.to_dict() if heg is not None and heg.count else None,
+        "reaction_time_ms": reaction_time.to_dict() if reaction_time.count else None,
+        "error_rate": errors / trials if trials else None,
+    }
+
+
+SUMMARY_PARTS = {
+    "heg": (["heg_data"], summarize_heg),
+    "game": (["game_data"], summarize_game),
+    "form_answer": (["form_answer"], summarize_form_answer),
+    "sketches": (["heg_data", "game_data"], summarize_sketches),
+}
+
+
+def summarize_session(session_data):
+    """
+    Calcula o resumo de uma sessão. Partes que não puderem ser calculadas ficam de fora.
+
+    Retorna:
+    dict: O resumo, com `version`, as impressões digitais dos campos brutos em `source` e as
+    partes de `SUMMARY_PARTS`.
+    """
+    summary = {
+        "version": SUMMARY_VERSION,
+        SOURCE_FIELD: {
+            field: fingerprint(field, session_data[field]) for field in source_fields() if field in session_data
+        },
+    }
+    for key, (_, summarize) in SUMMARY_PARTS.items():
+        try:
+            summary[key] = summarize(session_data)
+        except Exception as e:
+            log_event(logger, logging.WARNING, "summary_part_failed", part=key, error=e)
+    return summary
+
+
+def _source_matches(session_data, summary, fields):
+    # Só os campos brutos presentes nos dados podem ser conferidos (leituras do resumo não os trazem)
+    source = summary.get(SOURCE_FIELD) or {}
+    return all(
+        source.get(field) == fingerprint(field, session_data[field]) for field in fields if field in session_data
+    )
+
+
+def summary_part(session_data, key):
+    """
+    Retorna a parte `key` do resumo gravado na sessão ou, se não houver resumo atualizado
+    com essa parte (ou se os campos brutos lidos junto não forem os do resumo), calcula-a
+    a partir dos campos brutos.
+    """
+    summary = session_data.get(SUMMARY_FIELD)
+    fields, summarize = SUMMARY_PARTS[key]
+    if summary and summary.get("version") == SUMMARY_VERSION and key in summary \
+            and _source_matches(session_data, summary, fields):
+        return summary[key]
+    return summarize(session_data)
+
+
+def is_summary_current(session_data):
+    """
+    Verifica se o resumo gravado é da versão atual e foi calculado a partir dos campos brutos de
+    `session_data` (que deve trazer todos os campos de `source_fields()`, como no backfill).
+    """
+    summary = session_data.get(SUMMARY_FIELD)
+    if not summary or summary.get("version") != SUMMARY_VERSION:
+        return False
+    # Um campo bruto removido depois do resumo também o desatualiza
+    removed = any(field not in session_data for field in summary.get(SOURCE_FIELD) or {})
+    return not removed and _source_matches(session_data, summary, source_fields())
+
+
+def needs_raw_fields(session_data, keys):
+    """
+    Verifica se alguma das partes `keys` não está no resumo gravado (e precisa dos campos brutos).
+    """
+    summary = session_data.get(SUMMARY_FIELD)
+    if not summary or summary.get("version") != SUMMARY_VERSION:
+        return True
+    return any(key not in summary for key in keys)
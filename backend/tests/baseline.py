@@ -0,0 +1,149 @@
+"""
+Cálculos originais das métricas, como eram feitos antes das otimizações: uma varredura de
+todos os documentos por métrica, em Python puro, sem resumos, agregados ou snapshot.
+
+Servem de referência para os testes das rotas. Cada função recebe os documentos da coleção
+'sessionQuestionary' ({id: documento}) e os percorre em ordem de id, como o Firestore.
+"""
+
+
+def _sessions(documents):
+    return [documents[doc_id] for doc_id in sorted(documents)]
+
+
+def brain_activity(documents):
+    session_means = []
+    for session_data in _sessions(documents):
+        heg_data = session_data.get("heg_data", [])
+        if heg_data:
+            try:
+                float_values = [float(value) for value in heg_data]
+                session_means.append(sum(float_values) / len(float_values))
+            except ValueError:
+                pass
+
+    final_mean = sum(session_means) / len(session_means) if session_means else 0
+    return {"mean_per_session": session_means, "final_mean": final_mean}
+
+
+def game_metrics(documents):
+    total_go_errors = total_nogo_errors = total_go_count = total_nogo_count = 0
+    total_time_score = total_iterations = 0
+
+    for session_data in _sessions(documents):
+        for entry in session_data.get("game_data", []):
+            gonogo = entry.get("gonogo", "")
+            is_correct = entry.get("isCorrect", True)
+            if gonogo == "go":
+                total_go_count += 1
+                if not is_correct:
+                    total_go_errors += 1
+            elif gonogo == "nogo":
+                total_nogo_count += 1
+                if not is_correct:
+                    total_nogo_errors += 1
+            total_time_score += entry.get("timeScore", 0)
+            total_iterations += entry.get("iteration", 0)
+
+    go_error_percentage = (total_go_errors / total_go_count * 100) if total_go_count > 0 else 0
+    nogo_error_percentage = (total_nogo_errors / total_nogo_count * 100) if total_nogo_count > 0 else 0
+    total_time = total_iterations * 2
+    reaction_time_average = (total_time_score / total_time * 1000) if total_time > 0 else 0
+    return {
+        "go_error_percentage": round(go_error_percentage, 2),
+        "nogo_error_percentage": round(nogo_error_percentage, 2),
+        "reaction_time_average_ms": round(reaction_time_average, 2),
+    }
+
+
+def game_zscores(documents):
+    metrics = game_metrics(documents)
+    return {
+        "go_zscore": (metrics["go_error_percentage"] - 2.3) / 2.83,
+        "nogo_zscore": (metrics["nogo_error_percentage"] - 6.9) / 7.46,
+        "reaction_time_zscore": (metrics["reaction_time_average_ms"] - 906.1) / 115.58,
+    }
+
+
+def corrected_percentages(documents):
+    zscores = game_zscores(documents)
+
+    def corrected_percentage(zscore):
+        return (100 - ((zscore * 25) + 50)) / 100
+
+    return {
+        "inattention_final_percentage": corrected_percentage(zscores["go_zscore"]),
+        "hyperactive_final_percentage": corrected_percentage(zscores["nogo_zscore"]),
+        "reactiontime_final_percentage": corrected_percentage(zscores["reaction_time_zscore"]),
+    }
+
+
+def gonogo_final_mean(documents):
+    corrected = corrected_percentages(documents)
+    return {"gonogo_game_final_mean": sum(corrected.values()) / 3 * 100}
+
+
+def _form_values(documents, index, maximum):
+    values = []
+    for session_data in _sessions(documents):
+        form_answers = session_data.get("form_answer", [])
+        if len(form_answers) > index:
+            try:
+                values.append(int((maximum - float(form_answers[index])) / maximum * 100))
+            except ValueError:
+                pass
+    return values
+
+
+def stress_value(documents):
+    return {"stress_values": _form_values(documents, 0, 21)}
+
+
+def focus_value(documents):
+    return {"focus_values": _form_values(documents, 1, 36)}
+
+
+def control_value(documents):
+    return {"control_values": _form_values(documents, 2, 36)}
+
+
+def performance_global(documents):
+    # As chaves lidas aqui não existem nos componentes (comportamento original mantido pela rota)
+    brain_activity_mean = brain_activity(documents).get("final_mean", 0)
+    return {
+        "brain_activity": brain_activity_mean,
+        "gonogo_game_final_mean": 0,
+        "stress_value": 0,
+        "focus_value": 0,
+        "control_value": 0,
+        "performance_global": brain_activity_mean / 5,
+    }
+
+
+def global_performance(documents):
+    def mean(values):
+        return sum(values) / len(values)
+
+    performance = (
+        brain_activity(documents)["final_mean"]
+        + gonogo_final_mean(documents)["gonogo_game_final_mean"]
+        + mean(stress_value(documents)["stress_values"])
+        + mean(focus_value(documents)["focus_values"])
+        + mean(control_value(documents)["control_values"])
+    ) / 5
+    return {"PerformanceGlobal": round(performance, 2)}
+
+
+# Rota da API: cálculo original correspondente
+ROUTES = {
+    "/api/brain-activity": brain_activity,
+    "/api/game-metrics": game_metrics,
+    "/api/game-zscores": game_zscores,
+    "/api/corrected-percentages": corrected_percentages,
+    "/api/gonogo-final-mean": gonogo_final_mean,
+    "/api/stress-value": stress_value,
+    "/api/focus-value": focus_value,
+    "/api/control-value": control_value,
+    "/api/performance-global": performance_global,
+    "/api/global-performance": global_performance,
+}
@@ -0,0 +1,34 @@
+"""
+Configuração dos testes do backend.
+
+Os módulos do backend são importados pelo nome (como quando o app roda a partir de
+`backend/`), então o diretório é adicionado ao caminho de importação. O app usa o Firestore
+em memória (`DATA_BACKEND=memory`), sem credenciais.
+"""
+
+import os
+import sys
+
+import pytest
+
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+os.environ.setdefault("DATA_BACKEND", "memory")
+
+
+@pytest.fixture
+def db():
+    """
+    Firestore em memória vazio usado pelo app durante o teste.
+    """
+    import data_backend
+    from memory_firestore import MemoryFirestore
+
+    previous = data_backend.get_db()
+    client = MemoryFirestore()
+    data_backend.set_db(client)
+    yield client
+    data_backend.set_db(previous)
@@ -0,0 +1,76 @@
+"""
+Funções auxiliares dos testes: documentos sintéticos e a varredura completa de referência.
+"""
+
+import random
+
+import pytest
+
+from aggregation import scan_documents
+from benchmarks.synthetic import questionary_session
+
+
+class Snapshot:
+    """
+    Documento lido, na interface do snapshot do Firestore (`id` e `to_dict`).
+    """
+
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+def make_sessions(count, seed=0, users=5):
+    """
+    Cria `count` sessões de questionário sintéticas ({id: documento}).
+    """
+    rng = random.Random(seed)
+    return {
+        f"questionary{index:05d}": questionary_session(rng, f"user{rng.randrange(users)}")
+        for index in range(count)
+    }
+
+
+def scan(accumulator_factories, documents):
+    """
+    Calcula os acumuladores com uma varredura completa dos documentos, em ordem de id (como o Firestore).
+    """
+    docs = [Snapshot(doc_id, documents[doc_id]) for doc_id in sorted(documents)]
+    return scan_documents(docs, [factory() for factory in accumulator_factories.values()])
+
+
+def assert_close(actual, expected, rel=1e-9, path="resultado"):
+    """
+    Compara resultados aninhados: números com tolerância relativa `rel` e o restante exatamente.
+    """
+    if isinstance(expected, dict):
+        assert isinstance(actual, dict) and actual.keys() == expected.keys(), path
+        for key in expected:
+            assert_close(actual[key], expected[key], rel, f"{path}.{key}")
+    elif isinstance(expected, (list, tuple)):
+        assert isinstance(actual, (list, tuple)) and len(actual) == len(expected), path
+        for index, (item, expected_item) in enumerate(zip(actual, expected)):
+            assert_close(item, expected_item, rel, f"{path}[{index}]")
+    elif isinstance(expected, float) and not isinstance(expected, bool):
+        assert actual == pytest.approx(expected, rel=rel, abs=1e-12), path
+    else:
+        assert actual == expected, path
+
+
+def assert_matches_scan(actual, expected):
+    """
+    Compara com a varredura completa. As distribuições (histogramas) são comparadas com a
+    precisão do histograma: após remoções, mínimo e máximo são apenas limites (`LogHistogram.subtract`).
+    """
+    actual, expected = dict(actual), dict(expected)
+    if "distributions" in expected and expected["distributions"] is not None:
+        distributions = actual.pop("distributions")
+        for metric, summary in expected.pop("distributions").items():
+            assert distributions[metric]["count"] == summary["count"], metric
+            assert [bucket["count"] for bucket in distributions[metric]["histogram"]] == \
+                [bucket["count"] for bucket in summary["histogram"]], metric
+            assert_close(distributions[metric], summary, rel=0.03, path=f"distributions.{metric}")
+    assert_close(actual, expected)
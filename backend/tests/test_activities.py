@@ -0,0 +1,49 @@
+"""
+Junção das atividades às suas subcoleções em `/activities` (merge-join por collection group).
+"""
+
+import json
+
+import pytest
+
+import app
+from benchmarks.synthetic import populate
+
+
+@pytest.fixture
+def client(db):
+    populate(db, 60, seed=41)
+    return app.app.test_client()
+
+
+def one_query_per_activity(db, subcols):
+    # Resposta original: uma consulta por subcoleção de cada atividade
+    activities_ref = db.collection("activities")
+    result = []
+    for activity in activities_ref.stream():
+        data = activity.to_dict()
+        data["id"] = activity.id
+        data["subcollections"] = {
+            subcol: [doc.to_dict() for doc in activities_ref.document(activity.id).collection(subcol).stream()]
+            for subcol in subcols
+        }
+        result.append(data)
+    # Mesma serialização das respostas (datas em texto)
+    return json.loads(app.app.json.dumps(result))
+
+
+@pytest.mark.parametrize("include", [None, "avatar", "questionary,meditation"])
+def test_activities_match_one_query_per_activity(db, client, include):
+    # Documentos de outra coleção com subcoleção de mesmo nome ficam de fora
+    db.collections["other/x/avatar"] = {"avatar0": {"score": 1}}
+    # Subcoleção de uma atividade que não existe mais
+    db.collections["activities/activity000000a/avatar"] = {"avatar0": {"score": 2}}
+
+    subcols = app.ACTIVITY_SUBCOLLECTIONS if include is None else include.split(",")
+    response = client.get("/activities" + (f"?include={include}" if include is not None else ""))
+    assert response.status_code == 200
+    assert response.get_json() == one_query_per_activity(db, subcols)
+
+
+def test_activities_reject_unknown_subcollection(client):
+    assert client.get("/activities?include=avatar,foo").status_code == 400
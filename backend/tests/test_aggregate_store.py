@@ -0,0 +1,103 @@
+"""
+O agregado incremental deve ser igual a uma varredura completa depois de cada alteração.
+"""
+
+import copy
+import random
+
+import pytest
+
+from aggregate_store import AggregateStore, InMemoryChangeFeed
+from app import SESSION_ACCUMULATORS
+from helpers import assert_matches_scan as assert_same_results, make_sessions, scan
+from summaries import SUMMARY_FIELD, summarize_session
+
+
+def start_store(documents):
+    feed = InMemoryChangeFeed(copy.deepcopy(documents))
+    store = AggregateStore(SESSION_ACCUMULATORS)
+    assert store.start(feed, timeout=1)
+    return store, feed
+
+
+def assert_matches_scan(store, feed):
+    assert_same_results(store.results(), scan(SESSION_ACCUMULATORS, feed.documents))
+
+
+def test_seed_matches_scan():
+    store, feed = start_store(make_sessions(40))
+    assert_matches_scan(store, feed)
+
+
+def test_add_modify_remove_match_scan():
+    sessions = make_sessions(60, seed=1)
+    store, feed = start_store(dict(list(sessions.items())[:30]))
+    rng = random.Random(2)
+
+    for doc_id, data in list(sessions.items())[30:]:
+        feed.set(doc_id, data)
+    assert_matches_scan(store, feed)
+
+    for doc_id in rng.sample(sorted(feed.documents), 15):
+        modified = copy.deepcopy(feed.documents[doc_id])
+        modified["heg_data"] = [value + 10 for value in modified["heg_data"]]
+        modified["form_answer"] = [rng.randint(0, 21), rng.randint(0, 36), rng.randint(0, 36)]
+        modified["game_data"][0]["isCorrect"] = not modified["game_data"][0]["isCorrect"]
+        feed.set(doc_id, modified)
+    assert_matches_scan(store, feed)
+
+    for doc_id in rng.sample(sorted(feed.documents), 20):
+        feed.delete(doc_id)
+    assert_matches_scan(store, feed)
+
+
+def test_invalid_document_is_isolated_and_recovers():
+    store, feed = start_store(make_sessions(10, seed=3))
+
+    broken = copy.deepcopy(feed.documents["questionary00002"])
+    broken["game_data"][0]["timeScore"] = "rápido"
+    feed.set("questionary00002", broken)
+    results = store.results()
+    assert results["game_metrics"] is None
+    assert results["brain_activity"] == scan(SESSION_ACCUMULATORS, feed.documents)["brain_activity"]
+
+    fixed = copy.deepcopy(broken)
+    fixed["game_data"][0]["timeScore"] = 0.5
+    feed.set("questionary00002", fixed)
+    assert_matches_scan(store, feed)
+
+
+def test_stored_summary_is_used_and_raw_arrays_are_not_kept():
+    sessions = make_sessions(5, seed=4)
+    for data in sessions.values():
+        data[SUMMARY_FIELD] = summarize_session(data)
+    store, feed = start_store(sessions)
+    assert_matches_scan(store, feed)
+
+    for compact in store._documents.values():
+        assert "heg_data" not in compact and "game_data" not in compact
+
+
+@pytest.mark.parametrize("kind", ["modify", "remove"])
+def test_results_keep_scan_order(kind):
+    store, feed = start_store(make_sessions(20, seed=5))
+    doc_id = "questionary00003"
+    if kind == "modify":
+        modified = copy.deepcopy(feed.documents[doc_id])
+        modified["heg_data"] = [1.0, 2.0]
+        feed.set(doc_id, modified)
+    else:
+        feed.delete(doc_id)
+    assert store.results()["brain_activity"]["mean_per_session"] == \
+        scan(SESSION_ACCUMULATORS, feed.documents)["brain_activity"]["mean_per_session"]
+
+
+def test_changes_after_the_seed_notify_on_change():
+    notified = []
+    feed = InMemoryChangeFeed(make_sessions(3, seed=6))
+    store = AggregateStore(SESSION_ACCUMULATORS, on_change=lambda: notified.append(True))
+    assert store.start(feed, timeout=1)
+    assert notified == []
+
+    feed.delete("questionary00001")
+    assert notified == [True]
@@ -0,0 +1,79 @@
+"""
+Coalescência de chamadas idênticas simultâneas (single-flight).
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from coalescing import SingleFlight, freeze
+from instrumentation import COALESCED_CALLS
+
+
+def run_concurrently(flight, key, function, callers):
+    """
+    Faz `callers` chamadas simultâneas e libera a execução só depois que todas estão aguardando.
+    """
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(threading.get_ident())
+        release.wait(5)
+        return function()
+
+    with ThreadPoolExecutor(callers) as pool:
+        futures = [pool.submit(flight.do, key, slow) for _ in range(callers)]
+        # Libera a execução só quando as outras chamadas já aguardam a primeira
+        deadline = time.monotonic() + 5
+        while COALESCED_CALLS.value(name=flight.name, role="collapsed") < callers - 1:
+            assert time.monotonic() < deadline
+            time.sleep(0.001)
+        release.set()
+        outcomes = []
+        for future in futures:
+            try:
+                outcomes.append(future.result(5))
+            except Exception as e:
+                outcomes.append(e)
+    return calls, outcomes
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight("teste_resultado")
+    result = {"value": 1}
+    calls, outcomes = run_concurrently(flight, "chave", lambda: result, 8)
+    assert len(calls) == 1 and all(outcome is result for outcome in outcomes)
+    assert flight._calls == {}
+
+
+def test_concurrent_calls_share_the_exception():
+    flight = SingleFlight("teste_excecao")
+    error = RuntimeError("falhou")
+
+    def fail():
+        raise error
+
+    calls, outcomes = run_concurrently(flight, "chave", fail, 4)
+    assert len(calls) == 1 and all(outcome is error for outcome in outcomes)
+
+
+def test_calls_after_the_execution_run_again():
+    flight = SingleFlight("teste")
+    calls = []
+    for _ in range(3):
+        flight.do("chave", lambda: calls.append(1))
+    assert len(calls) == 3
+
+
+def test_reentrant_call_does_not_wait_for_itself():
+    flight = SingleFlight("teste")
+    assert flight.do("chave", lambda: flight.do("chave", lambda: 42)) == 42
+
+
+def test_freeze_builds_the_same_key_for_equal_parameters():
+    assert freeze({"b": [1, 2], "a": {"x": {3}}}) == freeze({"a": {"x": {3}}, "b": (1, 2)})
+    with pytest.raises(TypeError):
+        freeze(object.__new__(type("Unhashable", (), {"__hash__": None})))
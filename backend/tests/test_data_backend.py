@@ -0,0 +1,23 @@
+"""
+Escolha do cliente e da classe do filtro de `where(filter=...)`.
+"""
+
+import data_backend
+from memory_firestore import FieldFilter, MemoryFirestore
+
+
+def test_filter_class_is_resolved_with_the_client(monkeypatch):
+    previous = data_backend.get_db()
+    db = MemoryFirestore()
+    data_backend.set_db(db)
+    try:
+        db.collection("users").document("a").set({"user_id": "u1"})
+        db.collection("users").document("b").set({"user_id": "u2"})
+
+        monkeypatch.setattr(data_backend, "get_db", lambda: (_ for _ in ()).throw(AssertionError))
+        condition = data_backend.field_filter("user_id", "==", "u2")
+        assert isinstance(condition, FieldFilter)
+        assert [doc.id for doc in db.collection("users").where(filter=condition).stream()] == ["b"]
+    finally:
+        monkeypatch.undo()
+        data_backend.set_db(previous)
@@ -0,0 +1,117 @@
+"""
+Métricas do Go/NoGo calculadas a partir das colunas das tentativas.
+"""
+
+import copy
+
+import pytest
+
+import app
+import baseline
+from aggregation import GoNoGoAccumulator
+from gonogo import GoNoGoTrials, game_metrics, pack_game_data
+from helpers import Snapshot, assert_close, make_sessions, scan
+from snapshot_store import export_snapshot, open_snapshot, snapshot_aggregates
+
+
+def documents(sessions):
+    return [Snapshot(doc_id, data) for doc_id, data in sorted(sessions.items())]
+
+
+def test_trials_match_the_summary_accumulator():
+    sessions = make_sessions(80, seed=7)
+    expected = scan({"game_metrics": GoNoGoAccumulator}, sessions)["game_metrics"]
+    assert game_metrics(GoNoGoTrials.from_documents(documents(sessions))) == expected
+
+
+@pytest.mark.parametrize("entry", [{"timeScore": "rápido"}, {"iteration": None}])
+def test_non_numeric_values_invalidate_the_metrics(entry):
+    sessions = make_sessions(3, seed=8)
+    sessions["questionary00001"]["game_data"][0].update(entry)
+
+    assert scan({"game_metrics": GoNoGoAccumulator}, sessions)["game_metrics"] is None
+    with pytest.raises(TypeError):
+        game_metrics(GoNoGoTrials.from_documents(documents(sessions)))
+
+
+@pytest.mark.parametrize("game_data", [["go"], "go", {"gonogo": "go"}])
+def test_invalid_game_data_invalidates_the_metrics(game_data):
+    sessions = make_sessions(3, seed=9)
+    if isinstance(game_data, list):
+        game_data = sessions["questionary00002"]["game_data"] + game_data
+    sessions["questionary00002"]["game_data"] = game_data
+
+    assert scan({"game_metrics": GoNoGoAccumulator}, sessions)["game_metrics"] is None
+    with pytest.raises(TypeError):
+        game_metrics(GoNoGoTrials.from_documents(documents(sessions)))
+
+
+def test_null_game_data_is_a_session_without_trials_in_every_path(tmp_path):
+    sessions = make_sessions(20, seed=13)
+    sessions["questionary00003"]["game_data"] = None
+    del sessions["questionary00004"]["game_data"]
+    without = {doc_id: data for doc_id, data in sessions.items() if data.get("game_data")}
+
+    expected = scan({"game_metrics": GoNoGoAccumulator}, sessions)["game_metrics"]
+    assert expected is not None
+    assert expected == scan({"game_metrics": GoNoGoAccumulator}, without)["game_metrics"]
+    assert game_metrics(GoNoGoTrials.from_documents(documents(sessions))) == expected
+
+    def read(name, since):
+        return documents(copy.deepcopy(sessions)) if name == "sessionQuestionary" else []
+
+    export_snapshot(str(tmp_path), read, "updated_at")
+    collection = open_snapshot(str(tmp_path)).collection("sessionQuestionary")
+    assert_close(snapshot_aggregates(collection, [GoNoGoAccumulator()])["game_metrics"], expected)
+    mask = collection.mask(None, "updated_at")
+    assert_close(game_metrics(GoNoGoTrials.from_snapshot(collection, mask)), expected)
+
+
+def test_pack_game_data_converts_each_value_like_the_summary():
+    arrays = pack_game_data([
+        [{"gonogo": "go", "isCorrect": False, "timeScore": 1, "iteration": True},
+         {"gonogo": "nogo", "isCorrect": 0, "timeScore": 0.5},
+         {"gonogo": ["go"], "timeScore": "0.5", "iteration": 2}],
+        None,
+        [{"gonogo": "x", "isCorrect": "sim"}, 3],
+        "go",
+    ])
+    assert arrays["gonogo"].tolist() == [0, 1, -1, -1]
+    assert arrays["correct"].tolist() == [False, False, True, True]
+    assert arrays["time_score"][:2].tolist() == [1.0, 0.5]
+    assert arrays["time_score"][2] != arrays["time_score"][2]
+    assert arrays["iteration"].tolist() == [1.0, 0.0, 2.0, 0.0]
+    assert arrays["invalid"].tolist() == [False, False, True, True]
+    assert arrays["offsets"].tolist() == [0, 3, 3, 4, 4]
+
+
+def test_game_routes_use_the_trial_columns(db, monkeypatch):
+    sessions = make_sessions(30, seed=10)
+    for doc_id, data in sessions.items():
+        db.collection("sessionQuestionary").document(doc_id).set(copy.deepcopy(data))
+    expected = scan({"game_metrics": GoNoGoAccumulator}, sessions)["game_metrics"]
+
+    def unexpected(*args, **kwargs):
+        raise AssertionError("as métricas do jogo não devem resumir as sessões")
+
+    monkeypatch.setattr(app, "load_session_aggregates", unexpected)
+    client = app.app.test_client()
+    assert client.get("/api/game-metrics").get_json() == expected
+    assert client.get("/api/game-zscores").status_code == 200
+    assert client.get("/api/corrected-percentages").status_code == 200
+
+
+def test_analytics_by_user_match_the_original_calculations(db):
+    sessions = make_sessions(40, seed=12, users=3)
+    db.collections["sessionQuestionary"] = copy.deepcopy(sessions)
+
+    rows = app.app.test_client().get("/api/gonogo-analytics").get_json()["by_user"]
+    assert sorted(row["user_id"] for row in rows) == sorted({data["user_id"] for data in sessions.values()})
+    for row in rows:
+        documents = {doc_id: data for doc_id, data in sessions.items() if data["user_id"] == row["user_id"]}
+        assert row["sessions"] == len(documents)
+        assert_close(row["game_metrics"], baseline.game_metrics(documents))
+        assert_close(row["zscores"], baseline.game_zscores(documents))
+        assert_close(row["corrected_percentages"], baseline.corrected_percentages(documents))
+        assert row["gonogo_game_final_mean"] == \
+            pytest.approx(baseline.gonogo_final_mean(documents)["gonogo_game_final_mean"])
@@ -0,0 +1,47 @@
+"""
+Conversão e validação do 'heg_data'.
+"""
+
+import math
+
+import numpy as np
+import pytest
+
+from aggregation import HegMeanAccumulator, scan_documents
+from heg import is_packed_heg, pack_heg, to_float_array, unpack_heg
+from helpers import Snapshot
+
+
+@pytest.mark.parametrize("heg_data", [
+    [1.0, None, 3.0],
+    [1.0, "nan", 3.0],
+    [1.0, float("inf")],
+    [1.0, {"valor": 2}],
+    ["abc"],
+])
+def test_non_numeric_or_non_finite_samples_are_rejected(heg_data):
+    with pytest.raises(ValueError):
+        to_float_array(heg_data)
+    with pytest.raises(ValueError):
+        pack_heg(heg_data)
+
+
+def test_packed_round_trip_and_overflow():
+    packed = pack_heg(["1.5", 2, 3.25])
+    assert is_packed_heg(packed)
+    assert to_float_array(packed).tolist() == [1.5, 2.0, 3.25]
+    assert unpack_heg(packed).dtype == np.float32
+
+    with pytest.raises(ValueError):
+        pack_heg([1e300])
+
+
+def test_invalid_session_is_left_out_of_the_mean():
+    documents = [
+        Snapshot("a", {"heg_data": [1.0, 3.0]}),
+        Snapshot("b", {"heg_data": [1.0, None]}),
+        Snapshot("c", {"heg_data": [4.0]}),
+    ]
+    result = scan_documents(documents, [HegMeanAccumulator()])["brain_activity"]
+    assert result == {"mean_per_session": [2.0, 4.0], "final_mean": 3.0}
+    assert all(math.isfinite(value) for value in result["mean_per_session"])
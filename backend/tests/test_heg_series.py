@@ -0,0 +1,139 @@
+"""
+Série reduzida do HEG de uma sessão (`/api/sessionQuestionary/<id>/heg`) e os métodos de redução.
+"""
+
+import numpy as np
+import pytest
+
+import app
+from heg import HEG_PACKED_DTYPE, downsample_lttb, downsample_minmax, pack_heg
+
+
+def signal(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return (80 + np.cumsum(rng.normal(0, 1, count))).round(3)
+
+
+@pytest.fixture
+def client(db):
+    samples = signal(2000, seed=61)
+    db.collections["sessionQuestionary"] = {
+        "lista": {"user_id": "u1", "heg_data": samples.tolist()},
+        "compacto": {"user_id": "u1", "heg_data": pack_heg(samples.tolist())},
+        "curto": {"user_id": "u1", "heg_data": [80.0, 81.0, 79.5]},
+        "vazio": {"user_id": "u1", "heg_data": []},
+        "texto": {"user_id": "u1", "heg_data": [80.0, "alto", 79.5]},
+    }
+    return app.app.test_client()
+
+
+def series(client, session_id, query=""):
+    response = client.get(f"/api/sessionQuestionary/{session_id}/heg{query}")
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+@pytest.mark.parametrize("method", ["lttb", "minmax"])
+@pytest.mark.parametrize("max_points", [3, 100, 500])
+def test_points_respect_max_points_and_keep_the_endpoints(db, client, method, max_points):
+    samples = db.collections["sessionQuestionary"]["lista"]["heg_data"]
+    result = series(client, "lista", f"?max_points={max_points}&method={method}")
+
+    points = result["points"]
+    assert result["samples"] == len(samples) and result["method"] == method
+    assert 2 <= len(points) <= max_points
+    indices = [index for index, _ in points]
+    assert indices == sorted(set(indices))
+    assert all(value == samples[index] for index, value in points)
+    assert indices[0] == 0 and indices[-1] == len(samples) - 1
+
+
+def test_default_max_points_and_short_series(client):
+    assert len(series(client, "lista")["points"]) == app.HEG_SERIES_DEFAULT_POINTS
+    # Séries menores que max_points são retornadas inteiras
+    assert series(client, "curto")["points"] == [[0, 80.0], [1, 81.0], [2, 79.5]]
+    assert series(client, "vazio")["points"] == []
+
+
+def test_start_and_end_select_the_window(db, client):
+    samples = db.collections["sessionQuestionary"]["lista"]["heg_data"]
+    result = series(client, "lista", "?start=100&end=150&max_points=1000")
+    assert (result["start"], result["end"]) == (100, 150)
+    assert result["points"] == [[index, samples[index]] for index in range(100, 150)]
+
+    result = series(client, "lista", "?start=1900&max_points=10")
+    assert (result["start"], result["end"]) == (1900, 2000)
+    assert result["points"][0][0] == 1900 and result["points"][-1][0] == 1999
+
+    # Janelas além do fim do sinal são limitadas ao número de amostras
+    result = series(client, "lista", "?start=5000&end=6000")
+    assert (result["start"], result["end"], result["points"]) == (2000, 2000, [])
+
+
+def test_packed_heg_data_returns_the_float32_samples(db, client):
+    samples = np.asarray(db.collections["sessionQuestionary"]["lista"]["heg_data"])
+    packed = series(client, "compacto", "?max_points=200")
+    expected = samples.astype(HEG_PACKED_DTYPE).astype(np.float64)
+
+    assert packed["samples"] == len(samples)
+    listed = series(client, "lista", "?max_points=200")
+    assert [index for index, _ in packed["points"]] == [index for index, _ in listed["points"]]
+    assert all(value == expected[index] for index, value in packed["points"])
+
+
+@pytest.mark.parametrize("query", [
+    "?max_points=2", f"?max_points={app.HEG_SERIES_MAX_POINTS + 1}", "?max_points=abc",
+    "?method=media", "?start=-1", "?end=x", "?start=10&end=10",
+])
+def test_invalid_parameters_are_rejected(client, query):
+    response = client.get(f"/api/sessionQuestionary/lista/heg{query}")
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+
+def test_unknown_session_is_not_found(client):
+    assert client.get("/api/sessionQuestionary/inexistente/heg").status_code == 404
+
+
+def test_non_numeric_heg_data_is_unprocessable(client):
+    assert client.get("/api/sessionQuestionary/texto/heg").status_code == 422
+
+
+@pytest.mark.parametrize("downsample", [downsample_lttb, downsample_minmax])
+@pytest.mark.parametrize("count, max_points", [(10, 3), (1001, 100), (5000, 501), (50, 50), (20, 100)])
+def test_downsampling_indices(downsample, count, max_points):
+    values = signal(count, seed=count)
+    indices = downsample(values, max_points)
+
+    assert len(indices) <= max_points
+    assert np.all(np.diff(indices) > 0)
+    assert indices[0] == 0 and indices[-1] == count - 1
+    if max_points >= count:
+        assert indices.tolist() == list(range(count))
+
+
+def test_lttb_keeps_the_endpoints_and_a_peak():
+    values = np.zeros(1000)
+    values[437] = 50.0
+    indices = downsample_lttb(values, 20)
+    assert len(indices) == 20
+    assert indices[0] == 0 and indices[-1] == 999
+    assert 437 in indices
+
+
+def test_minmax_keeps_the_extremes_of_each_bucket():
+    values = signal(1002, seed=62)
+    indices = downsample_minmax(values, 12)
+    assert len(indices) <= 12
+    assert np.argmin(values) in indices and np.argmax(values) in indices
+    # 5 baldes de 200 amostras entre a primeira e a última
+    for start in range(1, 1001, 200):
+        bucket = values[start:start + 200]
+        assert start + np.argmin(bucket) in indices and start + np.argmax(bucket) in indices
+
+
+def test_too_few_points_are_rejected():
+    with pytest.raises(ValueError):
+        downsample_lttb(signal(10), 2)
+    with pytest.raises(ValueError):
+        downsample_minmax(signal(10), 1)
@@ -0,0 +1,90 @@
+"""
+Ingestão em lote pela rota `/api/<coleção>/bulk`.
+"""
+
+import json
+
+import app
+import baseline
+import ingestion
+from helpers import assert_close, make_sessions
+
+
+def post_ndjson(records, collection="sessionQuestionary", buffered=True):
+    body = "\n".join(json.dumps(record) for record in records)
+    return app.app.test_client().post(
+        f"/api/{collection}/bulk?format=ndjson", data=body,
+        content_type="application/x-ndjson", buffered=buffered,
+    )
+
+
+def session(index, **changes):
+    record = {
+        "id": f"s{index}", "user_id": "u1", app.SESSION_DATE_FIELD: "2026-03-01T10:00:00Z",
+        "heg_data": [80.0, 81.0], "game_data": [{"gonogo": "go", "isCorrect": True, "timeScore": 0.3}],
+        "form_answer": [1, 2, 3],
+    }
+    record.update(changes)
+    return record
+
+
+def report(response):
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    return lines[:-1], lines[-1]["summary"]
+
+
+def test_user_and_date_are_required(db):
+    records = [session(0), session(1, user_id=None), session(2, **{app.SESSION_DATE_FIELD: None}), session(3, user_id="")]
+    results, summary = report(post_ndjson(records))
+
+    assert summary == {"received": 4, "written": 1, "failed": 3}
+    assert [result["status"] for result in results] == ["ok", "error", "error", "error"]
+    assert sorted(db.collections["sessionQuestionary"]) == ["s0"]
+
+
+def test_repeated_id_in_the_same_request_is_rejected(db):
+    results, summary = report(post_ndjson([session(0), session(1), session(0, user_id="u2")]))
+
+    assert summary == {"received": 3, "written": 2, "failed": 1}
+    assert "registro 0" in results[2]["error"]
+    assert db.collections["sessionQuestionary"]["s0"]["user_id"] == "u1"
+
+
+def test_all_records_are_committed_before_the_response(db):
+    response = post_ndjson([session(index) for index in range(7)], buffered=False)
+
+    # Nada do corpo da resposta foi lido ainda
+    assert len(db.collections["sessionQuestionary"]) == 7
+    assert report(response)[1] == {"received": 7, "written": 7, "failed": 0}
+
+
+def test_batches_keep_the_input_order_and_a_failed_batch_fails_only_its_records(db, monkeypatch):
+    commit = ingestion._commit
+
+    def failing_commit(client, collection_name, writes):
+        if any(reference.id == "s4" for reference, _ in writes):
+            raise RuntimeError("indisponível")
+        commit(client, collection_name, writes)
+
+    monkeypatch.setattr(ingestion, "_commit", failing_commit)
+    records = [session(index) for index in range(8)]
+    results = list(ingestion.ingest_records(db, "sessionQuestionary", records, app.SESSION_DATE_FIELD,
+                                            batch_size=3, max_in_flight=2))
+
+    assert [result["index"] for result in results] == list(range(8))
+    # O lote s3..s5 falhou inteiro; os demais foram gravados
+    assert [result["status"] for result in results] == ["ok"] * 3 + ["error"] * 3 + ["ok"] * 2
+    assert sorted(db.collections["sessionQuestionary"]) == ["s0", "s1", "s2", "s6", "s7"]
+
+
+def test_ingested_sessions_match_the_original_calculations(db):
+    sessions = make_sessions(25, seed=51)
+    records = [
+        {**data, "id": doc_id, app.SESSION_DATE_FIELD: data["updated_at"].isoformat()}
+        for doc_id, data in sessions.items()
+    ]
+    assert report(post_ndjson(records))[1] == {"received": 25, "written": 25, "failed": 0}
+
+    client = app.app.test_client()
+    for path in ("/api/brain-activity", "/api/game-metrics", "/api/stress-value", "/api/global-performance"):
+        assert_close(client.get(path).get_json(), baseline.ROUTES[path](sessions), path=path)
@@ -0,0 +1,40 @@
+"""
+Contagem das leituras do Firestore e saída dos logs.
+"""
+
+import logging
+
+import app
+from instrumentation import FIRESTORE_BYTES, FIRESTORE_DOCUMENTS, instrument_stream
+from memory_firestore import MemoryFirestore
+
+
+def test_stream_counts_documents_and_bytes_without_copying(monkeypatch):
+    db = MemoryFirestore()
+    for index in range(3):
+        db.collection("contagem").document(f"doc{index}").set({"heg_data": [1.0] * 10, "user_id": "u"})
+
+    def fail(self):
+        raise AssertionError("to_dict não deve ser chamado para estimar o tamanho")
+
+    snapshots = list(db.collection("contagem").stream())
+    monkeypatch.setattr(type(snapshots[0]), "to_dict", fail)
+    documents_before = FIRESTORE_DOCUMENTS.value(collection="contagem")
+    bytes_before = FIRESTORE_BYTES.value(collection="contagem")
+
+    assert len(list(instrument_stream(iter(snapshots), "contagem"))) == 3
+    assert FIRESTORE_DOCUMENTS.value(collection="contagem") - documents_before == 3
+    assert FIRESTORE_BYTES.value(collection="contagem") - bytes_before == 3 * (9 + 80 + 8 + 2 + 32)
+
+
+def test_route_errors_go_through_the_logger(caplog, capsys, monkeypatch):
+    def broken(*args, **kwargs):
+        raise RuntimeError("falha simulada")
+
+    monkeypatch.setattr(app, "load_session_aggregates", broken)
+    with caplog.at_level(logging.ERROR, logger="app"):
+        response = app.app.test_client().get("/api/brain-activity")
+
+    assert response.status_code == 500
+    assert "falha simulada" in caplog.text
+    assert capsys.readouterr().out == ""
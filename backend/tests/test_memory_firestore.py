@@ -0,0 +1,52 @@
+"""
+Semântica de cópia do Firestore em memória (a mesma do SDK) e o arquivo do backend `file`.
+"""
+
+from datetime import datetime, timezone
+
+import pytest
+
+from memory_firestore import FieldFilter, MemoryFirestore
+
+
+def test_snapshots_and_writes_are_deep_copies():
+    db = MemoryFirestore()
+    original = {"heg_data": [1.0, 2.0], "game_data": [{"isCorrect": True}]}
+    reference = db.collection("sessionQuestionary").document("s1")
+    reference.set(original)
+    original["heg_data"].append(3.0)
+
+    snapshot = reference.get()
+    data = snapshot.to_dict()
+    data["heg_data"].append(4.0)
+    data["game_data"][0]["isCorrect"] = False
+    snapshot.get("game_data")[0]["isCorrect"] = False
+
+    stored = reference.get().to_dict()
+    assert stored == {"heg_data": [1.0, 2.0], "game_data": [{"isCorrect": True}]}
+    assert next(iter(db.collection("sessionQuestionary").stream())).to_dict() == stored
+
+
+def test_file_backend_keeps_dates_and_bytes_after_reload(tmp_path):
+    path = str(tmp_path / "firestore.json")
+    db = MemoryFirestore(path)
+    sessions = db.collection("sessionQuestionary")
+    sessions.document("s1").set({"user_id": "u1", "updated_at": datetime(2026, 3, 1, 10, tzinfo=timezone.utc),
+                                 "heg_data": b"HEG\x01\x00\x00\x80?"})
+    sessions.document("s2").set({"user_id": "u1", "updated_at": datetime(2026, 5, 1, 10, tzinfo=timezone.utc)})
+
+    reloaded = MemoryFirestore(path)
+    data = reloaded.collection("sessionQuestionary").document("s1").get().to_dict()
+    assert data["updated_at"] == datetime(2026, 3, 1, 10, tzinfo=timezone.utc)
+    assert data["heg_data"] == b"HEG\x01\x00\x00\x80?"
+
+    query = reloaded.collection("sessionQuestionary").where(
+        filter=FieldFilter("updated_at", ">=", datetime(2026, 4, 1, tzinfo=timezone.utc)))
+    assert [doc.id for doc in query.stream()] == ["s2"]
+
+
+def test_file_backend_rejects_unknown_types(tmp_path):
+    db = MemoryFirestore(str(tmp_path / "firestore.json"))
+    with pytest.raises(TypeError):
+        db.collection("users").document("u1").set({"tags": {"a", "b"}})
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,57 @@
+"""
+Compressão das respostas, em especial das respostas em streaming.
+"""
+
+import gzip
+import zlib
+
+from flask import Response
+from werkzeug.datastructures import Accept
+from werkzeug.http import parse_accept_header
+
+import app
+from benchmarks.synthetic import populate
+from negotiation import compress_response
+
+
+def gzip_only():
+    return parse_accept_header("gzip", Accept)
+
+
+def test_streamed_chunks_are_sent_before_the_stream_ends():
+    produced = []
+
+    def chunks():
+        for line in (b'{"id": 1}\n', b'{"id": 2}\n'):
+            produced.append(line)
+            yield line
+
+    response = compress_response(Response(chunks(), mimetype="application/x-ndjson"), gzip_only())
+    assert response.headers["Content-Encoding"] == "gzip"
+
+    body = iter(response.response)
+    decompressor = zlib.decompressobj(31)
+    # O primeiro bloco já pode ser descomprimido enquanto o segundo ainda não foi gerado
+    assert decompressor.decompress(next(body)) == b'{"id": 1}\n'
+    assert len(produced) == 1
+
+    rest = b"".join(body)
+    assert decompressor.decompress(rest) == b'{"id": 2}\n'
+    assert decompressor.eof
+
+
+def test_streamed_route_is_a_valid_gzip_stream(db):
+    populate(db, 30, seed=71)
+    client = app.app.test_client()
+    plain = client.get("/api/sessionQuestionary?format=ndjson").get_data()
+
+    response = client.get("/api/sessionQuestionary?format=ndjson", headers={"Accept-Encoding": "gzip"}, buffered=False)
+    assert response.headers["Content-Encoding"] == "gzip"
+    first = next(iter(response.response))
+    assert zlib.decompressobj(31).decompress(first)
+    assert gzip.decompress(first + b"".join(response.response)) == plain
+
+
+def test_small_buffered_responses_are_not_compressed():
+    response = compress_response(Response(b'{"ok": true}', mimetype="application/json"), gzip_only())
+    assert "Content-Encoding" not in response.headers
@@ -0,0 +1,61 @@
+"""
+Paginação por cursor das rotas das coleções.
+"""
+
+import pytest
+
+import app
+from benchmarks.synthetic import populate
+
+
+@pytest.fixture
+def client(db):
+    populate(db, 60, seed=41)
+    return app.app.test_client()
+
+
+def read_pages(client, path, limit):
+    pages, cursor = [], None
+    while True:
+        response = client.get(f"{path}?limit={limit}" + (f"&cursor={cursor}" if cursor else ""))
+        assert response.status_code == 200
+        page = response.get_json()
+        pages.append(page["data"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+@pytest.mark.parametrize("limit", [1, 7, 60, 1000])
+def test_pages_cover_the_collection_in_id_order(db, client, limit):
+    pages = read_pages(client, "/api/sessionQuestionary", limit)
+    ids = [doc_id for page in pages for doc_id in page]
+
+    assert ids == sorted(db.collections["sessionQuestionary"])
+    assert all(len(page) == limit for page in pages[:-1]) and 0 < len(pages[-1]) <= limit
+
+
+def test_pages_match_the_whole_collection(client):
+    pages = read_pages(client, "/api/users", 4)
+    everything = client.get("/api/users?all=true").get_json()
+    assert {doc_id: data for page in pages for doc_id, data in page.items()} == everything
+
+
+def test_cursor_resumes_after_deleted_document(db, client):
+    first = client.get("/api/sessionQuestionary?limit=5").get_json()
+    last_id = list(first["data"])[-1]
+    db.collection("sessionQuestionary").document(last_id).delete()
+
+    second = client.get(f"/api/sessionQuestionary?limit=5&cursor={first['next_cursor']}").get_json()
+    expected = sorted(db.collections["sessionQuestionary"])
+    assert list(second["data"]) == expected[expected.index(list(first["data"])[-2]) + 1:][:5]
+
+
+def test_fields_limit_the_page(client):
+    page = client.get("/api/sessionQuestionary?limit=3&fields=user_id").get_json()
+    assert all(list(data) == ["user_id"] for data in page["data"].values())
+
+
+@pytest.mark.parametrize("query", ["limit=0", "limit=abc", "limit=1001", "cursor=zz", "fields=,"])
+def test_invalid_parameters_are_rejected(client, query):
+    assert client.get(f"/api/sessionQuestionary?{query}").status_code == 400
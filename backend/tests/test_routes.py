@@ -0,0 +1,128 @@
+"""
+As rotas das métricas, lendo o Firestore em memória, devem retornar o mesmo que os cálculos
+originais (`baseline.py`), qualquer que seja a origem dos agregados: varredura, resumos
+gravados, snapshot colunar ou agregado incremental.
+"""
+
+import copy
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import app
+import baseline
+from helpers import assert_close, make_sessions
+from snapshot_store import SnapshotReader
+
+
+SOURCES = ["scan", "summaries", "snapshot", "store"]
+
+
+def route_sessions():
+    sessions = make_sessions(60, seed=11)
+    # Casos de borda tratados pelos cálculos originais
+    sessions["questionary00001"]["heg_data"] = []
+    sessions["questionary00002"]["form_answer"] = [3]
+    sessions["questionary00003"]["form_answer"] = ["7", "12", "30"]
+    del sessions["questionary00004"]["game_data"]
+    del sessions["questionary00005"]["heg_data"]
+    sessions["questionary00006"]["heg_data"] = ["81.5", 79, "80.25"]
+    return sessions
+
+
+def use_source(source, db, monkeypatch, tmp_path):
+    """
+    Prepara a origem dos agregados usada pelas rotas. Retorna uma função que torna visíveis as
+    alterações feitas depois no banco (a origem é atualizada como em produção).
+    """
+    runner = app.app.test_cli_runner()
+
+    def command(*args):
+        def run():
+            result = runner.invoke(args=list(args))
+            assert result.exit_code == 0, result.output
+        run()
+        return run
+
+    if source == "summaries":
+        monkeypatch.setattr(app, "SESSION_SUMMARIES_ENABLED", True)
+        return command("backfill-summaries")
+
+    if source == "snapshot":
+        monkeypatch.setattr(app, "SNAPSHOT_DIR", str(tmp_path))
+        monkeypatch.setattr(app, "_snapshot_reader", SnapshotReader(str(tmp_path)))
+        export = command("export-snapshot")
+        assert app.get_snapshot() is not None
+        return export
+
+    if source == "store":
+        monkeypatch.setattr(app, "AGGREGATE_STORE_ENABLED", True)
+        monkeypatch.setattr(app, "_aggregate_store", None)
+        assert app.get_aggregate_store() is not None
+        return db.wait
+
+    return lambda: None
+
+
+@pytest.fixture(params=SOURCES)
+def source(request, db, monkeypatch, tmp_path):
+    """
+    Banco com as sessões de `route_sessions` e a origem dos agregados ativa.
+    """
+    db.collections["sessionQuestionary"] = route_sessions()
+    refresh = use_source(request.param, db, monkeypatch, tmp_path)
+    yield request.param, refresh
+    if app._aggregate_store is not None:
+        app._aggregate_store.stop()
+
+
+def get_json(client, path):
+    response = client.get(path)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def assert_routes_match_baseline(client, documents, query=""):
+    for path, calculate in baseline.ROUTES.items():
+        assert_close(get_json(client, path + query), calculate(documents), path=path)
+
+
+def test_routes_match_the_original_calculations(db, source):
+    assert_routes_match_baseline(app.app.test_client(), db.collections["sessionQuestionary"])
+
+
+def test_routes_match_after_writes(db, source):
+    _, refresh = source
+    client = app.app.test_client()
+    sessions = db.collections["sessionQuestionary"]
+
+    changed = copy.deepcopy(sessions["questionary00010"])
+    changed["heg_data"] = [value - 20 for value in changed["heg_data"]]
+    changed["game_data"][0]["isCorrect"] = not changed["game_data"][0]["isCorrect"]
+    changed["updated_at"] = datetime(2025, 6, 1, tzinfo=timezone.utc)
+    new = copy.deepcopy(sessions["questionary00020"])
+    new["updated_at"] = datetime(2025, 6, 2, tzinfo=timezone.utc)
+
+    db.collection("sessionQuestionary").document("questionary00010").set(changed)
+    db.collection("sessionQuestionary").document("questionary00000a").set(new)
+    refresh()
+
+    assert_routes_match_baseline(client, db.collections["sessionQuestionary"])
+
+
+@pytest.mark.parametrize("query", ["?user_id=user2", "?from=2024-03-01&to=2024-08-31", "?user_id=user1&from=2024-05-01"])
+def test_filtered_routes_match_the_filtered_documents(db, source, query):
+    name, _ = source
+    if name == "store":
+        pytest.skip("Consultas filtradas não usam o agregado incremental")
+
+    args = dict(part.split("=") for part in query[1:].split("&"))
+    start = datetime.fromisoformat(args.get("from", "2000-01-01")).replace(tzinfo=timezone.utc)
+    end = datetime.fromisoformat(args.get("to", "2100-01-01")).replace(tzinfo=timezone.utc) + timedelta(days=1)
+    documents = {
+        doc_id: data for doc_id, data in db.collections["sessionQuestionary"].items()
+        if args.get("user_id", data["user_id"]) == data["user_id"] and start <= data["updated_at"] < end
+    }
+    assert documents
+
+    assert_routes_match_baseline(app.app.test_client(), documents, query)
@@ -0,0 +1,58 @@
+"""
+Agendador das métricas derivadas (stale-while-revalidate).
+"""
+
+import time
+
+import app
+from scheduler import MetricScheduler
+
+
+def make_scheduler(**options):
+    calls = []
+    scheduler = MetricScheduler(interval=10, max_staleness=60, max_concurrency=2, **options)
+    scheduler.register("job", lambda value: calls.append(value) or {"value": value})
+    return scheduler, calls
+
+
+def test_only_stale_entries_read_since_the_last_run_are_refreshed():
+    scheduler, calls = make_scheduler()
+    for value in range(3):
+        scheduler.get("job", value)
+    assert calls == [0, 1, 2]
+
+    now = time.monotonic()
+    # Ainda recentes: nada a recalcular
+    assert scheduler._due_entries(now) == []
+
+    # Antigos, mas só a combinação 1 foi consultada desde o último cálculo
+    later = now + 11
+    with scheduler._lock:
+        for (_, (value,)), entry in scheduler._entries.items():
+            entry.last_access = later if value == 1 else entry.computed_at - 1
+    assert [key for key, _ in scheduler._due_entries(later)] == [("job", (1,))]
+    scheduler.stop()
+
+
+def test_refreshes_per_tick_are_capped_dirty_first():
+    scheduler, _ = make_scheduler(max_refreshes_per_tick=2)
+    for value in range(5):
+        scheduler.get("job", value)
+
+    later = time.monotonic() + 11
+    with scheduler._lock:
+        for (_, (value,)), entry in scheduler._entries.items():
+            entry.last_access = later
+            entry.computed_at -= value
+        scheduler._entries[("job", (0,))].dirty = True
+
+    # A invalidada primeiro, depois a mais antiga
+    assert [key for key, _ in scheduler._due_entries(later)] == [("job", (0,)), ("job", (4,))]
+    scheduler.stop()
+
+
+def test_failed_refresh_returns_an_error_response(monkeypatch):
+    monkeypatch.setattr(app, "serve_metric", lambda name, *args: (None, {}))
+    response = app.app.test_client().get("/api/performance-global")
+    assert response.status_code == 500
+    assert "error" in response.get_json()
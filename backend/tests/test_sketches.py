@@ -0,0 +1,111 @@
+"""
+Histogramas logarítmicos: precisão dos percentis e combinação (merge/subtract) entre sessões.
+"""
+
+import random
+
+import pytest
+
+from aggregation import DistributionAccumulator
+from sketches import LogHistogram
+
+
+def histogram(values):
+    sketch = LogHistogram()
+    sketch.add_many(values)
+    return sketch
+
+
+def test_quantiles_are_within_the_relative_accuracy():
+    rng = random.Random(31)
+    values = sorted(rng.lognormvariate(6, 0.5) for _ in range(5000))
+    sketch = histogram(values)
+    for q in (0.5, 0.9, 0.99):
+        expected = values[int(q * (len(values) - 1))]
+        assert sketch.quantile(q) == pytest.approx(expected, rel=0.02)
+
+
+def test_add_many_matches_add():
+    values = [-3.5, -0.2, 0.0, 1e-12, 0.7, 12.0, 12.0, 850.0]
+    one_by_one = LogHistogram()
+    for value in values:
+        one_by_one.add(value)
+    sketch = histogram(values)
+    assert sketch.buckets() == one_by_one.buckets()
+    assert (sketch.count, sketch.sum, sketch.min, sketch.max) == \
+        (one_by_one.count, one_by_one.sum, one_by_one.min, one_by_one.max)
+
+
+def test_merge_matches_a_single_histogram():
+    rng = random.Random(32)
+    parts = [[rng.uniform(-50, 500) for _ in range(200)] for _ in range(4)]
+    merged = LogHistogram()
+    for part in parts:
+        merged.merge(histogram(part))
+
+    expected = histogram([value for part in parts for value in part])
+    assert merged.buckets() == expected.buckets()
+    assert merged.count == expected.count and merged.sum == pytest.approx(expected.sum)
+    assert (merged.min, merged.max) == (expected.min, expected.max)
+
+
+def test_subtract_restores_the_counts_and_bounds_the_extremes():
+    rng = random.Random(33)
+    kept = [rng.uniform(100, 200) for _ in range(300)]
+    removed = [1.0, 5000.0] + [rng.uniform(100, 200) for _ in range(50)]
+    sketch = histogram(kept).merge(histogram(removed)).subtract(histogram(removed))
+
+    expected = histogram(kept)
+    assert sketch.buckets() == expected.buckets()
+    assert sketch.count == expected.count and sketch.sum == pytest.approx(expected.sum)
+    # O mínimo e o máximo ficam nas bordas dos baldes restantes
+    assert sketch.min == pytest.approx(expected.min, rel=0.02)
+    assert sketch.max == pytest.approx(expected.max, rel=0.02)
+    assert sketch.quantile(0.5) == pytest.approx(expected.quantile(0.5))
+
+
+def test_subtracting_everything_empties_the_histogram():
+    values = [-2.0, 0.0, 3.0]
+    sketch = histogram(values).subtract(histogram(values))
+    assert sketch.count == 0 and sketch.buckets() == []
+    assert sketch.quantile(0.5) is None
+
+
+def test_round_trip_and_incompatible_accuracy():
+    sketch = histogram([0.0, 1.5, -7.25, 300.0])
+    assert LogHistogram.from_dict(sketch.to_dict()).to_dict() == sketch.to_dict()
+    with pytest.raises(ValueError):
+        sketch.merge(LogHistogram(relative_accuracy=0.05))
+
+
+def test_removing_the_extremes_with_a_negative_weight_tightens_the_bounds():
+    sketch = LogHistogram()
+    for value in (0.05, 0.2, 0.25, 0.9):
+        sketch.add(value)
+
+    sketch.add(0.9, weight=-1)
+    sketch.add(0.05, weight=-1)
+    assert sketch.count == 2
+    assert sketch.min == pytest.approx(0.2, rel=0.02) and sketch.max == pytest.approx(0.25, rel=0.02)
+    assert sketch.min >= 0.2 / sketch.gamma and sketch.max <= 0.25 * sketch.gamma
+
+    sketch.add(0.2, weight=-1)
+    sketch.add(0.25, weight=-1)
+    assert sketch.count == 0 and sketch.buckets() == []
+    assert sketch.summary()["min"] is None
+
+
+def test_removed_session_leaves_the_error_rate_bounds():
+    accumulator = DistributionAccumulator()
+    sessions = {
+        name: {"game_data": [{"gonogo": "go", "isCorrect": index >= errors} for index in range(10)]}
+        for name, errors in (("a", 1), ("b", 3), ("c", 9))
+    }
+    for doc_id, data in sessions.items():
+        accumulator.add(doc_id, data)
+    accumulator.remove("c", sessions["c"])
+
+    error_rate = accumulator.result()["error_rate"]
+    assert error_rate["count"] == 2
+    assert error_rate["max"] == pytest.approx(0.3, rel=0.02)
+    assert error_rate["min"] == pytest.approx(0.1, rel=0.02)
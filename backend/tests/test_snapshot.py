@@ -0,0 +1,122 @@
+"""
+O snapshot colunar deve dar os mesmos resultados de uma varredura completa, também depois de
+atualizações incrementais (com os resultados na ordem da varredura).
+"""
+
+import copy
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from app import PERFORMANCE_ACCUMULATORS, SESSION_ACCUMULATORS
+from helpers import Snapshot, assert_close, make_sessions, scan
+from snapshot_store import build_columns, export_snapshot, merge_columns, open_snapshot, snapshot_aggregates
+
+
+ACCUMULATORS = {name: SESSION_ACCUMULATORS[name] for name in PERFORMANCE_ACCUMULATORS}
+
+
+def reader(documents):
+    """
+    Função de leitura do `export_snapshot` sobre os documentos ({id: documento}).
+    """
+    def read(name, since):
+        if name != "sessionQuestionary":
+            return []
+        return [
+            Snapshot(doc_id, copy.deepcopy(data)) for doc_id, data in sorted(documents.items())
+            if since is None or data["updated_at"] >= since
+        ]
+    return read
+
+
+def export(root, documents, full=False):
+    stats = export_snapshot(str(root), reader(documents), "updated_at", full=full)
+    return stats["sessionQuestionary"]
+
+
+def snapshot_results(root, filters=None):
+    collection = open_snapshot(str(root)).collection("sessionQuestionary")
+    accumulators = [factory() for factory in ACCUMULATORS.values()]
+    return snapshot_aggregates(collection, accumulators, filters, "updated_at")
+
+
+def test_full_export_matches_scan(tmp_path):
+    documents = make_sessions(50, seed=21)
+    assert export(tmp_path, documents)["mode"] == "full"
+    assert_close(snapshot_results(tmp_path), scan(ACCUMULATORS, documents))
+
+
+def test_incremental_export_matches_scan_in_scan_order(tmp_path):
+    documents = make_sessions(50, seed=22)
+    export(tmp_path, documents)
+    later = max(data["updated_at"] for data in documents.values()) + timedelta(days=1)
+
+    # Atualiza sessões do início da coleção e acrescenta outras entre as existentes
+    for doc_id in ("questionary00000", "questionary00007", "questionary00031"):
+        documents[doc_id] = {**documents[doc_id], "updated_at": later,
+                             "heg_data": [value * 2 for value in documents[doc_id]["heg_data"]],
+                             "form_answer": [1, 2, 3]}
+    for doc_id, data in make_sessions(3, seed=23).items():
+        documents[doc_id + "b"] = {**data, "updated_at": later}
+
+    stats = export(tmp_path, documents)
+    assert stats["mode"] == "incremental"
+    # Os 6 alterados e o da marca d'água anterior (lido de novo com `>=`)
+    assert stats["read"] == 7 and stats["rows"] == 53
+    assert_close(snapshot_results(tmp_path), scan(ACCUMULATORS, documents))
+
+
+def test_incremental_export_matches_filtered_scan(tmp_path):
+    documents = make_sessions(40, seed=24)
+    export(tmp_path, documents)
+    later = max(data["updated_at"] for data in documents.values()) + timedelta(days=1)
+    documents["questionary00005"] = {**documents["questionary00005"], "updated_at": later, "user_id": "user9"}
+    export(tmp_path, documents)
+
+    start = datetime(2024, 4, 1, tzinfo=timezone.utc)
+    filters = {"user_id": "user9", "from": start}
+    expected = {
+        doc_id: data for doc_id, data in documents.items()
+        if data["user_id"] == "user9" and data["updated_at"] >= start
+    }
+    assert_close(snapshot_results(tmp_path, filters), scan(ACCUMULATORS, expected))
+
+
+def test_field_with_new_type_forces_a_full_export(tmp_path):
+    documents = make_sessions(10, seed=25)
+    export(tmp_path, documents)
+    later = max(data["updated_at"] for data in documents.values()) + timedelta(days=1)
+    for doc_id in documents:
+        documents[doc_id] = {**documents[doc_id], "user_id": 7, "updated_at": later}
+
+    assert export(tmp_path, documents)["mode"] == "full"
+
+
+def test_merge_columns_replaces_updated_rows_and_appends_new_ones():
+    previous_ids, previous, _ = build_columns([
+        Snapshot("a", {"score": 1.0, "form_answer": [1, 2]}),
+        Snapshot("b", {"score": 2.0}),
+        Snapshot("c", {"score": 3.0, "form_answer": [5]}),
+    ], "updated_at")
+    update_ids, update, _ = build_columns([
+        Snapshot("b", {"score": 20.0, "form_answer": [7, 8, 9]}),
+        Snapshot("d", {"name": "novo"}),
+    ], "updated_at")
+
+    ids, columns = merge_columns(previous, previous_ids, update, update_ids)
+    assert ids == ["a", "c", "b", "d"]
+
+    kind, arrays = columns["score"]
+    assert kind == "number"
+    np.testing.assert_array_equal(arrays["values"], [1.0, 3.0, 20.0, np.nan])
+    kind, arrays = columns["form_answer"]
+    assert arrays["offsets"].tolist() == [0, 2, 3, 6, 6]
+    assert arrays["values"].tolist() == [1, 2, 5, 7, 8, 9]
+    assert "name" in columns
+
+
+def test_merge_columns_rejects_a_type_change():
+    previous_ids, previous, _ = build_columns([Snapshot("a", {"score": 1.0})], "updated_at")
+    update_ids, update, _ = build_columns([Snapshot("b", {"score": "alto"})], "updated_at")
+    assert merge_columns(previous, previous_ids, update, update_ids) is None
@@ -0,0 +1,56 @@
+"""
+O resumo gravado só é usado enquanto corresponder aos campos brutos.
+"""
+
+import copy
+
+from heg import pack_heg
+from helpers import make_sessions
+from summaries import (
+    SUMMARY_FIELD, SUMMARY_PARTS, is_summary_current, summarize_session, summary_part,
+)
+
+
+def summarized_session(seed=0):
+    session = next(iter(make_sessions(1, seed=seed).values()))
+    session[SUMMARY_FIELD] = summarize_session(session)
+    return session
+
+
+def test_stored_summary_is_used_while_the_raw_fields_match():
+    session = summarized_session()
+    assert is_summary_current(session)
+    for key, (_, summarize) in SUMMARY_PARTS.items():
+        assert summary_part(session, key) == summarize(session)
+
+    # Sem os campos brutos (leitura só do resumo), o resumo é usado como está
+    assert summary_part({SUMMARY_FIELD: session[SUMMARY_FIELD]}, "heg") == session[SUMMARY_FIELD]["heg"]
+
+
+def test_summary_is_recomputed_when_the_raw_fields_changed():
+    session = summarized_session(1)
+    stale = copy.deepcopy(session)
+    stale["heg_data"] = [value + 5 for value in stale["heg_data"]]
+    stale["game_data"] = stale["game_data"][:3]
+    stale["form_answer"] = [0, 0, 0]
+
+    assert not is_summary_current(stale)
+    for key, (_, summarize) in SUMMARY_PARTS.items():
+        assert summary_part(stale, key) == summarize(stale)
+        assert summary_part(stale, key) != session[SUMMARY_FIELD][key]
+
+
+def test_packed_heg_keeps_the_summary_current():
+    session = summarized_session(2)
+    session["heg_data"] = pack_heg(session["heg_data"])
+    assert is_summary_current(session)
+
+
+def test_removed_field_or_old_summary_is_not_current():
+    session = summarized_session(3)
+    removed = {field: value for field, value in session.items() if field != "form_answer"}
+    assert not is_summary_current(removed)
+
+    old = copy.deepcopy(session)
+    old[SUMMARY_FIELD]["version"] = 1
+    assert not is_summary_current(old)
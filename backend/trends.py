@@ -0,0 +1,236 @@
+"""
+Tendência de cada usuário ao longo do tempo (componentes do PerformanceGlobal).
+
+Para cada usuário o motor guarda, em ordem cronológica, um ponto por sessão com a data,
+as partes do resumo usadas pelo PerformanceGlobal (`summaries.py`) e os componentes
+calculados para aquela sessão. A partir dos pontos são calculadas:
+
+- a média móvel exponencial (EWMA) de cada componente, atualizada em O(1) a cada sessão
+  nova (uma sessão fora de ordem recalcula a média apenas a partir da sua posição);
+- as janelas móveis (últimas N sessões e últimos N dias), cujos componentes são
+  recalculados sobre as sessões da janela, como o PerformanceGlobal faz com a coleção.
+
+O motor também guarda a maior data já lida de cada usuário (marca d'água). Cada
+atualização lê apenas as sessões a partir dessa data, então o custo de uma consulta é
+proporcional às sessões novas, e não ao histórico do usuário.
+"""
+
+import bisect
+import logging
+import threading
+from collections import OrderedDict
+
+from instrumentation import log_event
+from rollups import parse_timestamp
+from summaries import SUMMARY_FIELD, SUMMARY_VERSION, summary_part
+
+
+logger = logging.getLogger(__name__)
+
+# Partes do resumo usadas pelos componentes do PerformanceGlobal
+TREND_PARTS = ("heg", "game", "form_answer")
+
+COMPONENTS = (
+    "brain_activity", "gonogo_game_final_mean", "stress_value", "focus_value", "control_value", "performance_global",
+)
+
+
+class TrendPoint:
+    """
+    Sessão de um usuário, na mesma interface do snapshot do Firestore (para `scan_documents`).
+    """
+
+    __slots__ = ("id", "date", "session", "components", "ewma")
+
+    def __init__(self, doc_id, date, session):
+        self.id = doc_id
+        self.date = date
+        self.session = session
+        self.components = {}
+        self.ewma = {}
+
+    def to_dict(self):
+        return self.session
+
+    @property
+    def key(self):
+        return (self.date, self.id)
+
+
+def compact_session(session_data):
+    """
+    Reduz a sessão às partes do resumo usadas pelo PerformanceGlobal (algumas centenas de bytes).
+    """
+    summary = {"version": SUMMARY_VERSION}
+    for key in TREND_PARTS:
+        try:
+            summary[key] = summary_part(session_data, key)
+        except Exception as e:
+            # Sem a parte, o componente correspondente fica vazio nesta sessão
+            log_event(logger, logging.WARNING, "trend_part_failed", part=key, error=e)
+    return {SUMMARY_FIELD: summary}
+
+
+class UserTrend:
+    """
+    Pontos de um usuário em ordem cronológica e a marca d'água da última leitura.
+    """
+
+    def __init__(self):
+        self.points = []
+        self.keys = []
+        self.by_id = {}
+        self.watermark = None
+        self.lock = threading.Lock()
+
+    def remove(self, doc_id):
+        point = self.by_id.pop(doc_id)
+        index = bisect.bisect_left(self.keys, point.key)
+        del self.points[index]
+        del self.keys[index]
+        return index
+
+    def insert(self, point):
+        index = bisect.bisect_left(self.keys, point.key)
+        self.points.insert(index, point)
+        self.keys.insert(index, point.key)
+        self.by_id[point.id] = point
+        return index
+
+    def since(self, date):
+        """
+        Retorna os pontos a partir de `date`.
+        """
+        return self.points[bisect.bisect_left(self.keys, (date, "")):]
+
+
+class TrendEngine:
+    """
+    Mantém a tendência dos usuários consultados, atualizando-a de forma incremental.
+
+    Parâmetros:
+    score: Função que recebe uma lista de sessões (`TrendPoint`) e retorna o dicionário de
+        componentes (`COMPONENTS`) calculado sobre elas, com None nos componentes sem dados.
+    alpha (float): Peso da sessão mais recente na média exponencial (entre 0 e 1).
+    max_users (int): Usuários mantidos em memória (os consultados há mais tempo são descartados).
+    """
+
+    def __init__(self, score, alpha=0.3, max_users=1000):
+        if not 0 < alpha <= 1:
+            raise ValueError("alpha deve estar entre 0 e 1")
+        self.score = score
+        self.alpha = alpha
+        self.max_users = max_users
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _user(self, user_id):
+        with self._lock:
+            trend = self._users.get(user_id)
+            if trend is None:
+                trend = self._users[user_id] = UserTrend()
+                while len(self._users) > self.max_users:
+                    self._users.popitem(last=False)
+            self._users.move_to_end(user_id)
+            return trend
+
+    def forget(self, user_id):
+        """
+        Descarta a tendência do usuário (a próxima consulta relê todo o histórico).
+        """
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def _update_ewma(self, trend, start):
+        previous = trend.points[start - 1].ewma if start > 0 else {}
+        for point in trend.points[start:]:
+            ewma = {}
+            for component in COMPONENTS:
+                value, last = point.components.get(component), previous.get(component)
+                if value is None:
+                    ewma[component] = last
+                elif last is None:
+                    ewma[component] = value
+                else:
+                    ewma[component] = self.alpha * value + (1 - self.alpha) * last
+            point.ewma = ewma
+            previous = ewma
+
+    def _apply(self, trend, sessions, date_field):
+        """
+        Insere as sessões lidas na tendência do usuário.
+
+        Retorna:
+        int: Quantidade de sessões novas ou alteradas.
+        """
+        changed = 0
+        first_changed = None
+        for doc in sessions:
+            data = doc.to_dict()
+            date = parse_timestamp(data.get(date_field))
+            if date is None:
+                continue
+            session = compact_session(data)
+
+            current = trend.by_id.get(doc.id)
+            if current is not None:
+                # Sessões na data da marca d'água são lidas de novo a cada atualização
+                if current.date == date and current.session == session:
+                    continue
+                index = trend.remove(doc.id)
+                first_changed = index if first_changed is None else min(first_changed, index)
+
+            point = TrendPoint(doc.id, date, session)
+            point.components = self.score([point])
+            index = trend.insert(point)
+            first_changed = index if first_changed is None else min(first_changed, index)
+
+            if trend.watermark is None or date > trend.watermark:
+                trend.watermark = date
+            changed += 1
+
+        if first_changed is not None:
+            self._update_ewma(trend, first_changed)
+        return changed
+
+    def report(self, user_id, read_sessions, date_field, last_sessions, since, include_series=False):
+        """
+        Atualiza a tendência do usuário com as sessões novas e a resume.
+
+        Parâmetros:
+        user_id (str): Usuário consultado.
+        read_sessions: Função que recebe a marca d'água (ou None na primeira leitura) e retorna as
+            sessões do usuário com data a partir dela.
+        date_field (str): Campo de data das sessões.
+        last_sessions (int): Tamanho da janela das últimas sessões.
+        since (datetime): Início da janela por data.
+        include_series (bool): Inclui um ponto por sessão (proporcional ao histórico do usuário).
+
+        Retorna:
+        dict: Componentes da última sessão, EWMA e janelas móveis (e a série de pontos, se pedida).
+        """
+        trend = self._user(user_id)
+        with trend.lock:
+            new_sessions = self._apply(trend, read_sessions(trend.watermark), date_field)
+            log_event(logger, logging.DEBUG, "trend_refresh", user_id=user_id, new_sessions=new_sessions,
+                      sessions=len(trend.points))
+
+            recent = trend.points[-last_sessions:]
+            window = trend.since(since)
+            latest = trend.points[-1] if trend.points else None
+            result = {
+                "user_id": user_id,
+                "sessions": len(trend.points),
+                "new_sessions": new_sessions,
+                "watermark": trend.watermark.isoformat() if trend.watermark else None,
+                "latest": latest.components if latest else None,
+                "ewma": {"alpha": self.alpha, **(latest.ewma if latest else {})},
+                "last_sessions": {"sessions": len(recent), **self.score(recent)},
+                "last_days": {"from": since.isoformat(), "sessions": len(window), **self.score(window)},
+            }
+            if include_series:
+                result["series"] = [
+                    {"id": point.id, "date": point.date.isoformat(), **point.components, "ewma": point.ewma}
+                    for point in trend.points
+                ]
+            return result
@@ -17,58 +17,40 @@ export default function Avaliacao() {
   useEffect(() => {
     const fetchData = async () => {
       try {
-        // Fetch para PerformanceGlobal
-        const performanceResponse = await fetch('https://neuro-dashboard.onrender.com/api/global-performance');
-        const performanceData = await performanceResponse.json();
-        setPerformanceGlobal(performanceData.PerformanceGlobal || null);
+        // Todas as métricas da página em uma única requisição (uma única varredura no backend)
+        const metrics = [
+          'global-performance',
+          'rollup-questionary',
+          'focus-value',
+          'stress-value',
+          'control-value',
+          'corrected-percentages',
+        ];
+        const batchResponse = await fetch(
+          `https://neuro-dashboard.onrender.com/api/batch?metrics=${metrics.join(',')}&granularity=month`
+        );
+        const { results } = await batchResponse.json();
 
-        // Fetch para sessionQuestionary
-        const sessionResponse = await fetch('https://neuro-dashboard.onrender.com/api/sessionQuestionary');
-        const sessionData = await sessionResponse.json();
+        // PerformanceGlobal
+        setPerformanceGlobal(results['global-performance']?.PerformanceGlobal || null);
 
-        const monthlyData = {};
-        Object.values(sessionData).forEach((session) => {
-          if (session.updated_at && session.form_answer) {
-            const date = new Date(session.updated_at);
-            const month = date.toLocaleString('default', { month: 'long' });
-
-            if (!monthlyData[month]) {
-              monthlyData[month] = { stressValues: [], focusValues: [], controlValues: [] };
-            }
-
-            monthlyData[month].stressValues.push(session.form_answer[0]);
-            monthlyData[month].focusValues.push(session.form_answer[1]);
-            monthlyData[month].controlValues.push(session.form_answer[2]);
-          }
-        });
-
-        const formattedData = Object.entries(monthlyData).map(([month, values]) => ({
-          month,
-          stressValue: values.stressValues.reduce((sum, val) => sum + val, 0) / values.stressValues.length,
-          focusValue: values.focusValues.reduce((sum, val) => sum + val, 0) / values.focusValues.length,
-          controlValue: values.controlValues.reduce((sum, val) => sum + val, 0) / values.controlValues.length,
+        // Média mensal do questionário
+        const formattedData = (results['rollup-questionary']?.periods || []).map((period) => ({
+          month: new Date(`${period.period}-01T00:00:00`).toLocaleString('default', { month: 'long', year: 'numeric' }),
+          stressValue: period.stress_value,
+          focusValue: period.focus_value,
+          controlValue: period.control_value,
         }));
         setChartData(formattedData);
 
-        // Fetch para Focus, Stress e Control
-        const [focusResponse, stressResponse, controlResponse] = await Promise.all([
-          fetch('https://neuro-dashboard.onrender.com/api/focus-value'),
-          fetch('https://neuro-dashboard.onrender.com/api/stress-value'),
-          fetch('https://neuro-dashboard.onrender.com/api/control-value'),
-        ]);
-        const [focusData, stressData, controlData] = await Promise.all([
-          focusResponse.json(),
-          stressResponse.json(),
-          controlResponse.json(),
-        ]);
-        setFocusValue(focusData.focus_values.reduce((sum, val) => sum + val, 0) / focusData.focus_values.length);
-        setStressValue(stressData.stress_values.reduce((sum, val) => sum + val, 0) / stressData.stress_values.length);
-        setControlValue(controlData.control_values.reduce((sum, val) => sum + val, 0) / controlData.control_values.length);
+        // Focus, Stress e Control
+        const average = (values) => values.reduce((sum, val) => sum + val, 0) / values.length;
+        if (results['focus-value']) setFocusValue(average(results['focus-value'].focus_values));
+        if (results['stress-value']) setStressValue(average(results['stress-value'].stress_values));
+        if (results['control-value']) setControlValue(average(results['control-value'].control_values));
 
-        // Fetch para Teste de Performance
-        const performanceTestResponse = await fetch('https://neuro-dashboard.onrender.com/api/corrected-percentages');
-        const performanceTestData = await performanceTestResponse.json();
-        setPerformanceTest(performanceTestData);
+        // Teste de Performance
+        setPerformanceTest(results['corrected-percentages'] || null);
       } catch (error) {
         console.error('Erro ao buscar dados:', error);
       } finally {
@@ -15,72 +15,27 @@ export default function Engajamento() {
   useEffect(() => {
     const fetchData = async () => {
       try {
-        let combinedDuration = 0; // Variável para armazenar a soma das durações
-
-        // Fetch sessionAvatar
-        const avatarResponse = await fetch('https://neuro-dashboard.onrender.com/api/sessionAvatar');
-        const sessionAvatars = await avatarResponse.json();
-
-        // Process sessionAvatar data
-        const avatarUserIds = new Set();
-        const avatarSegmentDurations = {};
-
-        for (const key in sessionAvatars) {
-          if (sessionAvatars.hasOwnProperty(key)) {
-            const session = sessionAvatars[key];
-            if (session.user_id) {
-              avatarUserIds.add(session.user_id);
-            }
-            if (session.session_duration) {
-              combinedDuration += session.session_duration; // Soma duração de avatar
-            }
-            if (session.segment) {
-              if (!avatarSegmentDurations[session.segment]) {
-                avatarSegmentDurations[session.segment] = 0;
-              }
-              avatarSegmentDurations[session.segment] += session.session_duration;
-            }
-          }
-        }
-
-        const avatarChartData = Object.keys(avatarSegmentDurations).map(segment => ({
+        // Fetch do resumo de engajamento (agrupado no backend)
+        const engagementResponse = await fetch('https://neuro-dashboard.onrender.com/api/rollups/engagement');
+        const engagement = await engagementResponse.json();
+
+        const avatarChartData = engagement.avatar.segments.map(({ segment, session_duration }) => ({
           segment,
-          duration: avatarSegmentDurations[segment] / 60, // Convert to minutes
+          duration: session_duration / 60, // Convert to minutes
         }));
 
-        setUserCount(avatarUserIds.size);
+        setUserCount(engagement.avatar.distinct_users);
         setAvatarSegmentData(avatarChartData);
 
-        // Fetch sessionMeditation
-        const meditationResponse = await fetch('https://neuro-dashboard.onrender.com//api/sessionMeditation');
-        const sessionMeditations = await meditationResponse.json();
-
-        // Process sessionMeditation data by "category"
-        const meditationCategoryDurations = {};
-
-        for (const key in sessionMeditations) {
-          if (sessionMeditations.hasOwnProperty(key)) {
-            const session = sessionMeditations[key];
-            if (session.session_duration) {
-              combinedDuration += session.session_duration; // Soma duração de meditação
-            }
-            if (session.category) {
-              if (!meditationCategoryDurations[session.category]) {
-                meditationCategoryDurations[session.category] = 0;
-              }
-              meditationCategoryDurations[session.category] += session.session_duration;
-            }
-          }
-        }
-
-        const meditationChartData = Object.keys(meditationCategoryDurations).map(category => ({
+        const meditationChartData = engagement.meditation.categories.map(({ category, session_duration }) => ({
           category,
-          duration: meditationCategoryDurations[category] / 60, // Convert to minutes
+          duration: session_duration / 60, // Convert to minutes
         }));
 
         setMeditationCategoryData(meditationChartData);
 
         // Converte a duração combinada total para horas e minutos
+        const combinedDuration = engagement.session_duration;
         const hours = Math.floor(combinedDuration / 3600);
         const minutes = Math.floor((combinedDuration % 3600) / 60);
 
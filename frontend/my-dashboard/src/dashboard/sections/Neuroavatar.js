@@ -21,7 +21,7 @@ export default function Neuroavatar() {
   useEffect(() => {
     const fetchData = async () => {
       try {
-        const response = await fetch('https://neuro-dashboard.onrender.com/api/sessionAvatar');
+        const response = await fetch('https://neuro-dashboard.onrender.com/api/sessionAvatar?all=true');
         if (!response.ok) throw new Error(`Erro HTTP: ${response.status}`);
 
         let sessionAvatarData;
@@ -19,7 +19,7 @@ export default function Neurodisplay() {
   useEffect(() => {
     const fetchData = async () => {
       try {
-        const response = await fetch('https://neuro-dashboard.onrender.com/api/sessionMeditation');
+        const response = await fetch('https://neuro-dashboard.onrender.com/api/sessionMeditation?all=true');
         if (!response.ok) throw new Error(`Erro HTTP: ${response.status}`);
 
         let sessionMeditation;